@@ -1,19 +1,39 @@
 from flask import Flask
-from .extensions import db, migrate, bcrypt
+from werkzeug.utils import import_string
+from .extensions import db
+from .commands import register_commands
+from .compression import init_compression
 from .config import Config
+from .database import REPLICA_BIND, configure_engines, init_replica_routing
+from .metrics import init_metrics
 from .routes import register_blueprints
+from .services.dialect import check_dialects
 
 
 def create_app(config_class=Config):
     app = Flask(__name__)
     app.config.from_object(config_class)
+    app.json = import_string(app.config["JSON_PROVIDER"])(app)
 
     # Initialize extensions
     db.init_app(app)
-    migrate.init_app(app, db)
-    bcrypt.init_app(app)
+    configure_engines(app)
+    check_dialects(app)
+    if REPLICA_BIND in app.config["SQLALCHEMY_BINDS"]:
+        init_replica_routing(app)
 
     # Register blueprints
     register_blueprints(app)
 
+    # CLI commands (flask db, flask audit-plans, ...)
+    register_commands(app)
+
+    # Per-endpoint latency and SQL metrics at /metrics
+    if app.config["METRICS_ENABLED"]:
+        init_metrics(app)
+
+    # Registered last so it runs first: metrics see the compressed size
+    if app.config["COMPRESSION_ENABLED"]:
+        init_compression(app)
+
     return app
@@ -0,0 +1,336 @@
+"""ASGI application: the read-heavy endpoints and login run natively on the
+event loop with the async services; every other request is handed to the
+Flask app through asgiref's WSGI adapter.
+
+Native handlers answer exactly like their Flask routes (same bodies, status
+codes, ETags, replica routing and metrics). Anything they do not cover, such
+as a streamed report, falls through to Flask.
+"""
+import json
+import re
+import time
+from urllib.parse import parse_qsl
+
+from asgiref.wsgi import WsgiToAsgi
+from flask import g
+from itsdangerous import BadSignature
+from werkzeug.datastructures import MIMEAccept
+from werkzeug.exceptions import RequestEntityTooLarge
+from werkzeug.http import parse_accept_header, parse_cookie, parse_etags
+
+from .compression import compress
+from .database import REPLICA_BIND, dispose_async_engines, get_async_sessionmaker
+from .responses import (
+    error_result,
+    hasher_busy_result,
+    invalid_token_result,
+    login_result,
+    not_modified,
+    parse_page_args,
+    parse_report_args,
+    rate_limited_result,
+    report_result,
+    roles_result,
+    user_roles_result,
+    wants_ndjson,
+)
+from .services import async_role_service, async_user_service
+from .services.auth_service import AUTH_INVALID, AUTH_OK
+from .services.cache import get_role_catalog
+from .services.passwords import PasswordHasherBusy
+from .services.rate_limit import RateLimited, get_login_limiter
+from .services.tokens import InvalidToken
+
+
+class Request:
+    def __init__(self, scope, match):
+        self.scope = scope
+        self.method = scope["method"]
+        self.args = {}
+        query = scope["query_string"].decode("latin-1")
+        for name, value in parse_qsl(query, keep_blank_values=True):
+            self.args.setdefault(name, value)
+        self.headers = {
+            name.decode("latin-1").lower(): value.decode("latin-1")
+            for name, value in scope["headers"]
+        }
+        self.params = match.groupdict()
+        self.body = b""
+
+    def etag_matches(self, etag):
+        return parse_etags(self.headers.get("if-none-match")).contains_weak(etag)
+
+
+class AsgiApp:
+    def __init__(self, flask_app):
+        self.flask_app = flask_app
+        self.wsgi = WsgiToAsgi(flask_app)
+        self.metrics = flask_app.extensions.get("metrics")
+        self.routes = [
+            ("GET", re.compile(r"/roles"), "role.list_roles_route", self.roles),
+            (
+                "GET",
+                re.compile(r"/users/(?P<user_id>\d+)/roles"),
+                "role.get_user_roles_route",
+                self.user_roles,
+            ),
+            ("GET", re.compile(r"/users/report"), "user_bp.user_report", self.report),
+            ("POST", re.compile(r"/login"), "user_bp.login", self.login),
+        ]
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] == "lifespan":
+            return await self._lifespan(receive, send)
+
+        if scope["type"] == "http":
+            for method, pattern, endpoint, handler in self.routes:
+                match = pattern.fullmatch(scope["path"])
+                if match and scope["method"] == method:
+                    request = Request(scope, match)
+                    if not (handler == self.report and _streams(request)):
+                        return await self._handle(
+                            request, endpoint, handler, receive, send
+                        )
+                    break
+
+        await self.wsgi(scope, receive, send)
+
+    async def _handle(self, request, endpoint, handler, receive, send):
+        try:
+            if request.method == "POST":
+                request.body = await _read_body(
+                    request, receive, self.flask_app.config["MAX_CONTENT_LENGTH"]
+                )
+        except RequestEntityTooLarge as ex:
+            # Flask's own answer to an oversized body
+            started = time.perf_counter()
+            statements, sql_seconds = 0, 0.0
+            status, body = ex.code, ex.get_body().encode()
+            headers = dict(ex.get_headers())
+        else:
+            started = time.perf_counter()
+            with self.flask_app.app_context():
+                g._metrics_sql = [0, 0.0]
+                bind = self._read_bind(request)
+                async with get_async_sessionmaker(self.flask_app, bind)() as session:
+                    status, body, headers = await handler(session, request)
+                statements, sql_seconds = g._metrics_sql
+
+        if status is None:
+            # The handler could not take it after all (e.g. malformed JSON);
+            # Flask produces the response, from the body we already read
+            return await self.wsgi(request.scope, _replay(request.body), send)
+
+        compression = self.flask_app.extensions.get("compression")
+        if compression is not None:
+            body, headers = _compress(compression, request, status, body, headers)
+
+        if self.metrics is not None:
+            self.metrics.record(
+                endpoint,
+                request.method,
+                time.perf_counter() - started,
+                statements,
+                sql_seconds,
+                len(body),
+            )
+
+        headers = {"Content-Length": str(len(body)), **headers}
+        await send(
+            {
+                "type": "http.response.start",
+                "status": status,
+                "headers": [
+                    (name.lower().encode("latin-1"), value.encode("latin-1"))
+                    for name, value in headers.items()
+                ],
+            }
+        )
+        await send({"type": "http.response.body", "body": body})
+
+    def _read_bind(self, request):
+        """The replica for reads, unless this client wrote recently.
+
+        Mirrors ``init_replica_routing``: the staleness stamp lives in the
+        signed Flask session cookie.
+        """
+        if request.method != "GET" or REPLICA_BIND not in (
+            self.flask_app.config["SQLALCHEMY_BINDS"]
+        ):
+            return None
+
+        app = self.flask_app
+        cookie = parse_cookie(request.headers.get("cookie", "")).get(
+            app.config["SESSION_COOKIE_NAME"]
+        )
+        serializer = app.session_interface.get_signing_serializer(app)
+        if cookie and serializer is not None:
+            try:
+                data = serializer.loads(
+                    cookie, max_age=int(app.permanent_session_lifetime.total_seconds())
+                )
+            except BadSignature:
+                data = {}
+            if data.get("primary_until", 0) > time.time():
+                return None
+        return REPLICA_BIND
+
+    async def _lifespan(self, receive, send):
+        while True:
+            message = await receive()
+            if message["type"] == "lifespan.startup":
+                await send({"type": "lifespan.startup.complete"})
+            elif message["type"] == "lifespan.shutdown":
+                await dispose_async_engines(self.flask_app)
+                await send({"type": "lifespan.shutdown.complete"})
+                return
+
+    async def roles(self, session, request):
+        try:
+            limit, cursor = parse_page_args(
+                request.args, self.flask_app.config["PAGINATION_MAX_LIMIT"]
+            )
+            etag = await async_role_service.roles_etag(session, limit, cursor)
+            if request.etag_matches(etag):
+                return not_modified(etag)
+            page = await async_role_service.list_roles(session, limit, cursor)
+        except ValueError as ex:
+            return error_result(400, str(ex))
+        return roles_result(page, etag)
+
+    async def user_roles(self, session, request):
+        user_id = int(request.params["user_id"])
+        try:
+            claims = await async_user_service.claims_from_header(
+                session, request.headers.get("authorization")
+            )
+        except InvalidToken as ex:
+            return invalid_token_result(ex)
+        if claims is not None and claims["user_id"] == user_id:
+            catalog = get_role_catalog()
+            await catalog.refresh_async(session, claims["role_ids"])
+            roles = catalog.resolve(claims["role_ids"], refresh=False)
+            return user_roles_result(user_id, roles)
+
+        try:
+            roles = await async_role_service.get_roles_for_user(session, user_id)
+        except ValueError as ex:
+            return error_result(404, str(ex))
+        return user_roles_result(user_id, roles)
+
+    async def report(self, session, request):
+        try:
+            status, fields, filters, sort = parse_report_args(request.args)
+            limit, cursor = parse_page_args(
+                request.args, self.flask_app.config["PAGINATION_MAX_LIMIT"]
+            )
+            etag = await async_user_service.report_etag(
+                session, status, limit, cursor, fields, filters, sort
+            )
+            if request.etag_matches(etag):
+                return not_modified(etag)
+            body = await async_user_service.render_user_report(
+                session,
+                status,
+                limit=limit,
+                cursor=cursor,
+                fields=fields,
+                filters=filters,
+                sort=sort,
+            )
+        except ValueError as ex:
+            return error_result(400, str(ex))
+        return report_result(body, etag)
+
+    async def login(self, session, request):
+        try:
+            data = json.loads(request.body)
+        except ValueError:
+            data = None
+        if not isinstance(data, dict):
+            return None, None, None
+
+        email = data.get("email")
+        client = request.scope.get("client")
+        ip = client[0] if client else None
+        limiter = get_login_limiter()
+        if limiter is not None:
+            try:
+                await limiter.check_async(ip, email)
+            except RateLimited as ex:
+                return rate_limited_result(ex)
+
+        try:
+            user, status = await async_user_service.authenticate(
+                session, email, data.get("password")
+            )
+        except PasswordHasherBusy:
+            return hasher_busy_result()
+        if status == AUTH_INVALID and limiter is not None:
+            await limiter.record_failure_async(ip, email)
+
+        token = None
+        if status == AUTH_OK:
+            token = await async_user_service.create_access_token(
+                session, user.id, user.token_version
+            )
+        return login_result(email, status, token)
+
+
+def _streams(request):
+    # Streamed reports are left to Flask's stream_with_context
+    accept = parse_accept_header(request.headers.get("accept"), MIMEAccept)
+    return wants_ndjson(request.args, accept)
+
+
+def _compress(compression, request, status, body, headers):
+    """Apply the Flask app's response compression to a native response."""
+    mimetype = headers.get("Content-Type", "").partition(";")[0]
+    if not compression.compressible(status, mimetype, headers):
+        return body, headers
+
+    headers = {**headers, "Vary": "Accept-Encoding"}
+    encoding = compression.negotiate(
+        parse_accept_header(request.headers.get("accept-encoding"))
+    )
+    if encoding is None or len(body) < compression.min_size:
+        return body, headers
+
+    headers["Content-Encoding"] = encoding
+    etag = headers.get("ETag")
+    if etag and not etag.startswith("W/"):
+        headers["ETag"] = "W/" + etag
+    return compress(body, encoding, compression.levels), headers
+
+
+async def _read_body(request, receive, max_length):
+    """The request body, or ``RequestEntityTooLarge`` once it (or its declared
+    Content-Length) goes over ``max_length`` bytes, as Flask enforces
+    ``MAX_CONTENT_LENGTH``."""
+    declared = request.headers.get("content-length")
+    if max_length is not None and declared and declared.isdigit():
+        if int(declared) > max_length:
+            raise RequestEntityTooLarge()
+
+    chunks = []
+    size = 0
+    while True:
+        message = await receive()
+        chunk = message.get("body", b"")
+        size += len(chunk)
+        if max_length is not None and size > max_length:
+            raise RequestEntityTooLarge()
+        chunks.append(chunk)
+        if not message.get("more_body"):
+            return b"".join(chunks)
+
+
+def _replay(body):
+    async def receive():
+        return {"type": "http.request", "body": body, "more_body": False}
+
+    return receive
+
+
+def create_asgi_app(flask_app):
+    return AsgiApp(flask_app)
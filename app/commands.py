@@ -0,0 +1,354 @@
+import re
+from datetime import datetime
+from pathlib import Path
+import click
+from flask import current_app, g
+from flask.cli import ScriptInfo, with_appcontext
+from sqlalchemy import event, select, text
+
+from app.extensions import db
+
+_AUDITED = re.compile(r"^\s*(SELECT|WITH|UPDATE|DELETE)\b", re.IGNORECASE)
+# "SCAN user", "SCAN user USING COVERING INDEX ix" -- but not "SCAN CONSTANT
+# ROW" or "SCAN (subquery-1)", which are not table scans
+_SQLITE_SCAN = re.compile(
+    r"^SCAN (?!CONSTANT ROW)(?!\()(\w+)(?: USING (?:COVERING )?INDEX (\w+))?"
+)
+_POSTGRES_SCAN = re.compile(r'Seq Scan on "?(\w+)')
+
+
+def find_full_scans(connection, statement, parameters):
+    """EXPLAIN one statement and return the tables it scans in full."""
+    dialect = connection.dialect.name
+    scans = set()
+
+    if dialect == "sqlite":
+        # Walking a partial index only visits the rows it covers
+        partial = set(
+            connection.exec_driver_sql(
+                "SELECT name FROM sqlite_master "
+                "WHERE type = 'index' AND sql LIKE '% WHERE %'"
+            ).scalars()
+        )
+        plan = [
+            row[-1]
+            for row in connection.exec_driver_sql(
+                "EXPLAIN QUERY PLAN " + statement, parameters
+            )
+        ]
+        for line in plan:
+            match = _SQLITE_SCAN.match(line.strip())
+            if match and match.group(2) not in partial:
+                scans.add(match.group(1))
+    elif dialect == "postgresql":
+        plan = [
+            row[0]
+            for row in connection.exec_driver_sql("EXPLAIN " + statement, parameters)
+        ]
+        for line in plan:
+            match = _POSTGRES_SCAN.search(line)
+            if match:
+                scans.add(match.group(1))
+    else:
+        raise click.ClickException(f"Plan audit is not supported on {dialect}")
+
+    return plan, scans
+
+
+def _seed_scratch_database(users=500, inactive_every=10):
+    """Give the planner realistic statistics: mostly active users, a few
+    roles each, then ANALYZE."""
+    from sqlalchemy import insert
+    from app.models import Role, User, user_roles
+
+    db.session.execute(
+        insert(Role),
+        [
+            {"role_id": i, "role_name": f"Role{i}", "department_name": f"Dept{i % 4}"}
+            for i in range(1, 21)
+        ],
+    )
+    db.session.execute(
+        insert(User),
+        [
+            {
+                "id": i,
+                "username": f"seed{i}",
+                "email": f"seed{i}@example.com",
+                "password": "seed",
+                "inactive_since": datetime.utcnow()
+                if i % inactive_every == 0
+                else None,
+            }
+            for i in range(1, users + 1)
+        ],
+    )
+    db.session.execute(
+        insert(user_roles),
+        [
+            {"user_id": i, "role_id": r}
+            for i in range(1, users + 1)
+            for r in {i % 20 + 1, i % 7 + 1}
+        ],
+    )
+    db.session.commit()
+    db.session.execute(text("ANALYZE"))
+    db.session.commit()
+
+
+def _audit_workload():
+    """(step, callable, tables the step is allowed to scan in full)."""
+    from app.models import Role
+    from app.services import (
+        auth_service,
+        role_service,
+        summary_service,
+        tokens,
+        user_service,
+    )
+
+    def seed():
+        for i in range(3):
+            user_service.create_user(f"audit{i}", f"audit{i}@example.com", "pw")
+        role_service.create_role("Auditor", "Compliance")
+
+    def issue_and_verify_token():
+        # The version a login reads along with the user's status
+        version = db.session.execute(select(tokens.token_version())).scalar()
+        tokens.verify_token(tokens.create_access_token(1, version)[0])
+
+    return [
+        ("create_user / create_role", seed, set()),
+        (
+            "import_users",
+            lambda: user_service.import_users(
+                [{"username": "bulk", "email": "bulk@example.com", "password": "pw"}]
+            ),
+            set(),
+        ),
+        ("role catalog load", lambda: role_service.list_roles(), {"role"}),
+        ("toggle_user_active", lambda: user_service.toggle_user_active(1), set()),
+        (
+            "create_access_token / verify_token",
+            issue_and_verify_token,
+            set(),
+        ),
+        ("assign_role_to_user", lambda: role_service.assign_role_to_user(1, 1), set()),
+        (
+            "bulk_update_user_roles",
+            lambda: role_service.bulk_update_user_roles(
+                "grant", [{"user_id": 2, "role_id": 1}]
+            ),
+            set(),
+        ),
+        ("get_roles_for_user", lambda: role_service.get_roles_for_user(2), set()),
+        (
+            "remove_role_from_user",
+            lambda: role_service.remove_role_from_user(2, 1),
+            set(),
+        ),
+        (
+            "Role.users",
+            lambda: db.session.get(Role, 1).users.all(),
+            set(),
+        ),
+        (
+            "login email filter build",
+            lambda: auth_service.authenticate("x", "y"),
+            {"user"},
+        ),
+        (
+            "authenticate",
+            lambda: auth_service.authenticate("audit0@example.com", "pw"),
+            set(),
+        ),
+        (
+            "get_user_report (full)",
+            lambda: user_service.get_user_report("all"),
+            {"user", "user_roles"},
+        ),
+        (
+            "get_user_report (active page)",
+            lambda: user_service.get_user_report("active", limit=2),
+            set(),
+        ),
+        (
+            "get_user_report (inactive page)",
+            lambda: user_service.get_user_report("inactive", limit=2),
+            set(),
+        ),
+        (
+            "get_user_report (active page, sparse fields)",
+            lambda: user_service.get_user_report(
+                "active", limit=2, fields=("id", "email")
+            ),
+            set(),
+        ),
+        (
+            "get_user_report (role page)",
+            lambda: user_service.get_user_report(
+                "all", limit=2, filters={"role_id": 1}
+            ),
+            set(),
+        ),
+        (
+            "get_user_report (department page)",
+            lambda: user_service.get_user_report(
+                "all", limit=2, filters={"department": "Compliance"}
+            ),
+            set(),
+        ),
+        (
+            "get_user_report (inactive since page)",
+            lambda: user_service.get_user_report(
+                "inactive",
+                limit=2,
+                filters={"inactive_after": datetime(2026, 1, 1)},
+                sort="-inactive_since",
+            ),
+            set(),
+        ),
+        (
+            "get_user_report (username page)",
+            lambda: user_service.get_user_report("all", limit=2, sort="username"),
+            # Walks the username index in order and stops after one page
+            {"user"},
+        ),
+        (
+            "iter_user_report (active)",
+            lambda: list(user_service.iter_user_report("active", chunk_size=2)),
+            set(),
+        ),
+        (
+            "get_report_summary",
+            summary_service.get_report_summary,
+            {"report_summary"},
+        ),
+        (
+            "rebuild_report_summary",
+            summary_service.rebuild_report_summary,
+            {"user", "user_roles", "report_summary"},
+        ),
+    ]
+
+
+@click.command("audit-plans")
+@click.option(
+    "--database-uri",
+    default="sqlite://",
+    show_default=True,
+    help="Scratch database the workload runs against; it is migrated to the "
+    "latest revision and written to.",
+)
+@click.option("--verbose", is_flag=True, help="Print every plan, not just failures.")
+@with_appcontext
+def audit_plans_command(database_uri, verbose):
+    """EXPLAIN every query the services issue and flag full table scans."""
+    from flask_migrate import upgrade
+    from app import create_app
+
+    config = {key: value for key, value in current_app.config.items() if key.isupper()}
+    config.update(SQLALCHEMY_DATABASE_URI=database_uri, METRICS_ENABLED=False)
+    # The workload signs access tokens
+    config["SECRET_KEY"] = config.get("SECRET_KEY") or "plan-audit"
+    scratch = create_app(config_class=type("AuditConfig", (), config))
+    init_migrate(scratch)
+
+    failures = 0
+    with scratch.app_context():
+        # Build the schema the way production gets it, so the audit covers
+        # the indexes the migrations actually create
+        upgrade(directory=str(Path(scratch.root_path).parent / "migrations"))
+        _seed_scratch_database()
+        engine = db.engine
+
+        for step, run, allowed in _audit_workload():
+            captured = []
+
+            def record(conn, cursor, statement, parameters, context, many):
+                if _AUDITED.match(statement):
+                    captured.append((statement, parameters[0] if many else parameters))
+
+            event.listen(engine, "before_cursor_execute", record)
+            try:
+                run()
+            finally:
+                event.remove(engine, "before_cursor_execute", record)
+
+            with engine.connect() as connection:
+                for statement, parameters in dict(captured).items():
+                    plan, scans = find_full_scans(connection, statement, parameters)
+                    flagged = scans - allowed
+                    if flagged:
+                        failures += 1
+                    if flagged or verbose:
+                        status = "FULL SCAN" if flagged else "ok"
+                        click.echo(f"[{status}] {step}: {' '.join(statement.split())}")
+                        for line in plan:
+                            click.echo(f"    {line}")
+
+    if failures:
+        raise click.ClickException(f"{failures} queries scan tables in full")
+    click.echo("No unexpected full table scans")
+
+
+@click.command("rebuild-report-summary")
+@with_appcontext
+def rebuild_report_summary_command():
+    """Recompute the report summary counters from scratch."""
+    from app.services.summary_service import rebuild_report_summary
+
+    groups = rebuild_report_summary()
+    click.echo(f"Rebuilt report summary: {groups} groups")
+
+
+def init_migrate(app):
+    """Set up Flask-Migrate on ``app``; needed before its API or commands run."""
+    from flask_migrate import Migrate
+
+    if "migrate" not in app.extensions:
+        Migrate(app, db)
+
+
+class MigrateGroup(click.Group):
+    """Flask-Migrate's ``db`` group, imported and set up the first time one of
+    its commands is looked up rather than in create_app."""
+
+    def _target(self, ctx):
+        from flask_migrate.cli import db as db_cli_group
+
+        init_migrate(ctx.ensure_object(ScriptInfo).load_app())
+        return db_cli_group
+
+    def list_commands(self, ctx):
+        return self._target(ctx).list_commands(ctx)
+
+    def get_command(self, ctx, name):
+        return self._target(ctx).get_command(ctx, name)
+
+
+@click.group("db", cls=MigrateGroup)
+@click.option(
+    "-d",
+    "--directory",
+    default=None,
+    help='Migration script directory (default is "migrations")',
+)
+@click.option(
+    "-x",
+    "--x-arg",
+    multiple=True,
+    help="Additional arguments consumed by custom env.py scripts",
+)
+@with_appcontext
+def migrate_command(directory, x_arg):
+    """Perform database migrations."""
+    # Read by Flask-Migrate, as with its own group
+    g.directory = directory
+    g.x_arg = x_arg
+
+
+def register_commands(app):
+    app.cli.add_command(migrate_command)
+    app.cli.add_command(audit_plans_command)
+    app.cli.add_command(rebuild_report_summary_command)
@@ -0,0 +1,169 @@
+"""Response compression negotiated through ``Accept-Encoding``.
+
+gzip is always available; zstd and brotli are offered when the
+``zstandard`` or ``brotli`` package is installed. Buffered responses under
+COMPRESSION_MIN_SIZE bytes go out as they are. Streamed responses are
+compressed on the fly and flushed every COMPRESSION_STREAM_FLUSH_SIZE bytes
+of input, so clients still receive rows while the report is being read.
+"""
+import importlib.util
+import zlib
+from flask import request
+
+# Preferred first when a client accepts several with the same quality
+ENCODINGS = ("zstd", "br", "gzip")
+_MODULES = {"zstd": "zstandard", "br": "brotli"}
+
+
+class GzipEncoder:
+    def __init__(self, level):
+        # wbits=31: gzip container rather than a raw zlib stream
+        self._compressor = zlib.compressobj(level, zlib.DEFLATED, 31)
+
+    def compress(self, data):
+        return self._compressor.compress(data)
+
+    def flush(self):
+        return self._compressor.flush(zlib.Z_SYNC_FLUSH)
+
+    def finish(self):
+        return self._compressor.flush()
+
+
+class BrotliEncoder:
+    def __init__(self, level):
+        import brotli
+
+        self._compressor = brotli.Compressor(quality=level)
+
+    def compress(self, data):
+        return self._compressor.process(data)
+
+    def flush(self):
+        return self._compressor.flush()
+
+    def finish(self):
+        return self._compressor.finish()
+
+
+class ZstdEncoder:
+    def __init__(self, level):
+        import zstandard
+
+        self._flush_block = zstandard.COMPRESSOBJ_FLUSH_BLOCK
+        self._compressor = zstandard.ZstdCompressor(level=level).compressobj()
+
+    def compress(self, data):
+        return self._compressor.compress(data)
+
+    def flush(self):
+        return self._compressor.flush(self._flush_block)
+
+    def finish(self):
+        return self._compressor.flush()
+
+
+_ENCODERS = {"gzip": GzipEncoder, "br": BrotliEncoder, "zstd": ZstdEncoder}
+
+
+def available_encodings():
+    # Optional packages are looked up, not imported, until first used
+    return [
+        name
+        for name in ENCODINGS
+        if name not in _MODULES or importlib.util.find_spec(_MODULES[name])
+    ]
+
+
+def encoder_for(encoding, levels):
+    return _ENCODERS[encoding](levels[encoding])
+
+
+def compress(data, encoding, levels):
+    encoder = encoder_for(encoding, levels)
+    return encoder.compress(data) + encoder.finish()
+
+
+def compress_stream(chunks, encoder, flush_size):
+    pending = 0
+    for chunk in chunks:
+        data = encoder.compress(chunk)
+        pending += len(chunk)
+        if pending >= flush_size:
+            data += encoder.flush()
+            pending = 0
+        if data:
+            yield data
+    yield encoder.finish()
+
+
+class Compression:
+    def __init__(self, min_size, levels, mimetypes, stream_flush_size):
+        self.min_size = min_size
+        self.levels = levels
+        self.mimetypes = frozenset(mimetypes)
+        self.stream_flush_size = stream_flush_size
+        self.encodings = available_encodings()
+
+    def negotiate(self, accept_encodings):
+        """The encoding to use for a parsed ``Accept-Encoding``, or None."""
+        return accept_encodings.best_match(self.encodings)
+
+    def compressible(self, status, mimetype, headers):
+        return (
+            200 <= status < 300
+            and status != 204
+            and mimetype in self.mimetypes
+            and "Content-Encoding" not in headers
+        )
+
+    def init_app(self, app):
+        app.extensions["compression"] = self
+        app.after_request(self._after_request)
+
+    def _after_request(self, response):
+        # File downloads are served as they are
+        if response.direct_passthrough or not self.compressible(
+            response.status_code, response.mimetype, response.headers
+        ):
+            return response
+
+        response.vary.add("Accept-Encoding")
+        encoding = self.negotiate(request.accept_encodings)
+        if encoding is None or request.method == "HEAD":
+            return response
+
+        if response.is_streamed:
+            # Closing the response must still close the original iterable,
+            # which (with stream_with_context) tears down the request
+            close = getattr(response.response, "close", None)
+            if close is not None:
+                response.call_on_close(close)
+            response.response = compress_stream(
+                response.iter_encoded(),
+                encoder_for(encoding, self.levels),
+                self.stream_flush_size,
+            )
+            response.headers.pop("Content-Length", None)
+        else:
+            data = response.get_data()
+            if len(data) < self.min_size:
+                return response
+            response.set_data(compress(data, encoding, self.levels))
+
+        response.headers["Content-Encoding"] = encoding
+        # The bytes differ per encoding, so the tag may only match weakly
+        etag, weak = response.get_etag()
+        if etag and not weak:
+            response.set_etag(etag, weak=True)
+        return response
+
+
+def init_compression(app):
+    config = app.config
+    Compression(
+        min_size=config["COMPRESSION_MIN_SIZE"],
+        levels=config["COMPRESSION_LEVELS"],
+        mimetypes=config["COMPRESSION_MIMETYPES"],
+        stream_flush_size=config["COMPRESSION_STREAM_FLUSH_SIZE"],
+    ).init_app(app)
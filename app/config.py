@@ -1,10 +1,29 @@
 import os
 import sys
 from pathlib import Path
-from dotenv import load_dotenv
 
 env_path = Path(__file__).parent.parent / ".env"
-load_dotenv(env_path)
+# Deployments configure the environment directly and have no .env to load
+if env_path.exists():
+    from dotenv import load_dotenv
+
+    load_dotenv(env_path)
+
+
+def rate_limit(name, default):
+    """A ``capacity/period_seconds`` limit from the environment, e.g. "20/60"."""
+    capacity, period = os.getenv(name, default).split("/")
+    return int(capacity), float(period)
+
+
+def engine_options(pool_size, max_overflow, pool_recycle=1800):
+    """Connection pool settings; each can be overridden from the environment."""
+    return {
+        "pool_size": int(os.getenv("DB_POOL_SIZE", pool_size)),
+        "max_overflow": int(os.getenv("DB_MAX_OVERFLOW", max_overflow)),
+        "pool_recycle": int(os.getenv("DB_POOL_RECYCLE", pool_recycle)),
+        "pool_pre_ping": True,
+    }
 
 
 class Config:
@@ -12,24 +31,193 @@ class Config:
     SQLALCHEMY_DATABASE_URI = os.getenv("DATABASE_URI", "sqlite:///users.db")
     SQLALCHEMY_TRACK_MODIFICATIONS = False
 
+    # Pool settings (SQLALCHEMY_ENGINE_OPTIONS) and PRAGMAs applied to every
+    # new SQLite connection; both are tuned per profile below
+    SQLALCHEMY_ENGINE_OPTIONS = {"pool_pre_ping": True}
+    SQLITE_PRAGMAS = {"busy_timeout": 5000}
+
+    # Optional read replica: GET requests and read-only service functions
+    # read from it. Clients that wrote within STALENESS_WINDOW seconds keep
+    # reading from the primary so replica lag never hides their own writes.
+    SQLALCHEMY_BINDS = (
+        {"replica": os.environ["REPLICA_DATABASE_URI"]}
+        if os.getenv("REPLICA_DATABASE_URI")
+        else {}
+    )
+    REPLICA_STALENESS_WINDOW = float(os.getenv("REPLICA_STALENESS_WINDOW", "5"))
+
+    # Flask JSON provider (import path); the default uses orjson if installed
+    JSON_PROVIDER = os.getenv("JSON_PROVIDER", "app.serializers.FastJSONProvider")
+
+    # Rows fetched per database round trip when streaming /users/report
+    REPORT_STREAM_CHUNK_SIZE = int(os.getenv("REPORT_STREAM_CHUNK_SIZE", "1000"))
+
+    # Background report exports (POST /users/report/exports): WORKERS run at
+    # once and QUEUE_SIZE more may wait before new exports get 503. Files go
+    # to EXPORT_DIR (default: <instance folder>/exports). A queued or running
+    # export whose worker has not reported for STALE_AFTER seconds (it was
+    # restarted or scaled down) is marked failed. Finished exports and their
+    # files are deleted RETENTION seconds after they end (0 keeps them).
+    EXPORT_WORKERS = int(os.getenv("EXPORT_WORKERS", "1"))
+    EXPORT_QUEUE_SIZE = int(os.getenv("EXPORT_QUEUE_SIZE", "4"))
+    EXPORT_CHUNK_SIZE = int(os.getenv("EXPORT_CHUNK_SIZE", "5000"))
+    EXPORT_DIR = os.getenv("EXPORT_DIR")
+    EXPORT_STALE_AFTER = int(os.getenv("EXPORT_STALE_AFTER", "300"))
+    EXPORT_RETENTION = int(os.getenv("EXPORT_RETENTION", "604800"))
+
+    # Response compression negotiated via Accept-Encoding (gzip, plus zstd and
+    # brotli when installed). Buffered bodies under MIN_SIZE bytes are sent
+    # as they are; streams are flushed every STREAM_FLUSH_SIZE input bytes.
+    COMPRESSION_ENABLED = os.getenv("COMPRESSION_ENABLED", "1") == "1"
+    COMPRESSION_MIN_SIZE = int(os.getenv("COMPRESSION_MIN_SIZE", "1024"))
+    COMPRESSION_LEVELS = {
+        "gzip": int(os.getenv("COMPRESSION_GZIP_LEVEL", "6")),
+        "br": int(os.getenv("COMPRESSION_BROTLI_LEVEL", "4")),
+        "zstd": int(os.getenv("COMPRESSION_ZSTD_LEVEL", "3")),
+    }
+    COMPRESSION_MIMETYPES = ("application/json", "application/x-ndjson")
+    COMPRESSION_STREAM_FLUSH_SIZE = int(
+        os.getenv("COMPRESSION_STREAM_FLUSH_SIZE", "65536")
+    )
+
+    # Largest request body accepted, in bytes (unset: no limit); larger ones
+    # get 413, from Flask and from the native ASGI handlers alike
+    MAX_CONTENT_LENGTH = int(os.getenv("MAX_CONTENT_LENGTH", "0")) or None
+
+    # Upper bound for the ?limit= parameter on paginated listings
+    PAGINATION_MAX_LIMIT = int(os.getenv("PAGINATION_MAX_LIMIT", "1000"))
+
+    # Users per multi-row INSERT (and per commit) in POST /users/bulk
+    BULK_IMPORT_BATCH_SIZE = int(os.getenv("BULK_IMPORT_BATCH_SIZE", "500"))
+
+    # Pairs accepted by one POST /users/roles/bulk request (two bind
+    # parameters each, which keeps us under SQLite's parameter limit)
+    BULK_ROLE_MAX_PAIRS = int(os.getenv("BULK_ROLE_MAX_PAIRS", "10000"))
+
+    # bcrypt work factor; stored hashes with a different cost are rehashed on
+    # the next successful login
+    BCRYPT_LOG_ROUNDS = int(os.getenv("BCRYPT_LOG_ROUNDS", "12"))
+
+    # Hashing runs on a pool of this many workers ("thread" or "process");
+    # once QUEUE_SIZE more are waiting, new logins get 503
+    PASSWORD_HASH_WORKERS = int(
+        os.getenv("PASSWORD_HASH_WORKERS", str(min(4, os.cpu_count() or 1)))
+    )
+    PASSWORD_HASH_QUEUE_SIZE = int(os.getenv("PASSWORD_HASH_QUEUE_SIZE", "32"))
+    PASSWORD_HASH_EXECUTOR = os.getenv("PASSWORD_HASH_EXECUTOR", "thread")
+
+    # Bloom filter of registered emails so logins for unknown emails are
+    # rejected without a query. Users registered on other workers are picked
+    # up within TTL seconds; the filter is rebuilt every REBUILD_INTERVAL.
+    # Each catch-up also re-reads the last RESCAN_IDS ids, since ids are not
+    # committed in order (PostgreSQL) and a late lower id must not be missed.
+    LOGIN_EMAIL_FILTER_ENABLED = os.getenv("LOGIN_EMAIL_FILTER_ENABLED", "1") == "1"
+    LOGIN_EMAIL_FILTER_TTL = float(os.getenv("LOGIN_EMAIL_FILTER_TTL", "2"))
+    LOGIN_EMAIL_FILTER_REBUILD_INTERVAL = float(
+        os.getenv("LOGIN_EMAIL_FILTER_REBUILD_INTERVAL", "600")
+    )
+    LOGIN_EMAIL_FILTER_ERROR_RATE = float(
+        os.getenv("LOGIN_EMAIL_FILTER_ERROR_RATE", "0.01")
+    )
+    LOGIN_EMAIL_FILTER_RESCAN_IDS = int(
+        os.getenv("LOGIN_EMAIL_FILTER_RESCAN_IDS", "2000")
+    )
+
+    # Token buckets in front of /login: every attempt takes from its client
+    # IP's bucket, failed ones from the email's bucket for that IP. Bursts of
+    # up to N, refilled over the given seconds. Over the limit, /login
+    # answers 429 before any query or password hash. "memory" keeps
+    # buckets per process; "sqlite" shares them between the processes on a
+    # host through SQLITE_PATH (default: <instance folder>/rate_limits.db).
+    LOGIN_RATE_LIMIT_ENABLED = os.getenv("LOGIN_RATE_LIMIT_ENABLED", "1") == "1"
+    LOGIN_RATE_LIMIT_PER_IP = rate_limit("LOGIN_RATE_LIMIT_PER_IP", "20/60")
+    LOGIN_RATE_LIMIT_PER_EMAIL = rate_limit("LOGIN_RATE_LIMIT_PER_EMAIL", "5/60")
+    LOGIN_RATE_LIMIT_STORAGE = os.getenv("LOGIN_RATE_LIMIT_STORAGE", "memory")
+    LOGIN_RATE_LIMIT_SQLITE_PATH = os.getenv("LOGIN_RATE_LIMIT_SQLITE_PATH")
+    LOGIN_RATE_LIMIT_MAX_KEYS = int(os.getenv("LOGIN_RATE_LIMIT_MAX_KEYS", "100000"))
+
+    # Access tokens issued by /login, signed with SECRET_KEY and valid for
+    # TTL seconds. Deactivating a user or changing their roles revokes their
+    # tokens; other workers notice within REVOCATION_TTL seconds.
+    ACCESS_TOKEN_TTL = int(os.getenv("ACCESS_TOKEN_TTL", "900"))
+    TOKEN_REVOCATION_TTL = float(os.getenv("TOKEN_REVOCATION_TTL", "5"))
+
+    # Prometheus-format request metrics (latency, SQL count/time, size)
+    METRICS_ENABLED = os.getenv("METRICS_ENABLED", "1") == "1"
+    METRICS_PATH = "/metrics"
+    METRICS_LATENCY_BUCKETS = (
+        0.005,
+        0.01,
+        0.025,
+        0.05,
+        0.1,
+        0.25,
+        0.5,
+        1.0,
+        2.5,
+        5.0,
+        10.0,
+    )
+    METRICS_SIZE_BUCKETS = (256, 1024, 4096, 16384, 65536, 262144, 1048576)
+
+    # Seconds between checks of the shared role version by the role catalog
+    ROLE_CACHE_TTL = float(os.getenv("ROLE_CACHE_TTL", "5"))
+
+    # LRU cache behind GET /users/<id>/roles. Other workers' role changes
+    # become visible once an entry's TTL (seconds) runs out.
+    USER_ROLES_CACHE_MAX_ENTRIES = int(
+        os.getenv("USER_ROLES_CACHE_MAX_ENTRIES", "10000")
+    )
+    USER_ROLES_CACHE_TTL = float(os.getenv("USER_ROLES_CACHE_TTL", "30"))
+
 
 class DevelopmentConfig(Config):
     DEBUG = True
     SECRET_KEY = os.getenv("SECRET_KEY", "dev-secret-change-in-production")
+    SQLALCHEMY_ENGINE_OPTIONS = engine_options(pool_size=5, max_overflow=5)
+    SQLITE_PRAGMAS = {
+        "journal_mode": "WAL",
+        "synchronous": "NORMAL",
+        "busy_timeout": 5000,
+        "cache_size": -16000,  # 16 MB
+    }
 
 
 class ProductionConfig(Config):
     DEBUG = False
+    SQLALCHEMY_ENGINE_OPTIONS = engine_options(pool_size=10, max_overflow=20)
+    # WAL lets readers run alongside the single writer; synchronous=NORMAL
+    # is durable across application crashes (not power loss) in WAL mode
+    SQLITE_PRAGMAS = {
+        "journal_mode": "WAL",
+        "synchronous": "NORMAL",
+        "busy_timeout": 10000,
+        "cache_size": -64000,  # 64 MB
+        "mmap_size": 268435456,  # 256 MB
+        "temp_store": "MEMORY",
+    }
 
 
 class TestingConfig(Config):
     TESTING = True
     SQLALCHEMY_DATABASE_URI = "sqlite:///:memory:"
     SQLALCHEMY_TRACK_MODIFICATIONS = False
+    # In-memory SQLite uses a single-connection pool without size options
+    SQLALCHEMY_ENGINE_OPTIONS = {}
     WTF_CSRF_ENABLED = False
+    BCRYPT_LOG_ROUNDS = 4
     SECRET_KEY = "test-secret-key-not-for-production"
 
 
+def config_from_env():
+    """The config class for FLASK_ENV, as used by the app.py, run.py and
+    asgi.py entry points; production settings are validated first."""
+    if os.getenv("FLASK_ENV") == "development":
+        return DevelopmentConfig
+    validate_production_config()
+    return ProductionConfig
+
+
 # Validate production config only when it's actually used
 def validate_production_config():
     if not os.getenv("SECRET_KEY"):
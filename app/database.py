@@ -0,0 +1,134 @@
+import time
+from contextlib import contextmanager
+from functools import partial
+from flask import current_app, request, session as client_session
+from flask_sqlalchemy.session import Session
+from sqlalchemy import event, make_url
+
+REPLICA_BIND = "replica"
+
+# asyncio drivers used for each database in async (ASGI) mode
+ASYNC_DRIVERS = {"sqlite": "sqlite+aiosqlite", "postgresql": "postgresql+asyncpg"}
+
+
+def _apply_pragmas(pragmas, dbapi_connection, connection_record):
+    cursor = dbapi_connection.cursor()
+    try:
+        for name, value in pragmas.items():
+            cursor.execute(f"PRAGMA {name}={value}")
+    finally:
+        cursor.close()
+
+
+def configure_engines(app):
+    """Apply SQLITE_PRAGMAS to every new connection of each SQLite engine."""
+    pragmas = app.config.get("SQLITE_PRAGMAS")
+    if not pragmas:
+        return
+
+    with app.app_context():
+        for engine in app.extensions["sqlalchemy"].engines.values():
+            if engine.dialect.name == "sqlite":
+                event.listen(engine, "connect", partial(_apply_pragmas, pragmas))
+
+
+class RoutingSession(Session):
+    """Session that sends SELECTs to the replica bind while reads are allowed.
+
+    Reads are allowed inside :func:`replica_reads` (and for GET requests, see
+    :func:`init_replica_routing`). The first flush or DML statement pins the
+    session to the primary, so anything read after a write in the same
+    request sees that write; ``info["pinned"]`` can also be set up front.
+    """
+
+    def get_bind(self, mapper=None, clause=None, bind=None, **kwargs):
+        if bind is None and REPLICA_BIND in self._db.engines:
+            if self._flushing or getattr(clause, "is_dml", False):
+                self.info["pinned"] = self.info["wrote"] = True
+            elif (
+                self.info.get("use_replica")
+                and not self.info.get("pinned")
+                and getattr(clause, "is_select", False)
+            ):
+                return self._db.engines[REPLICA_BIND]
+        return super().get_bind(mapper=mapper, clause=clause, bind=bind, **kwargs)
+
+
+@contextmanager
+def replica_reads():
+    """Let SELECTs in this block go to the replica, if one is configured."""
+    info = current_app.extensions["sqlalchemy"].session.info
+    previous = info.get("use_replica", False)
+    info["use_replica"] = True
+    try:
+        yield
+    finally:
+        info["use_replica"] = previous
+
+
+def init_replica_routing(app):
+    """Route GET requests to the replica unless this client wrote recently.
+
+    A request that writes stamps the (signed) session cookie; for the next
+    REPLICA_STALENESS_WINDOW seconds that client's reads stay on the primary
+    so replica lag cannot hide its own writes.
+    """
+    window = app.config["REPLICA_STALENESS_WINDOW"]
+    db_session = app.extensions["sqlalchemy"].session
+
+    @app.before_request
+    def route_reads():
+        if client_session.get("primary_until", 0) > time.time():
+            db_session.info["pinned"] = True
+        elif request.method in ("GET", "HEAD"):
+            db_session.info["use_replica"] = True
+
+    @app.after_request
+    def remember_write(response):
+        if db_session.info.get("wrote") and window > 0:
+            client_session["primary_until"] = time.time() + window
+        return response
+
+
+def async_url(url):
+    """The URL of the same database through its asyncio driver."""
+    url = make_url(url)
+    driver = ASYNC_DRIVERS.get(url.get_backend_name())
+    if driver is None:
+        raise ValueError(f"No asyncio driver configured for {url.drivername}")
+    return url.set(drivername=driver)
+
+
+def get_async_sessionmaker(app, bind=None):
+    """``async_sessionmaker`` for the primary database or the given bind.
+
+    Engines are created on first use with the app's engine options and
+    SQLite pragmas, and disposed by :func:`dispose_async_engines`.
+    """
+    makers = app.extensions.setdefault("async_sessionmakers", {})
+    maker = makers.get(bind)
+    if maker is None:
+        # Imported here: the asyncio extension needs greenlet, which only
+        # async mode requires
+        from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
+
+        uri = (
+            app.config["SQLALCHEMY_DATABASE_URI"]
+            if bind is None
+            else app.config["SQLALCHEMY_BINDS"][bind]
+        )
+        engine = create_async_engine(
+            async_url(uri), **app.config["SQLALCHEMY_ENGINE_OPTIONS"]
+        )
+        pragmas = app.config.get("SQLITE_PRAGMAS")
+        if pragmas and engine.dialect.name == "sqlite":
+            event.listen(
+                engine.sync_engine, "connect", partial(_apply_pragmas, pragmas)
+            )
+        maker = makers[bind] = async_sessionmaker(engine, expire_on_commit=False)
+    return maker
+
+
+async def dispose_async_engines(app):
+    for maker in app.extensions.pop("async_sessionmakers", {}).values():
+        await maker.kw["bind"].dispose()
@@ -1,7 +1,6 @@
 from flask_sqlalchemy import SQLAlchemy
-from flask_migrate import Migrate
-from flask_bcrypt import Bcrypt
+from .database import RoutingSession
 
-db = SQLAlchemy()
-migrate = Migrate()
-bcrypt = Bcrypt()
+db = SQLAlchemy(session_options={"class_": RoutingSession})
+# Flask-Migrate is set up by the `flask db` command group in commands.py, so
+# serving processes never import it (or Alembic)
@@ -0,0 +1,221 @@
+import threading
+import time
+from bisect import bisect_left
+from flask import Response, current_app, g, has_app_context, request
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+PROMETHEUS_MIMETYPE = "text/plain; version=0.0.4"
+
+
+class Histogram:
+    def __init__(self, buckets):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value):
+        self.counts[bisect_left(self.buckets, value)] += 1
+        self.sum += value
+        self.count += 1
+
+
+class EndpointStats:
+    def __init__(self, latency_buckets, size_buckets):
+        self.latency = Histogram(latency_buckets)
+        self.size = Histogram(size_buckets)
+        self.sql_statements = 0
+        self.sql_seconds = 0.0
+
+
+class Metrics:
+    """Per-endpoint request metrics, exported in Prometheus text format.
+
+    Request hooks time each request; engine listeners attribute SQL
+    statements and their duration to the request that issued them.
+    """
+
+    def __init__(self, latency_buckets, size_buckets):
+        self.latency_buckets = tuple(sorted(latency_buckets))
+        self.size_buckets = tuple(sorted(size_buckets))
+        self._lock = threading.Lock()
+        self._endpoints = {}
+
+    def init_app(self, app):
+        _listen_to_engines()
+        app.extensions["metrics"] = self
+        app.before_request(self._before_request)
+        app.after_request(self._after_request)
+        app.add_url_rule(
+            app.config["METRICS_PATH"], "metrics", self.export, methods=["GET"]
+        )
+
+    def _before_request(self):
+        g._metrics_started = time.perf_counter()
+        g._metrics_sql = [0, 0.0]
+
+    def _after_request(self, response):
+        started = g.pop("_metrics_started", None)
+        if started is None:
+            return response
+
+        endpoint, method = request.endpoint or "unmatched", request.method
+        if response.is_streamed and not response.direct_passthrough:
+            # The body (and the SQL behind it) is produced after this hook,
+            # so g._metrics_sql stays in place and the request is recorded
+            # once the server closes the response.
+            counters = g._metrics_sql
+            sent = [0]
+
+            def count_sent(chunks):
+                for chunk in chunks:
+                    sent[0] += len(chunk)
+                    yield chunk
+
+            def record_sent():
+                self.record(
+                    endpoint,
+                    method,
+                    time.perf_counter() - started,
+                    counters[0],
+                    counters[1],
+                    sent[0],
+                )
+
+            close = getattr(response.response, "close", None)
+            response.response = count_sent(response.iter_encoded())
+            if close is not None:
+                response.call_on_close(close)
+            response.call_on_close(record_sent)
+            return response
+
+        statements, sql_seconds = g.pop("_metrics_sql")
+        self.record(
+            endpoint,
+            method,
+            time.perf_counter() - started,
+            statements,
+            sql_seconds,
+            response.content_length,
+        )
+        return response
+
+    def record(self, endpoint, method, elapsed, statements, sql_seconds, size):
+        """Add one handled request to the per-endpoint series."""
+        key = (endpoint, method)
+        with self._lock:
+            stats = self._endpoints.get(key)
+            if stats is None:
+                stats = self._endpoints[key] = EndpointStats(
+                    self.latency_buckets, self.size_buckets
+                )
+            stats.latency.observe(elapsed)
+            stats.sql_statements += statements
+            stats.sql_seconds += sql_seconds
+            # File downloads sent without a Content-Length have no size
+            if size is not None:
+                stats.size.observe(size)
+
+    def export(self):
+        with self._lock:
+            snapshot = sorted(self._endpoints.items())
+            lines = []
+            _histogram_lines(
+                lines,
+                "http_request_duration_seconds",
+                "Request latency by endpoint.",
+                [(key, stats.latency) for key, stats in snapshot],
+            )
+            _counter_lines(
+                lines,
+                "http_request_sql_statements_total",
+                "SQL statements executed while handling requests.",
+                [(key, stats.sql_statements) for key, stats in snapshot],
+            )
+            _counter_lines(
+                lines,
+                "http_request_sql_seconds_total",
+                "Time spent executing SQL while handling requests.",
+                [(key, stats.sql_seconds) for key, stats in snapshot],
+            )
+            _histogram_lines(
+                lines,
+                "http_response_size_bytes",
+                "Response body bytes sent by endpoint.",
+                [(key, stats.size) for key, stats in snapshot],
+            )
+
+        cache = current_app.extensions.get("user_roles_cache")
+        if cache is not None:
+            for name, value in cache.stats().items():
+                if name in ("hits", "misses", "evictions"):
+                    lines.append(f"# TYPE user_roles_cache_{name}_total counter")
+                    lines.append(f"user_roles_cache_{name}_total {value}")
+
+        return Response("\n".join(lines) + "\n", mimetype=PROMETHEUS_MIMETYPE)
+
+
+def _labels(key, **extra):
+    endpoint, method = key
+    pairs = {"endpoint": endpoint, "method": method, **extra}
+    return "{" + ",".join(f'{name}="{value}"' for name, value in pairs.items()) + "}"
+
+
+def _histogram_lines(lines, name, help_text, series):
+    lines.append(f"# HELP {name} {help_text}")
+    lines.append(f"# TYPE {name} histogram")
+    for key, histogram in series:
+        cumulative = 0
+        for bound, count in zip(histogram.buckets, histogram.counts):
+            cumulative += count
+            lines.append(f"{name}_bucket{_labels(key, le=bound)} {cumulative}")
+        lines.append(f"{name}_bucket{_labels(key, le='+Inf')} {histogram.count}")
+        lines.append(f"{name}_sum{_labels(key)} {histogram.sum}")
+        lines.append(f"{name}_count{_labels(key)} {histogram.count}")
+
+
+def _counter_lines(lines, name, help_text, series):
+    lines.append(f"# HELP {name} {help_text}")
+    lines.append(f"# TYPE {name} counter")
+    for key, value in series:
+        lines.append(f"{name}{_labels(key)} {value}")
+
+
+_listening = False
+_listening_lock = threading.Lock()
+
+
+def _listen_to_engines():
+    # Registered once on the Engine class so every engine (including binds
+    # and the async engines of app.asgi) is covered; statements outside a
+    # request are ignored.
+    global _listening
+    with _listening_lock:
+        if _listening:
+            return
+        event.listen(Engine, "before_cursor_execute", _before_cursor_execute)
+        event.listen(Engine, "after_cursor_execute", _after_cursor_execute)
+        _listening = True
+
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context, many):
+    conn.info["_metrics_query_started"] = time.perf_counter()
+
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, many):
+    if not has_app_context():
+        return
+
+    counters = g.get("_metrics_sql")
+    started = conn.info.pop("_metrics_query_started", None)
+    if counters is not None and started is not None:
+        counters[0] += 1
+        counters[1] += time.perf_counter() - started
+
+
+def init_metrics(app):
+    Metrics(
+        latency_buckets=app.config["METRICS_LATENCY_BUCKETS"],
+        size_buckets=app.config["METRICS_SIZE_BUCKETS"],
+    ).init_app(app)
@@ -1,9 +1,11 @@
-from app.extensions import db, bcrypt
+from app.extensions import db
 
 user_roles = db.Table(
     "user_roles",
     db.Column("user_id", db.Integer, db.ForeignKey("user.id"), primary_key=True),
     db.Column("role_id", db.Integer, db.ForeignKey("role.role_id"), primary_key=True),
+    # The primary key covers lookups by user; this one serves Role.users
+    db.Index("ix_user_roles_role_id", "role_id", "user_id"),
 )
 
 
@@ -18,7 +20,25 @@ class User(db.Model):
         "Role",
         secondary=user_roles,
         backref=db.backref("users", lazy="dynamic"),
-        lazy="subquery",
+        lazy="select",
+    )
+
+    __table_args__ = (
+        db.Index("ix_user_inactive_since", "inactive_since"),
+        # Partial indexes over each status, where the backend supports them,
+        # so id-ordered report pages never walk the other status's rows
+        db.Index(
+            "ix_user_active",
+            "id",
+            sqlite_where=db.text("inactive_since IS NULL"),
+            postgresql_where=db.text("inactive_since IS NULL"),
+        ),
+        db.Index(
+            "ix_user_inactive",
+            "id",
+            sqlite_where=db.text("inactive_since IS NOT NULL"),
+            postgresql_where=db.text("inactive_since IS NOT NULL"),
+        ),
     )
 
     def __repr__(self):
@@ -36,7 +56,88 @@ class Role(db.Model):
         db.UniqueConstraint(
             "role_name", "department_name", name="uq_role_name_department"
         ),
+        # The report's department filter
+        db.Index("ix_role_department_name", "department_name"),
     )
 
     def __repr__(self):
         return f"<Role {self.department_name}:{self.role_name}>"
+
+
+class CacheVersion(db.Model):
+    """Change counter shared by every worker process.
+
+    Write paths bump the row for the data they change; in-process caches
+    compare it with the version they were built from to detect staleness.
+    """
+
+    __tablename__ = "cache_versions"
+
+    name = db.Column(db.String(64), primary_key=True)
+    version = db.Column(db.Integer, nullable=False, default=0)
+
+    def __repr__(self):
+        return f"<CacheVersion {self.name}={self.version}>"
+
+
+class ReportSummary(db.Model):
+    """User counts per status for the whole table, each department and each
+    role, kept up to date by the write paths that change them.
+
+    ``dimension`` is ``"total"`` (with an empty ``group_key``), ``"department"``
+    (keyed by department name) or ``"role"`` (keyed by role id).
+    """
+
+    __tablename__ = "report_summary"
+
+    dimension = db.Column(db.String(16), primary_key=True)
+    group_key = db.Column(db.String(64), primary_key=True)
+    is_active = db.Column(db.Boolean, primary_key=True)
+    user_count = db.Column(db.Integer, nullable=False, default=0)
+
+    def __repr__(self):
+        return (
+            f"<ReportSummary {self.dimension}:{self.group_key} "
+            f"active={self.is_active} {self.user_count}>"
+        )
+
+
+class ExportJob(db.Model):
+    """A user report export written to a file by a background worker."""
+
+    __tablename__ = "export_jobs"
+
+    id = db.Column(db.Integer, primary_key=True)
+    # "queued", "running", "done" or "failed"
+    status = db.Column(db.String(16), nullable=False, default="queued")
+    format = db.Column(db.String(16), nullable=False)
+    status_filter = db.Column(db.String(16), nullable=False)
+    total_users = db.Column(db.Integer, nullable=True)
+    exported_users = db.Column(db.Integer, nullable=False, default=0)
+    file_name = db.Column(db.String(255), nullable=True)
+    error = db.Column(db.Text, nullable=True)
+    created_at = db.Column(db.DateTime, nullable=False)
+    finished_at = db.Column(db.DateTime, nullable=True)
+    # Refreshed by the runner holding a queued or running job; one that stops
+    # (its process exited) leaves it to go stale
+    heartbeat_at = db.Column(db.DateTime, nullable=True)
+
+    def __repr__(self):
+        return f"<ExportJob {self.id} {self.status}>"
+
+
+class TokenRevocation(db.Model):
+    """Access tokens of ``user_id`` that carry a revocation version below
+    ``version`` are no longer accepted. ``revoked_at`` (Unix time) dates the
+    row, which is pruned once every token it could reject has expired."""
+
+    __tablename__ = "token_revocations"
+
+    user_id = db.Column(db.Integer, primary_key=True)
+    revoked_at = db.Column(db.Float, nullable=False)
+    version = db.Column(db.Integer, nullable=False, server_default="0")
+
+    __table_args__ = (db.Index("ix_token_revocations_revoked_at", "revoked_at"),)
+
+    def __repr__(self):
+        return f"<TokenRevocation {self.user_id} at {self.revoked_at}>"
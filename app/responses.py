@@ -0,0 +1,128 @@
+"""Request parsing and responses shared by the Flask views and the native
+ASGI handlers in ``app.asgi``, so both answer a request identically.
+
+Responses are built as ``(status, body, headers)``; Flask views return them
+through ``to_response``.
+"""
+import math
+
+from flask import Response
+
+from .serializers import dumps
+from .services.auth_service import AUTH_INACTIVE, AUTH_OK
+from .services.pagination import parse_limit
+from .services.user_service import (
+    parse_report_fields,
+    parse_report_filters,
+    parse_report_sort,
+)
+
+JSON_MIMETYPE = "application/json"
+NDJSON_MIMETYPE = "application/x-ndjson"
+REPORT_STATUSES = ("all", "active", "inactive")
+
+
+def to_response(result):
+    status, body, headers = result
+    return Response(body, status, headers)
+
+
+def json_result(status, obj, headers=None):
+    return (
+        status,
+        dumps(obj) + b"\n",
+        {"Content-Type": JSON_MIMETYPE, **(headers or {})},
+    )
+
+
+def error_result(status, message, key="error"):
+    return json_result(status, {key: message})
+
+
+def not_modified(etag):
+    return 304, b"", {"ETag": f'"{etag}"'}
+
+
+def parse_page_args(args, max_limit):
+    """The ``limit`` and ``cursor`` of a paginated listing."""
+    return parse_limit(args.get("limit"), max_limit), args.get("cursor")
+
+
+def parse_report_args(args):
+    """``/users/report``'s status, fields, filters and sort, validated."""
+    status = args.get("status", "all")
+    if status not in REPORT_STATUSES:
+        raise ValueError("Invalid status parameter. Use 'all', 'active', or 'inactive'")
+    return (
+        status,
+        parse_report_fields(args.get("fields")),
+        parse_report_filters(args),
+        parse_report_sort(args.get("sort")),
+    )
+
+
+def wants_ndjson(args, accept):
+    """Whether the report should stream; ``accept`` is a ``MIMEAccept``."""
+    if args.get("stream") == "1":
+        return True
+    return accept.best_match([JSON_MIMETYPE, NDJSON_MIMETYPE]) == NDJSON_MIMETYPE
+
+
+def roles_result(page, etag):
+    return json_result(
+        200,
+        {
+            "total_roles": len(page["roles"]),
+            "roles": page["roles"],
+            "next_cursor": page["next_cursor"],
+        },
+        {"ETag": f'"{etag}"'},
+    )
+
+
+def user_roles_result(user_id, roles):
+    return json_result(200, {"user_id": user_id, "roles": roles})
+
+
+def report_result(body, etag):
+    return 200, body, {"Content-Type": JSON_MIMETYPE, "ETag": f'"{etag}"'}
+
+
+def login_result(email, auth_status, token=None):
+    """The /login answer; ``token`` is ``(access_token, expires_in)`` and is
+    only needed when ``auth_status`` is ``AUTH_OK``."""
+    if auth_status == AUTH_INACTIVE:
+        return error_result(403, "Account is inactive", key="message")
+    if auth_status == AUTH_OK:
+        access_token, expires_in = token
+        return json_result(
+            200,
+            {
+                "message": "Login successful",
+                "email": email,
+                "access_token": access_token,
+                "token_type": "Bearer",
+                "expires_in": expires_in,
+            },
+        )
+    return error_result(401, "Invalid credentials", key="message")
+
+
+def invalid_token_result(ex):
+    return json_result(
+        401, {"error": str(ex)}, {"WWW-Authenticate": 'Bearer error="invalid_token"'}
+    )
+
+
+def rate_limited_result(ex):
+    return json_result(
+        429,
+        {"message": "Too many login attempts, try again later"},
+        {"Retry-After": str(math.ceil(ex.retry_after))},
+    )
+
+
+def hasher_busy_result():
+    return json_result(
+        503, {"message": "Server busy, try again shortly"}, {"Retry-After": "1"}
+    )
@@ -1,10 +1,22 @@
-from flask import Blueprint, request, jsonify
+from flask import Blueprint, current_app, request, jsonify
 from app.services.role_service import (
     create_role,
     assign_role_to_user,
+    bulk_update_user_roles,
     list_roles,
     get_roles_for_user,
     remove_role_from_user,
+    roles_etag,
+)
+from app.services.cache import get_role_catalog, get_user_roles_cache
+from app.services.tokens import claims_from_header
+from app.responses import (
+    error_result,
+    not_modified,
+    parse_page_args,
+    roles_result,
+    to_response,
+    user_roles_result,
 )
 
 role_bp = Blueprint("role", __name__)
@@ -29,8 +41,23 @@ def create_role_route():
 
 @role_bp.route("/roles", methods=["GET"])
 def list_roles_route():
-    roles = list_roles()
-    return jsonify({"total_roles": len(roles), "roles": roles}), 200
+    try:
+        limit, cursor = parse_page_args(
+            request.args, current_app.config["PAGINATION_MAX_LIMIT"]
+        )
+        etag = roles_etag(limit, cursor)
+        if request.if_none_match.contains_weak(etag):
+            return to_response(not_modified(etag))
+        page = list_roles(limit=limit, cursor=cursor)
+    except ValueError as ex:
+        return to_response(error_result(400, str(ex)))
+
+    return to_response(roles_result(page, etag))
+
+
+@role_bp.route("/roles/cache-stats", methods=["GET"])
+def role_cache_stats_route():
+    return jsonify({"user_roles": get_user_roles_cache().stats()}), 200
 
 
 @role_bp.route("/users/<int:user_id>/roles", methods=["POST"])
@@ -41,6 +68,14 @@ def assign_role_route(user_id):
     if role_id is None:
         return jsonify({"error": "role_id is required"}), 400
 
+    # Strings like "1" are accepted, as they were when SQL coerced them
+    try:
+        if isinstance(role_id, bool) or not isinstance(role_id, (int, str)):
+            raise ValueError
+        role_id = int(role_id)
+    except ValueError:
+        return jsonify({"error": "role_id must be an integer"}), 400
+
     try:
         result = assign_role_to_user(user_id=user_id, role_id=role_id)
     except ValueError as ex:
@@ -49,13 +84,40 @@ def assign_role_route(user_id):
     return jsonify(result), 200
 
 
+@role_bp.route("/users/roles/bulk", methods=["POST"])
+def bulk_user_roles_route():
+    data = request.get_json() or {}
+    action = data.get("action")
+    pairs = data.get("pairs")
+
+    if not isinstance(pairs, list) or not pairs:
+        return jsonify({"error": "pairs must be a non-empty list"}), 400
+
+    max_pairs = current_app.config["BULK_ROLE_MAX_PAIRS"]
+    if len(pairs) > max_pairs:
+        return jsonify({"error": f"At most {max_pairs} pairs per request"}), 400
+
+    try:
+        results = bulk_update_user_roles(action, pairs)
+    except ValueError as ex:
+        return jsonify({"error": str(ex)}), 400
+
+    return jsonify({"action": action, "results": results}), 200
+
+
 @role_bp.route("/users/<int:user_id>/roles", methods=["GET"])
 def get_user_roles_route(user_id):
+    # A caller reading their own roles gets them from their access token
+    claims = claims_from_header(request.headers.get("Authorization"))
+    if claims is not None and claims["user_id"] == user_id:
+        roles = get_role_catalog().resolve(claims["role_ids"])
+        return to_response(user_roles_result(user_id, roles))
+
     try:
         roles = get_roles_for_user(user_id)
-        return jsonify({"user_id": user_id, "roles": roles}), 200
     except ValueError as ex:
-        return jsonify({"error": str(ex)}), 404
+        return to_response(error_result(404, str(ex)))
+    return to_response(user_roles_result(user_id, roles))
 
 
 # Added a remove role route for completing endpoint coverage
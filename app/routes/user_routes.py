@@ -1,16 +1,73 @@
-from flask import Blueprint, jsonify, request
-from ..models import User
-from ..extensions import db
+from flask import (
+    Blueprint,
+    Response,
+    current_app,
+    jsonify,
+    request,
+    send_file,
+    stream_with_context,
+    url_for,
+)
 from ..services.user_service import (
     create_user,
-    check_password,
-    get_user_report,
+    import_users,
+    iter_user_report_ndjson,
+    render_user_report,
+    report_etag,
     toggle_user_active,
 )
+from ..services.export_service import (
+    ExportQueueFull,
+    create_export,
+    export_file,
+    get_export,
+)
+from ..services.auth_service import AUTH_INVALID, AUTH_OK, authenticate
+from ..services.summary_service import get_report_summary
+from ..services.passwords import PasswordHasherBusy
+from ..services.rate_limit import RateLimited, get_login_limiter
+from ..services.cache import get_role_catalog
+from ..services.tokens import InvalidToken, claims_from_header, create_access_token
+from ..responses import (
+    NDJSON_MIMETYPE,
+    error_result,
+    hasher_busy_result,
+    invalid_token_result,
+    login_result,
+    not_modified,
+    parse_page_args,
+    parse_report_args,
+    rate_limited_result,
+    report_result,
+    to_response,
+    wants_ndjson,
+)
 
 user_bp = Blueprint("user_bp", __name__)
 
 
+@user_bp.errorhandler(PasswordHasherBusy)
+def hasher_busy(ex):
+    return to_response(hasher_busy_result())
+
+
+@user_bp.errorhandler(RateLimited)
+def rate_limited(ex):
+    return to_response(rate_limited_result(ex))
+
+
+@user_bp.app_errorhandler(InvalidToken)
+def invalid_token(ex):
+    return to_response(invalid_token_result(ex))
+
+
+@user_bp.errorhandler(ExportQueueFull)
+def export_queue_full(ex):
+    response = jsonify({"message": "Too many exports in progress, try again later"})
+    response.headers["Retry-After"] = "30"
+    return response, 503
+
+
 @user_bp.route("/register", methods=["POST"])
 def register():
     data = request.get_json()
@@ -22,19 +79,56 @@ def register():
     return jsonify({"message": "User registered successfully"}), 201
 
 
+@user_bp.route("/users/bulk", methods=["POST"])
+def bulk_register():
+    if request.mimetype == NDJSON_MIMETYPE:
+        records = _iter_ndjson(request.stream)
+    else:
+        records = request.get_json(silent=True)
+        if not isinstance(records, list):
+            return (
+                jsonify(
+                    {"error": "Expected a JSON array or an NDJSON stream of users"}
+                ),
+                400,
+            )
+
+    result = import_users(
+        records, batch_size=current_app.config["BULK_IMPORT_BATCH_SIZE"]
+    )
+    return jsonify(result), 201 if result["created"] else 200
+
+
+def _iter_ndjson(stream):
+    loads = current_app.json.loads
+    for line in stream:
+        if not line.strip():
+            continue
+        try:
+            yield loads(line)
+        except ValueError:
+            # Reported as an invalid row by the import
+            yield None
+
+
 @user_bp.route("/login", methods=["POST"])
 def login():
     data = request.get_json()
     email = data.get("email")
     password = data.get("password")
 
-    if check_password(email, password) is True:
-        user = User.query.filter_by(email=email).first()
-        if user.inactive_since is not None:
-            return jsonify({"message": "Account is inactive"}), 403
-        return jsonify({"message": "Login successful", "email": email}), 200
-    else:
-        return jsonify({"message": "Invalid credentials"}), 401
+    limiter = get_login_limiter()
+    if limiter is not None:
+        limiter.check(request.remote_addr, email)
+
+    user, status = authenticate(email, password)
+    if status == AUTH_INVALID and limiter is not None:
+        limiter.record_failure(request.remote_addr, email)
+
+    token = None
+    if status == AUTH_OK:
+        token = create_access_token(user.id, user.token_version)
+    return to_response(login_result(email, status, token))
 
 
 @user_bp.route("/users/<int:user_id>/toggle-active", methods=["PATCH"])
@@ -48,24 +142,115 @@ def toggle_active(user_id):
 
 @user_bp.route("/profile", methods=["GET"])
 def profile():
-    # Dummy profile route for the user
-    # In a real system, you would have authentication and user session handling
-    return jsonify({"message": "User profile information"}), 200
+    # Answered from the access token alone, without a query
+    claims = claims_from_header(request.headers.get("Authorization"))
+    if claims is None:
+        response = jsonify({"error": "Bearer token required"})
+        response.headers["WWW-Authenticate"] = "Bearer"
+        return response, 401
+
+    return (
+        jsonify(
+            {
+                "user_id": claims["user_id"],
+                "is_active": claims["is_active"],
+                "roles": get_role_catalog().resolve(claims["role_ids"]),
+            }
+        ),
+        200,
+    )
 
 
 @user_bp.route("/users/report", methods=["GET"])
 def user_report():
-    status = request.args.get("status", "all")
-
-    if status not in ["all", "active", "inactive"]:
-        return (
-            jsonify(
-                {
-                    "error": "Invalid status parameter. Use 'all', 'active', or 'inactive'"
-                }
-            ),
-            400,
+    try:
+        status, fields, filters, sort = parse_report_args(request.args)
+    except ValueError as ex:
+        return to_response(error_result(400, str(ex)))
+
+    if wants_ndjson(request.args, request.accept_mimetypes):
+        etag = report_etag(status, NDJSON_MIMETYPE, fields, filters, sort)
+        if request.if_none_match.contains_weak(etag):
+            return to_response(not_modified(etag))
+        response = _stream_user_report(status, fields, filters, sort)
+        response.set_etag(etag)
+        return response
+
+    try:
+        limit, cursor = parse_page_args(
+            request.args, current_app.config["PAGINATION_MAX_LIMIT"]
+        )
+        # Checked before the report query runs: an unchanged report costs one
+        # lookup of the change counters
+        etag = report_etag(status, limit, cursor, fields, filters, sort)
+        if request.if_none_match.contains_weak(etag):
+            return to_response(not_modified(etag))
+        body = render_user_report(
+            status,
+            limit=limit,
+            cursor=cursor,
+            fields=fields,
+            filters=filters,
+            sort=sort,
         )
+    except ValueError as ex:
+        return to_response(error_result(400, str(ex)))
+
+    return to_response(report_result(body, etag))
+
+
+@user_bp.route("/users/report/summary", methods=["GET"])
+def user_report_summary():
+    etag = report_etag("summary")
+    if request.if_none_match.contains_weak(etag):
+        return to_response(not_modified(etag))
+    response = jsonify(get_report_summary())
+    response.set_etag(etag)
+    return response
+
+
+@user_bp.route("/users/report/exports", methods=["POST"])
+def create_report_export():
+    data = request.get_json(silent=True) or {}
+    try:
+        job = create_export(data.get("status", "all"), data.get("format", "csv"))
+    except ValueError as ex:
+        return jsonify({"error": str(ex)}), 400
+
+    location = url_for(".report_export", export_id=job["id"])
+    return jsonify(_with_download_url(job)), 202, {"Location": location}
+
+
+@user_bp.route("/users/report/exports/<int:export_id>", methods=["GET"])
+def report_export(export_id):
+    try:
+        job = get_export(export_id)
+    except ValueError as ex:
+        return jsonify({"error": str(ex)}), 404
+    return jsonify(_with_download_url(job)), 200
+
+
+@user_bp.route("/users/report/exports/<int:export_id>/download", methods=["GET"])
+def download_report_export(export_id):
+    try:
+        path = export_file(export_id)
+    except ValueError as ex:
+        return jsonify({"error": str(ex)}), 404
+    if path is None:
+        return jsonify({"error": "Export is not finished"}), 409
+    return send_file(path, as_attachment=True)
+
+
+def _with_download_url(job):
+    url = None
+    if job["status"] == "done":
+        url = url_for(".download_report_export", export_id=job["id"])
+    return {**job, "download_url": url}
+
 
-    report = get_user_report(status)
-    return jsonify(report), 200
+def _stream_user_report(status, fields=None, filters=None, sort=None):
+    chunk_size = current_app.config["REPORT_STREAM_CHUNK_SIZE"]
+    lines = iter_user_report_ndjson(
+        status, chunk_size=chunk_size, fields=fields, filters=filters, sort=sort
+    )
+    return Response(stream_with_context(lines), mimetype=NDJSON_MIMETYPE)
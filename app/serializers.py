@@ -0,0 +1,144 @@
+"""JSON encoding: the app's JSON provider and shared user/role serializers.
+
+orjson is used when it is installed (the ``fast-json`` extra) and the
+standard library otherwise, so it stays an optional speed-up rather than a
+dependency.
+"""
+import json
+
+from flask.json.provider import DefaultJSONProvider
+
+try:
+    import orjson
+except ImportError:  # pragma: no cover - exercised when orjson is absent
+    orjson = None
+
+
+def dumps(obj):
+    """Compact JSON as bytes."""
+    if orjson is not None:
+        return orjson.dumps(obj)
+    return json.dumps(obj, separators=(",", ":"), ensure_ascii=False).encode()
+
+
+class FastJSONProvider(DefaultJSONProvider):
+    """Flask JSON provider that encodes with orjson when it is available.
+
+    Datetimes are passed through to Flask's ``default`` hook, so responses
+    format them exactly as the default provider does. Keys keep insertion
+    order (the serializers below choose it) instead of being sorted.
+    """
+
+    sort_keys = False
+
+    def _option(self, indent=False):
+        option = orjson.OPT_PASSTHROUGH_DATETIME
+        if indent:
+            option |= orjson.OPT_INDENT_2
+        if self.sort_keys:
+            option |= orjson.OPT_SORT_KEYS
+        return option
+
+    def dumps(self, obj, **kwargs):
+        if orjson is None or kwargs:
+            return super().dumps(obj, **kwargs)
+        return orjson.dumps(obj, default=self.default, option=self._option()).decode()
+
+    def loads(self, s, **kwargs):
+        if orjson is None or kwargs:
+            return super().loads(s, **kwargs)
+        return orjson.loads(s)
+
+    def response(self, *args, **kwargs):
+        if orjson is None:
+            return super().response(*args, **kwargs)
+        obj = self._prepare_response_obj(args, kwargs)
+        indent = self.compact is False or (self.compact is None and self._app.debug)
+        body = orjson.dumps(obj, default=self.default, option=self._option(indent))
+        return self._app.response_class(body + b"\n", mimetype=self.mimetype)
+
+
+def isoformat(value):
+    return value.isoformat() if value is not None else None
+
+
+def serialize_role(role_id, role_name, department_name):
+    return {
+        "role_id": role_id,
+        "role_name": role_name,
+        "department_name": department_name,
+    }
+
+
+# Keys of a serialized user, in output order
+USER_FIELDS = ("id", "username", "email", "roles", "is_active", "inactive_since")
+
+
+def serialize_user(user, roles):
+    """``user`` may be a ``User`` or a row with the same column names."""
+    return {
+        "id": user.id,
+        "username": user.username,
+        "email": user.email,
+        "roles": roles,
+        "is_active": user.inactive_since is None,
+        "inactive_since": isoformat(user.inactive_since),
+    }
+
+
+def project_user(user, fields, roles=None):
+    """``serialize_user`` with only ``fields``; ``user`` only needs the columns
+    those fields are read from."""
+    data = {}
+    for field in fields:
+        if field == "roles":
+            data["roles"] = roles
+        elif field == "is_active":
+            data["is_active"] = user.inactive_since is None
+        elif field == "inactive_since":
+            data["inactive_since"] = isoformat(user.inactive_since)
+        else:
+            data[field] = getattr(user, field)
+    return data
+
+
+def dump_user(user, role_fragments):
+    """``serialize_user`` straight to bytes, splicing in pre-encoded roles."""
+    head = dumps({"id": user.id, "username": user.username, "email": user.email})
+    if user.inactive_since is None:
+        tail = b'],"is_active":true,"inactive_since":null}'
+    else:
+        tail = b'],"is_active":false,"inactive_since":"%s"}' % (
+            user.inactive_since.isoformat().encode()
+        )
+    return head[:-1] + b',"roles":[' + b",".join(role_fragments) + tail
+
+
+def dump_user_report(status, user_fragments, next_cursor):
+    """The ``get_user_report`` document as bytes, from ``dump_user`` output."""
+    return b'{"total_users":%d,"status_filter":%s,"users":[%s],"next_cursor":%s}' % (
+        len(user_fragments),
+        dumps(status),
+        b",".join(user_fragments),
+        dumps(next_cursor),
+    )
+
+
+def serialize_export_job(job):
+    progress = None
+    if job.status == "done":
+        progress = 1.0
+    elif job.total_users:
+        progress = round(min(job.exported_users / job.total_users, 1.0), 4)
+    return {
+        "id": job.id,
+        "status": job.status,
+        "format": job.format,
+        "status_filter": job.status_filter,
+        "exported_users": job.exported_users,
+        "total_users": job.total_users,
+        "progress": progress,
+        "error": job.error,
+        "created_at": isoformat(job.created_at),
+        "finished_at": isoformat(job.finished_at),
+    }
@@ -0,0 +1,34 @@
+"""Async twins of the read functions in ``role_service``, for the ASGI entry
+point. Same contract as ``async_user_service``: an ``AsyncSession`` first,
+Flask app context pushed by the caller."""
+from .cache import etag_for, get_role_catalog, get_user_roles_cache
+from .role_service import _present_role_ids, _roles_page, _user_role_ids_select
+
+
+async def roles_etag(session, *params):
+    catalog = get_role_catalog()
+    await catalog.refresh_async(session)
+    return etag_for(catalog.version(refresh=False), *params)
+
+
+async def list_roles(session, limit=None, cursor=None):
+    await get_role_catalog().refresh_async(session)
+    return _roles_page(limit, cursor, refresh=False)
+
+
+async def get_roles_for_user(session, user_id):
+    cache = get_user_roles_cache()
+    roles = cache.get(user_id)
+    if roles is not None:
+        return roles
+
+    rows = (await session.execute(_user_role_ids_select(user_id))).all()
+    if not rows:
+        raise ValueError(f"User with id {user_id} not found")
+
+    role_ids = _present_role_ids(rows)
+    catalog = get_role_catalog()
+    await catalog.refresh_async(session, role_ids)
+    roles = catalog.resolve(role_ids, refresh=False)
+    cache.set(user_id, roles)
+    return roles
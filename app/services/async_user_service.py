@@ -0,0 +1,112 @@
+"""Async twins of the report and login functions in ``user_service`` and
+``auth_service``, for the ASGI entry point.
+
+Each takes an ``AsyncSession`` and builds the same statements as its sync
+twin; the role catalog, email filter and password pool are shared with the
+sync code. Callers must have the Flask app context pushed.
+"""
+from flask import current_app
+from sqlalchemy import update
+from ..models import User
+from ..serializers import dump_user_report
+from .auth_service import AUTH_INVALID, _credentials_select, _status, get_email_filter
+from .cache import etag_for, get_role_catalog, get_versions_async
+from .pagination import split_page
+from .passwords import PasswordHasherBusy, get_password_hasher
+from .tokens import (
+    _token_role_ids_select,
+    bearer_token,
+    get_revocation_list,
+    issue_token,
+    verify_token,
+)
+from .user_service import (
+    REPORT_VERSIONS,
+    _all_role_ids,
+    _cursor_key,
+    _dump_users,
+    _group_role_ids,
+    _report_page_select,
+    _role_ids_select,
+    _with_roles,
+)
+
+
+async def report_etag(session, *params):
+    return etag_for(*await get_versions_async(session, *REPORT_VERSIONS), *params)
+
+
+async def render_user_report(
+    session, status="all", limit=None, cursor=None, fields=None, filters=None, sort=None
+):
+    query, roles_query = _report_page_select(
+        status, limit, cursor, fields, filters, sort
+    )
+    users, next_cursor = split_page(
+        (await session.execute(query)).all(), limit, key=_cursor_key(sort)
+    )
+
+    role_ids_by_user = _group_role_ids(())
+    if _with_roles(fields):
+        if roles_query is None:
+            roles_query = _role_ids_select([user.id for user in users])
+        role_ids_by_user = _group_role_ids(await session.execute(roles_query))
+
+    role_ids = _all_role_ids(role_ids_by_user)
+    catalog = get_role_catalog()
+    await catalog.refresh_async(session, role_ids)
+    fragments = catalog.fragments(role_ids, refresh=False)
+
+    return dump_user_report(
+        status,
+        _dump_users(users, role_ids_by_user, fragments, fields),
+        next_cursor,
+    )
+
+
+async def authenticate(session, email, password):
+    """``auth_service.authenticate`` without blocking the event loop: the
+    lookup is awaited and bcrypt runs on the shared hashing pool."""
+    if not isinstance(email, str) or not isinstance(password, str):
+        return None, AUTH_INVALID
+
+    if current_app.config["LOGIN_EMAIL_FILTER_ENABLED"]:
+        if not await get_email_filter().might_exist_async(session, email):
+            return None, AUTH_INVALID
+
+    user = (await session.execute(_credentials_select(email))).first()
+    if user is None:
+        return None, AUTH_INVALID
+
+    hasher = get_password_hasher()
+    if not await hasher.verify_async(password, user.password):
+        return None, AUTH_INVALID
+
+    if hasher.needs_rehash(user.password):
+        try:
+            hashed = await hasher.hash_async(password)
+        except PasswordHasherBusy:
+            # Not worth failing a valid login over; try again next time
+            pass
+        else:
+            await session.execute(
+                update(User).where(User.id == user.id).values(password=hashed)
+            )
+            await session.commit()
+
+    return user, _status(user)
+
+
+async def create_access_token(session, user_id, version):
+    """``tokens.create_access_token`` on an ``AsyncSession``."""
+    role_ids = (await session.execute(_token_role_ids_select(user_id))).scalars().all()
+    return issue_token(user_id, role_ids, version)
+
+
+async def claims_from_header(session, authorization):
+    """``tokens.claims_from_header`` with the revocation check awaited."""
+    token = bearer_token(authorization)
+    if token is None:
+        return None
+    await get_revocation_list().refresh_async(session)
+    return verify_token(token, refresh=False)
@@ -0,0 +1,183 @@
+import threading
+import time
+from flask import current_app
+from sqlalchemy import func, select, update
+from app.models import User, db
+from app.services.bloom import BloomFilter
+from app.services.passwords import PasswordHasherBusy, get_password_hasher
+from app.services.tokens import token_version
+
+AUTH_OK = "ok"
+AUTH_INACTIVE = "inactive"
+AUTH_INVALID = "invalid"
+
+
+class EmailFilter:
+    """Bloom filter of every registered email, used to reject unknown
+    emails on login without a database lookup.
+
+    Users are never deleted and ids only grow, so the filter catches up at
+    most once every ``ttl`` seconds by reading the ids above the highest it
+    has seen, less ``rescan_ids``: ids are not committed in order, and a
+    transaction still open at the last catch-up may commit a lower id after
+    a higher one. It is also rebuilt from scratch every ``rebuild_interval``
+    seconds (or when it outgrows its capacity), which catches rows committed
+    later still.
+    """
+
+    def __init__(self, ttl, rebuild_interval, error_rate, rescan_ids=2000):
+        self.ttl = ttl
+        self.rebuild_interval = rebuild_interval
+        self.error_rate = error_rate
+        self.rescan_ids = rescan_ids
+        self._lock = threading.Lock()
+        self._bloom = None
+        self._max_id = 0
+        self._synced_at = float("-inf")
+        self._built_at = float("-inf")
+
+    def might_exist(self, email):
+        self._sync()
+        return email in self._bloom
+
+    async def might_exist_async(self, session, email):
+        """``might_exist`` for code on an event loop, syncing via ``session``."""
+        await self._sync_async(session)
+        return email in self._bloom
+
+    def add(self, email):
+        """Record a user created by this process (no-op until first use)."""
+        with self._lock:
+            if self._bloom is not None:
+                self._bloom.add(email)
+
+    def _is_fresh(self):
+        return self._bloom is not None and time.monotonic() - self._synced_at < self.ttl
+
+    def _needs_rebuild(self):
+        return (
+            self._bloom is None
+            or time.monotonic() - self._built_at >= self.rebuild_interval
+            or self._bloom.count > self._bloom.capacity
+        )
+
+    def _sync(self):
+        if self._is_fresh():
+            return
+
+        with self._lock:
+            if self._is_fresh():
+                return
+
+            if self._needs_rebuild():
+                total = db.session.execute(select(func.count(User.id))).scalar()
+                self._rebuild(total, db.session.execute(_emails_select()))
+            else:
+                self._add_rows(
+                    self._bloom, db.session.execute(_emails_select(self._rescan_from()))
+                )
+            self._synced_at = time.monotonic()
+
+    async def _sync_async(self, session):
+        # Rows are fetched outside the (thread) lock; only applying them holds it
+        if self._is_fresh():
+            return
+
+        if self._needs_rebuild():
+            total = (await session.execute(select(func.count(User.id)))).scalar()
+            rows = (await session.execute(_emails_select())).all()
+            with self._lock:
+                self._rebuild(total, rows)
+        else:
+            rows = (await session.execute(_emails_select(self._rescan_from()))).all()
+            with self._lock:
+                self._add_rows(self._bloom, rows)
+        self._synced_at = time.monotonic()
+
+    def _rescan_from(self):
+        return max(self._max_id - self.rescan_ids, 0)
+
+    def _rebuild(self, total, rows):
+        bloom = BloomFilter(max(2 * total, 1024), self.error_rate)
+        self._max_id = 0
+        self._add_rows(bloom, rows)
+        self._bloom = bloom
+        self._built_at = time.monotonic()
+
+    def _add_rows(self, bloom, rows):
+        for user_id, email in rows:
+            bloom.add(email)
+            self._max_id = max(self._max_id, user_id)
+
+
+def _emails_select(after_id=None):
+    query = select(User.id, User.email)
+    if after_id is not None:
+        query = query.where(User.id > after_id)
+    return query
+
+
+def get_email_filter():
+    email_filter = current_app.extensions.get("email_filter")
+    if email_filter is None:
+        config = current_app.config
+        email_filter = current_app.extensions.setdefault(
+            "email_filter",
+            EmailFilter(
+                ttl=config["LOGIN_EMAIL_FILTER_TTL"],
+                rebuild_interval=config["LOGIN_EMAIL_FILTER_REBUILD_INTERVAL"],
+                error_rate=config["LOGIN_EMAIL_FILTER_ERROR_RATE"],
+                rescan_ids=config["LOGIN_EMAIL_FILTER_RESCAN_IDS"],
+            ),
+        )
+    return email_filter
+
+
+def authenticate(email, password):
+    """Check credentials with at most one indexed lookup on ``user.email``.
+
+    Returns ``(user, status)`` where ``user`` is a row with ``id``, ``email``,
+    ``inactive_since`` and ``token_version`` (``None`` for unknown emails) and
+    ``status`` is one of ``AUTH_OK``, ``AUTH_INACTIVE`` or ``AUTH_INVALID``.
+    """
+    if not isinstance(email, str) or not isinstance(password, str):
+        return None, AUTH_INVALID
+
+    if current_app.config["LOGIN_EMAIL_FILTER_ENABLED"]:
+        if not get_email_filter().might_exist(email):
+            return None, AUTH_INVALID
+
+    user = db.session.execute(_credentials_select(email)).first()
+    if user is None:
+        return None, AUTH_INVALID
+
+    hasher = get_password_hasher()
+    if not hasher.verify(password, user.password):
+        return None, AUTH_INVALID
+
+    if hasher.needs_rehash(user.password):
+        try:
+            db.session.execute(
+                update(User)
+                .where(User.id == user.id)
+                .values(password=hasher.hash(password))
+            )
+            db.session.commit()
+        except PasswordHasherBusy:
+            # Not worth failing a valid login over; try again next time
+            pass
+
+    return user, _status(user)
+
+
+def _credentials_select(email):
+    # The token version is read in the same statement as the status, so a
+    # token issued from this row is checked against exactly the revocations
+    # committed after it
+    return select(
+        User.id, User.email, User.password, User.inactive_since, token_version()
+    ).where(User.email == email)
+
+
+def _status(user):
+    return AUTH_OK if user.inactive_since is None else AUTH_INACTIVE
@@ -0,0 +1,267 @@
+import hashlib
+import threading
+import time
+from bisect import bisect_right
+from collections import OrderedDict
+from flask import current_app
+from sqlalchemy import select
+from app.models import CacheVersion, Role, db
+from app.serializers import dumps, serialize_role
+from app.services.dialect import insert_for
+
+ROLE_VERSION = "role"
+USER_VERSION = "user"
+USER_ROLES_VERSION = "user_roles"
+TOKEN_REVOCATION_VERSION = "token_revocations"
+
+_MISSING = object()
+
+
+def _version_select(name):
+    return select(CacheVersion.version).where(CacheVersion.name == name)
+
+
+def get_version(name):
+    return db.session.execute(_version_select(name)).scalar() or 0
+
+
+def _versions_select(names):
+    return select(CacheVersion.name, CacheVersion.version).where(
+        CacheVersion.name.in_(names)
+    )
+
+
+def _ordered_versions(rows, names):
+    versions = dict(rows)
+    return tuple(versions.get(name, 0) for name in names)
+
+
+def get_versions(*names):
+    """Current value of each named counter, read in one query."""
+    rows = db.session.execute(_versions_select(names)).all()
+    return _ordered_versions(rows, names)
+
+
+async def get_versions_async(session, *names):
+    rows = (await session.execute(_versions_select(names))).all()
+    return _ordered_versions(rows, names)
+
+
+def etag_for(*parts):
+    """Strong ETag value for a response determined entirely by ``parts``."""
+    return hashlib.sha1(repr(parts).encode()).hexdigest()
+
+
+def bump_version(name):
+    """Increment a shared change counter inside the caller's transaction.
+
+    Returns the new value.
+    """
+    stmt = insert_for(CacheVersion.__table__).values(name=name, version=1)
+    return db.session.execute(
+        stmt.on_conflict_do_update(
+            index_elements=[CacheVersion.name],
+            set_={"version": CacheVersion.version + 1},
+        ).returning(CacheVersion.version)
+    ).scalar_one()
+
+
+_ROLES_SELECT = select(Role.role_id, Role.role_name, Role.department_name)
+
+
+class RoleCatalog:
+    """Process-local copy of the (small, almost read-only) role table.
+
+    Lookups are served from memory. At most once every ``ttl`` seconds the
+    shared ``role`` version row is read and the catalog reloaded if another
+    process has created a role since. Misses force that check, so a role
+    created by another worker is found as soon as it is asked for.
+
+    Code running on an event loop awaits ``refresh_async`` first and then
+    looks up with ``refresh=False``, so no blocking query runs on the loop.
+    """
+
+    def __init__(self, ttl):
+        self.ttl = ttl
+        self._lock = threading.Lock()
+        self._version = None
+        self._checked_at = float("-inf")
+        self._by_id = {}
+        self._fragments = {}
+        self._sorted = ([], [])
+
+    def get(self, role_id):
+        self._refresh()
+        role = self._by_id.get(role_id)
+        if role is None:
+            self._refresh(force=True)
+            role = self._by_id.get(role_id)
+        return role
+
+    def resolve(self, role_ids, refresh=True):
+        """Map role ids to role dicts, in the order given."""
+        if refresh:
+            self._refresh()
+            if any(role_id not in self._by_id for role_id in role_ids):
+                self._refresh(force=True)
+        by_id = self._by_id
+        return [by_id[role_id] for role_id in role_ids if role_id in by_id]
+
+    def fragments(self, role_ids, refresh=True):
+        """Map role ids to already-encoded JSON bytes for many users at once.
+
+        Returns the whole mapping (callers look each id up themselves) once
+        every id in ``role_ids`` is known or a forced refresh has been tried.
+        """
+        if refresh:
+            self._refresh()
+            if not self._fragments.keys() >= role_ids:
+                self._refresh(force=True)
+        return self._fragments
+
+    def listing(self, after=None, limit=None, refresh=True):
+        """Roles ordered by (department_name, role_name), after the given key."""
+        if refresh:
+            self._refresh()
+        roles, keys = self._sorted
+        start = bisect_right(keys, tuple(after)) if after is not None else 0
+        end = None if limit is None else start + limit
+        return roles[start:end]
+
+    def version(self, refresh=True):
+        """The shared role version the catalog currently reflects."""
+        if refresh:
+            self._refresh()
+        return self._version
+
+    async def refresh_async(self, session, role_ids=()):
+        """The TTL check of the lookups, on an ``AsyncSession``.
+
+        Any of ``role_ids`` the catalog does not know forces the check.
+        """
+        force = not self._by_id.keys() >= set(role_ids)
+        if not force and time.monotonic() - self._checked_at < self.ttl:
+            return
+
+        version = (await session.execute(_version_select(ROLE_VERSION))).scalar() or 0
+        if version != self._version:
+            rows = (await session.execute(_ROLES_SELECT)).all()
+            with self._lock:
+                self._install(rows)
+                self._version = version
+        self._checked_at = time.monotonic()
+
+    def invalidate(self):
+        with self._lock:
+            self._version = None
+            self._checked_at = float("-inf")
+
+    def _refresh(self, force=False):
+        if not force and time.monotonic() - self._checked_at < self.ttl:
+            return
+
+        with self._lock:
+            if not force and time.monotonic() - self._checked_at < self.ttl:
+                return
+
+            # Read the version before the rows: a role created in between is
+            # picked up now and simply triggers one more reload next time.
+            version = get_version(ROLE_VERSION)
+            if version != self._version:
+                self._load()
+                self._version = version
+            self._checked_at = time.monotonic()
+
+    def _load(self):
+        self._install(db.session.execute(_ROLES_SELECT))
+
+    def _install(self, rows):
+        roles = [serialize_role(*row) for row in rows]
+        roles.sort(key=lambda role: (role["department_name"], role["role_name"]))
+
+        self._by_id = {role["role_id"]: role for role in roles}
+        self._fragments = {role["role_id"]: dumps(role) for role in roles}
+        self._sorted = (
+            roles,
+            [(role["department_name"], role["role_name"]) for role in roles],
+        )
+
+
+def get_role_catalog():
+    catalog = current_app.extensions.get("role_catalog")
+    if catalog is None:
+        catalog = current_app.extensions.setdefault(
+            "role_catalog", RoleCatalog(ttl=current_app.config["ROLE_CACHE_TTL"])
+        )
+    return catalog
+
+
+class LRUCache:
+    """Bounded, thread-safe LRU mapping whose entries expire after ``ttl``.
+
+    Hit, miss and eviction counters are kept so the size and TTL can be tuned
+    from ``stats()``. Expired entries count as misses, not evictions.
+    """
+
+    def __init__(self, max_entries, ttl):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get(self, key, default=None):
+        with self._lock:
+            entry = self._entries.get(key, _MISSING)
+            if entry is not _MISSING and entry[1] > time.monotonic():
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return entry[0]
+
+            if entry is not _MISSING:
+                del self._entries[key]
+            self.misses += 1
+            return default
+
+    def set(self, key, value):
+        with self._lock:
+            self._entries[key] = (value, time.monotonic() + self.ttl)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def invalidate(self, key):
+        with self._lock:
+            self._entries.pop(key, None)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self):
+        with self._lock:
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "size": len(self._entries),
+                "max_entries": self.max_entries,
+                "ttl": self.ttl,
+            }
+
+
+def get_user_roles_cache():
+    """Per-app cache of serialized role lists, keyed by user id."""
+    cache = current_app.extensions.get("user_roles_cache")
+    if cache is None:
+        cache = current_app.extensions.setdefault(
+            "user_roles_cache",
+            LRUCache(
+                max_entries=current_app.config["USER_ROLES_CACHE_MAX_ENTRIES"],
+                ttl=current_app.config["USER_ROLES_CACHE_TTL"],
+            ),
+        )
+    return cache
@@ -0,0 +1,31 @@
+from importlib import import_module
+from app.extensions import db
+
+# Dialect modules are imported on first use, so only the one in use is loaded
+_INSERTS = {
+    "sqlite": "sqlalchemy.dialects.sqlite",
+    "postgresql": "sqlalchemy.dialects.postgresql",
+}
+
+
+def check_dialects(app):
+    """Fail at startup on a database whose upserts ``insert_for`` cannot
+    build, rather than on the first write."""
+    with app.app_context():
+        for engine in db.engines.values():
+            dialect = engine.dialect.name
+            if dialect not in _INSERTS:
+                raise ValueError(
+                    f"Unsupported database '{dialect}': the app's writes need "
+                    f"ON CONFLICT inserts. Use one of: {', '.join(_INSERTS)}"
+                )
+
+
+def insert_for(table):
+    """Return a dialect-specific INSERT that supports ON CONFLICT clauses."""
+    dialect = db.engine.dialect.name
+    try:
+        module = _INSERTS[dialect]
+    except KeyError:
+        raise NotImplementedError(f"ON CONFLICT inserts are not supported on {dialect}")
+    return import_module(module).insert(table)
@@ -0,0 +1,395 @@
+"""Report exports to files on local disk, run on a bounded background pool.
+
+An export job reads the report in id-ordered chunks (like the streamed
+report), appends each chunk to a CSV or Parquet file and records its
+progress, so neither a request thread nor memory is held for the whole
+export. Parquet needs pyarrow, which is optional.
+
+Jobs run in the process that queued them. Its runner keeps a heartbeat on
+each of its queued and running jobs, so the jobs of a process that exited
+are found by their stale heartbeat and marked failed. A worker only writes
+to a job while it is still running, so a job failed that way stays failed.
+Finished jobs and their files are deleted after ``EXPORT_RETENTION``.
+"""
+import csv
+import importlib.util
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+from pathlib import Path
+from flask import current_app
+from sqlalchemy import delete, update
+from ..extensions import db
+from ..models import ExportJob
+from ..serializers import serialize_export_job
+from .cache import get_role_catalog
+from .summary_service import count_users
+from .user_service import _iter_report_chunks
+
+# pyarrow is slow to import, so it is only looked for here and imported when
+# a Parquet export actually runs
+HAS_PYARROW = importlib.util.find_spec("pyarrow") is not None
+
+QUEUED = "queued"
+RUNNING = "running"
+DONE = "done"
+FAILED = "failed"
+
+COLUMNS = ("id", "username", "email", "is_active", "inactive_since", "roles")
+
+
+class ExportQueueFull(Exception):
+    """Too many exports are queued already; the request should be shed (503)."""
+
+
+class CSVWriter:
+    extension = ".csv"
+
+    def __init__(self, path):
+        self._file = open(path, "w", newline="", encoding="utf-8")
+        self._writer = csv.writer(self._file)
+        self._writer.writerow(COLUMNS)
+
+    def write(self, rows):
+        self._writer.writerows(
+            (
+                user_id,
+                username,
+                email,
+                "true" if is_active else "false",
+                inactive_since.isoformat() if inactive_since else "",
+                ";".join(roles),
+            )
+            for user_id, username, email, is_active, inactive_since, roles in rows
+        )
+
+    def close(self):
+        self._file.close()
+
+
+class ParquetWriter:
+    extension = ".parquet"
+
+    def __init__(self, path):
+        import pyarrow
+        import pyarrow.parquet
+
+        self._schema = pyarrow.schema(
+            [
+                ("id", pyarrow.int64()),
+                ("username", pyarrow.string()),
+                ("email", pyarrow.string()),
+                ("is_active", pyarrow.bool_()),
+                ("inactive_since", pyarrow.timestamp("us")),
+                ("roles", pyarrow.list_(pyarrow.string())),
+            ]
+        )
+        self._writer = pyarrow.parquet.ParquetWriter(path, self._schema)
+
+    def write(self, rows):
+        import pyarrow
+
+        # One row group per chunk
+        arrays = [
+            pyarrow.array(column, type=field.type)
+            for column, field in zip(zip(*rows), self._schema)
+        ]
+        self._writer.write_table(pyarrow.Table.from_arrays(arrays, schema=self._schema))
+
+    def close(self):
+        self._writer.close()
+
+
+def export_formats():
+    formats = {"csv": CSVWriter}
+    if HAS_PYARROW:
+        formats["parquet"] = ParquetWriter
+    return formats
+
+
+class ExportRunner:
+    """Runs export jobs on ``workers`` threads with room for ``queue_size``
+    more; beyond that ``submit`` raises ``ExportQueueFull`` right away."""
+
+    def __init__(self, app, workers, queue_size):
+        self.app = app
+        self._pool = ThreadPoolExecutor(
+            max_workers=workers, thread_name_prefix="report-export"
+        )
+        self._slots = threading.BoundedSemaphore(workers + queue_size)
+        self._lock = threading.Lock()
+        # Ids of the jobs queued or running here
+        self._pending = set()
+
+    def submit(self, job_id):
+        if not self._slots.acquire(blocking=False):
+            raise ExportQueueFull("Export queue is full")
+
+        with self._lock:
+            self._pending.add(job_id)
+        try:
+            future = self._pool.submit(self._run, job_id)
+        except BaseException:
+            self._done(job_id)
+            raise
+
+        future.add_done_callback(lambda _: self._done(job_id))
+        return future
+
+    def heartbeat(self):
+        """Mark every job queued or running here as still alive."""
+        with self._lock:
+            job_ids = list(self._pending)
+        if job_ids:
+            with db.engine.begin() as connection:
+                connection.execute(
+                    update(ExportJob)
+                    .where(ExportJob.id.in_(job_ids))
+                    .values(heartbeat_at=datetime.utcnow())
+                )
+
+    def _done(self, job_id):
+        with self._lock:
+            self._pending.discard(job_id)
+        self._slots.release()
+
+    def shutdown(self):
+        self._pool.shutdown(wait=True)
+
+    def _run(self, job_id):
+        with self.app.app_context():
+            try:
+                _export(job_id, self.heartbeat)
+            except Exception as ex:
+                self.app.logger.exception("Report export %s failed", job_id)
+                _update_job(
+                    job_id,
+                    ExportJob.status.in_((QUEUED, RUNNING)),
+                    status=FAILED,
+                    error=str(ex),
+                    finished_at=datetime.utcnow(),
+                )
+            finally:
+                db.session.remove()
+
+
+def get_export_runner():
+    runner = current_app.extensions.get("export_runner")
+    if runner is None:
+        config = current_app.config
+        runner = current_app.extensions.setdefault(
+            "export_runner",
+            ExportRunner(
+                current_app._get_current_object(),
+                workers=config["EXPORT_WORKERS"],
+                queue_size=config["EXPORT_QUEUE_SIZE"],
+            ),
+        )
+        # Jobs left behind by processes that have stopped since
+        fail_stale_exports()
+        purge_expired_exports()
+    return runner
+
+
+def export_dir():
+    directory = current_app.config["EXPORT_DIR"] or os.path.join(
+        current_app.instance_path, "exports"
+    )
+    return Path(directory).absolute()
+
+
+def create_export(status="all", export_format="csv"):
+    if status not in ("all", "active", "inactive"):
+        raise ValueError("Invalid status. Use 'all', 'active', or 'inactive'")
+    if export_format not in export_formats():
+        raise ValueError(
+            f"Unsupported format '{export_format}'. "
+            f"Use one of: {', '.join(export_formats())}"
+        )
+
+    purge_expired_exports()
+    now = datetime.utcnow()
+    job = ExportJob(
+        status=QUEUED,
+        format=export_format,
+        status_filter=status,
+        total_users=count_users(status),
+        exported_users=0,
+        created_at=now,
+        heartbeat_at=now,
+    )
+    db.session.add(job)
+    db.session.commit()
+
+    try:
+        get_export_runner().submit(job.id)
+    except ExportQueueFull:
+        db.session.delete(job)
+        db.session.commit()
+        raise
+
+    return serialize_export_job(job)
+
+
+def get_export(export_id):
+    job = db.session.get(ExportJob, export_id)
+    if job is None:
+        raise ValueError(f"Export with id {export_id} not found")
+    if job.status in (QUEUED, RUNNING) and job.heartbeat_at < _stale_before():
+        fail_stale_exports()
+        db.session.refresh(job)
+    return serialize_export_job(job)
+
+
+def _stale_before():
+    return datetime.utcnow() - timedelta(
+        seconds=current_app.config["EXPORT_STALE_AFTER"]
+    )
+
+
+def fail_stale_exports():
+    """Mark queued or running exports with a stale heartbeat as failed and
+    delete their partial files. Returns how many were failed."""
+    with db.engine.begin() as connection:
+        job_ids = (
+            connection.execute(
+                update(ExportJob)
+                .where(
+                    ExportJob.status.in_((QUEUED, RUNNING)),
+                    ExportJob.heartbeat_at < _stale_before(),
+                )
+                .values(
+                    status=FAILED,
+                    error="The export's worker stopped before it finished",
+                    finished_at=datetime.utcnow(),
+                )
+                .returning(ExportJob.id)
+            )
+            .scalars()
+            .all()
+        )
+
+    directory = export_dir()
+    for job_id in job_ids:
+        for partial in directory.glob(f"users-report-{job_id}.*.part"):
+            partial.unlink(missing_ok=True)
+    return len(job_ids)
+
+
+def purge_expired_exports():
+    """Delete finished exports (and their files) older than
+    ``EXPORT_RETENTION`` seconds; 0 keeps them. Returns how many went."""
+    retention = current_app.config["EXPORT_RETENTION"]
+    if not retention:
+        return 0
+
+    with db.engine.begin() as connection:
+        file_names = (
+            connection.execute(
+                delete(ExportJob)
+                .where(
+                    ExportJob.status.in_((DONE, FAILED)),
+                    ExportJob.finished_at
+                    < datetime.utcnow() - timedelta(seconds=retention),
+                )
+                .returning(ExportJob.file_name)
+            )
+            .scalars()
+            .all()
+        )
+
+    directory = export_dir()
+    for file_name in file_names:
+        if file_name is not None:
+            (directory / file_name).unlink(missing_ok=True)
+    return len(file_names)
+
+
+def export_file(export_id):
+    """Path of a finished export's file, or None while it is not done."""
+    job = db.session.get(ExportJob, export_id)
+    if job is None:
+        raise ValueError(f"Export with id {export_id} not found")
+    return export_dir() / job.file_name if job.status == DONE else None
+
+
+def _update_job(job_id, *where, **values):
+    # Committed on its own connection: progress is visible right away, and
+    # the export's session never writes, so its reads may use the replica
+    with db.engine.begin() as connection:
+        return connection.execute(
+            update(ExportJob).where(ExportJob.id == job_id, *where).values(**values)
+        ).rowcount
+
+
+def _export(job_id, heartbeat):
+    job = db.session.get(ExportJob, job_id)
+    status, writer_class = job.status_filter, export_formats()[job.format]
+    started = _update_job(
+        job_id,
+        ExportJob.status == QUEUED,
+        status=RUNNING,
+        heartbeat_at=datetime.utcnow(),
+    )
+    if not started:
+        # Failed as stale while it waited
+        return
+
+    directory = export_dir()
+    directory.mkdir(parents=True, exist_ok=True)
+    file_name = f"users-report-{job_id}{writer_class.extension}"
+    # Written under a temporary name; the download only ever sees a whole file
+    partial = directory / (file_name + ".part")
+
+    catalog = get_role_catalog()
+    exported = 0
+    running = True
+    writer = writer_class(partial)
+    try:
+        chunk_size = current_app.config["EXPORT_CHUNK_SIZE"]
+        for users, role_ids_by_user in _iter_report_chunks(status, chunk_size):
+            writer.write(
+                [
+                    (
+                        user.id,
+                        user.username,
+                        user.email,
+                        user.inactive_since is None,
+                        user.inactive_since,
+                        [
+                            f"{role['department_name']}:{role['role_name']}"
+                            for role in catalog.resolve(role_ids_by_user[user.id])
+                        ],
+                    )
+                    for user in users
+                ]
+            )
+            exported += len(users)
+            running = _update_job(
+                job_id, ExportJob.status == RUNNING, exported_users=exported
+            )
+            if not running:
+                # Failed as stale meanwhile; it stays failed
+                break
+            heartbeat()
+    except BaseException:
+        writer.close()
+        partial.unlink(missing_ok=True)
+        raise
+    writer.close()
+    if not running:
+        partial.unlink(missing_ok=True)
+        return
+
+    os.replace(partial, directory / file_name)
+    done = _update_job(
+        job_id,
+        ExportJob.status == RUNNING,
+        status=DONE,
+        file_name=file_name,
+        exported_users=exported,
+        finished_at=datetime.utcnow(),
+    )
+    if not done:
+        (directory / file_name).unlink(missing_ok=True)
@@ -0,0 +1,45 @@
+import base64
+import binascii
+import json
+
+
+def encode_cursor(key):
+    """Encode the last seen sort key as an opaque, URL-safe cursor string."""
+    raw = json.dumps(key, separators=(",", ":")).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip("=")
+
+
+def decode_cursor(cursor):
+    padded = cursor + "=" * (-len(cursor) % 4)
+    try:
+        return json.loads(base64.urlsafe_b64decode(padded.encode()))
+    except (binascii.Error, UnicodeDecodeError, ValueError):
+        raise ValueError("Invalid cursor")
+
+
+def parse_limit(value, max_limit):
+    if value is None:
+        return None
+
+    try:
+        limit = int(value)
+    except ValueError:
+        raise ValueError("limit must be an integer")
+
+    if limit < 1 or limit > max_limit:
+        raise ValueError(f"limit must be between 1 and {max_limit}")
+
+    return limit
+
+
+def split_page(rows, limit, key):
+    """Trim a ``limit + 1`` result set down to one page.
+
+    Returns the page and the cursor for the next one, or ``None`` when the
+    extra row was not there (i.e. this is the last page).
+    """
+    if limit is None or len(rows) <= limit:
+        return rows, None
+
+    page = rows[:limit]
+    return page, encode_cursor(key(page[-1]))
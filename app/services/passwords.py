@@ -0,0 +1,104 @@
+import asyncio
+import hmac
+import threading
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+import bcrypt
+from flask import current_app
+
+
+class PasswordHasherBusy(Exception):
+    """The hashing queue is full; the request should be shed (503)."""
+
+
+def _hash(password, rounds):
+    return bcrypt.hashpw(password.encode(), bcrypt.gensalt(rounds)).decode()
+
+
+def _verify(password, hashed):
+    return bcrypt.checkpw(password.encode(), hashed.encode())
+
+
+def _bcrypt_cost(hashed):
+    # "$2b$12$<salt+digest>" -> 12
+    parts = hashed.split("$")
+    if len(parts) != 4 or not parts[1].startswith("2") or not parts[2].isdigit():
+        return None
+    return int(parts[2])
+
+
+class PasswordHasher:
+    """Runs bcrypt on a bounded worker pool instead of the request thread.
+
+    At most ``workers`` hashes run at once and ``queue_size`` more may wait;
+    beyond that ``hash`` and ``verify`` raise ``PasswordHasherBusy`` right
+    away rather than letting requests pile up behind the CPU.
+    """
+
+    def __init__(self, rounds, workers, queue_size, executor="thread"):
+        self.rounds = rounds
+        pool_class = (
+            ProcessPoolExecutor if executor == "process" else ThreadPoolExecutor
+        )
+        self._pool = pool_class(max_workers=workers)
+        self._slots = threading.BoundedSemaphore(workers + queue_size)
+
+    def hash(self, password):
+        return self._submit(_hash, password, self.rounds).result()
+
+    def hash_many(self, passwords):
+        """Hash a batch, waiting for free slots instead of shedding load."""
+        futures = [
+            self._submit(_hash, password, self.rounds, block=True)
+            for password in passwords
+        ]
+        return [future.result() for future in futures]
+
+    def verify(self, password, hashed):
+        if _bcrypt_cost(hashed) is None:
+            # Plaintext stored before hashing was enabled; upgraded on login
+            return hmac.compare_digest(password.encode(), hashed.encode())
+        return self._submit(_verify, password, hashed).result()
+
+    async def hash_async(self, password):
+        """``hash`` that awaits the pool instead of blocking the event loop."""
+        return await asyncio.wrap_future(self._submit(_hash, password, self.rounds))
+
+    async def verify_async(self, password, hashed):
+        if _bcrypt_cost(hashed) is None:
+            return hmac.compare_digest(password.encode(), hashed.encode())
+        return await asyncio.wrap_future(self._submit(_verify, password, hashed))
+
+    def needs_rehash(self, hashed):
+        return _bcrypt_cost(hashed) != self.rounds
+
+    def shutdown(self):
+        self._pool.shutdown(wait=True)
+
+    def _submit(self, fn, *args, block=False):
+        if not self._slots.acquire(blocking=block):
+            raise PasswordHasherBusy("Password hashing queue is full")
+
+        try:
+            future = self._pool.submit(fn, *args)
+        except BaseException:
+            self._slots.release()
+            raise
+
+        future.add_done_callback(lambda _: self._slots.release())
+        return future
+
+
+def get_password_hasher():
+    hasher = current_app.extensions.get("password_hasher")
+    if hasher is None:
+        config = current_app.config
+        hasher = current_app.extensions.setdefault(
+            "password_hasher",
+            PasswordHasher(
+                rounds=config["BCRYPT_LOG_ROUNDS"],
+                workers=config["PASSWORD_HASH_WORKERS"],
+                queue_size=config["PASSWORD_HASH_QUEUE_SIZE"],
+                executor=config["PASSWORD_HASH_EXECUTOR"],
+            ),
+        )
+    return hasher
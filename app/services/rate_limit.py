@@ -0,0 +1,243 @@
+"""Token-bucket rate limiting for ``/login``.
+
+Every login attempt takes a token from the client IP's bucket, and every
+failed one from the bucket of the email it named, kept per IP. A bucket
+holds up to ``capacity`` tokens and refills at ``capacity / period`` tokens
+per second, so a client may burst ``capacity`` attempts and then keeps one
+per ``period / capacity`` seconds. Both buckets are checked before any query
+or password hash; an empty email bucket only stops that IP, so guessing a
+password from elsewhere never locks its owner out.
+
+Buckets live in memory (one process) or in a SQLite file that every worker
+process on the host opens, so they share one budget. That file is separate
+from the application database.
+"""
+import asyncio
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from flask import current_app
+
+
+class RateLimited(Exception):
+    """The bucket is empty; retry in ``retry_after`` seconds (429)."""
+
+    def __init__(self, retry_after):
+        super().__init__(f"Rate limited, retry in {retry_after:.1f}s")
+        self.retry_after = retry_after
+
+
+def _refill(tokens, updated, now, capacity, period):
+    """A bucket's token count at ``now`` and how long until it holds one."""
+    rate = capacity / period
+    tokens = min(capacity, tokens + max(0.0, now - updated) * rate)
+    return tokens, max(0.0, (1 - tokens) / rate)
+
+
+def _take(tokens, updated, now, capacity, period):
+    """Refill a bucket up to ``now`` and take one token.
+
+    Returns the new token count and how long to wait (0 when a token was
+    taken).
+    """
+    tokens, wait = _refill(tokens, updated, now, capacity, period)
+    if not wait:
+        return tokens - 1, 0.0
+    return tokens, wait
+
+
+class MemoryBucketStore:
+    """Buckets in a dict, for a single process.
+
+    At most ``max_keys`` buckets are kept; the least recently used is dropped
+    first, which at worst hands its key a full bucket again.
+    """
+
+    blocking = False
+
+    def __init__(self, max_keys=100000, clock=time.monotonic):
+        self.max_keys = max_keys
+        self._clock = clock
+        self._buckets = OrderedDict()
+        self._lock = threading.Lock()
+
+    def take(self, key, capacity, period):
+        with self._lock:
+            now = self._clock()
+            tokens, updated = self._buckets.pop(key, (capacity, now))
+            tokens, wait = _take(tokens, updated, now, capacity, period)
+            self._buckets[key] = (tokens, now)
+            if len(self._buckets) > self.max_keys:
+                self._buckets.popitem(last=False)
+        return wait
+
+    def peek(self, key, capacity, period):
+        """How long until ``key`` holds a token, without taking it."""
+        with self._lock:
+            now = self._clock()
+            tokens, updated = self._buckets.get(key, (capacity, now))
+        return _refill(tokens, updated, now, capacity, period)[1]
+
+
+class SQLiteBucketStore:
+    """Buckets in a table of a SQLite file shared by the worker processes.
+
+    Each take is one short ``BEGIN IMMEDIATE`` transaction. Buckets that
+    have been full for a while are pruned every ``prune_every`` takes.
+    """
+
+    blocking = True
+
+    def __init__(self, path, prune_every=1000, clock=time.time):
+        self.path = str(path)
+        self.prune_every = prune_every
+        self._clock = clock
+        self._local = threading.local()
+        self._takes = 0
+        with self._connect() as connection:
+            connection.execute(
+                "CREATE TABLE IF NOT EXISTS rate_limit_buckets ("
+                "key TEXT PRIMARY KEY, tokens REAL NOT NULL, "
+                "updated REAL NOT NULL, full_at REAL NOT NULL)"
+            )
+
+    def _connect(self):
+        connection = getattr(self._local, "connection", None)
+        if connection is None:
+            connection = sqlite3.connect(
+                self.path, timeout=5, isolation_level=None, check_same_thread=False
+            )
+            # Buckets lost in a crash only hand out a few extra attempts
+            connection.execute("PRAGMA journal_mode=WAL")
+            connection.execute("PRAGMA synchronous=OFF")
+            self._local.connection = connection
+        return connection
+
+    def take(self, key, capacity, period):
+        connection = self._connect()
+        connection.execute("BEGIN IMMEDIATE")
+        try:
+            now = self._clock()
+            row = connection.execute(
+                "SELECT tokens, updated FROM rate_limit_buckets WHERE key = ?",
+                (key,),
+            ).fetchone()
+            tokens, updated = row or (capacity, now)
+            tokens, wait = _take(tokens, updated, now, capacity, period)
+            full_at = now + (capacity - tokens) * period / capacity
+            connection.execute(
+                "INSERT INTO rate_limit_buckets (key, tokens, updated, full_at) "
+                "VALUES (?, ?, ?, ?) ON CONFLICT (key) DO UPDATE SET "
+                "tokens = excluded.tokens, updated = excluded.updated, "
+                "full_at = excluded.full_at",
+                (key, tokens, now, full_at),
+            )
+            self._takes += 1
+            if self._takes % self.prune_every == 0:
+                # A full bucket is the same as no bucket
+                connection.execute(
+                    "DELETE FROM rate_limit_buckets WHERE full_at <= ?", (now,)
+                )
+            connection.execute("COMMIT")
+        except BaseException:
+            connection.execute("ROLLBACK")
+            raise
+        return wait
+
+    def peek(self, key, capacity, period):
+        """How long until ``key`` holds a token, without taking it."""
+        now = self._clock()
+        row = (
+            self._connect()
+            .execute(
+                "SELECT tokens, updated FROM rate_limit_buckets WHERE key = ?",
+                (key,),
+            )
+            .fetchone()
+        )
+        tokens, updated = row or (capacity, now)
+        return _refill(tokens, updated, now, capacity, period)[1]
+
+
+class LoginRateLimiter:
+    """Per-IP and per-(email, IP) buckets in front of ``authenticate``.
+
+    ``ip_limit`` and ``email_limit`` are ``(capacity, period_seconds)``.
+    """
+
+    def __init__(self, store, ip_limit, email_limit):
+        self.store = store
+        self.ip_limit = ip_limit
+        self.email_limit = email_limit
+
+    def check(self, ip, email):
+        """Take the IP's token for this login; raises ``RateLimited`` if there
+        is none, or if this IP has used up its failures for the email. An IP
+        over its limit does not count against the email."""
+        wait = self.store.take(f"ip:{ip}", *self.ip_limit)
+        key = _email_key(ip, email)
+        if not wait and key is not None:
+            wait = self.store.peek(key, *self.email_limit)
+        if wait:
+            raise RateLimited(wait)
+
+    def record_failure(self, ip, email):
+        """Take a token from the email's bucket after a failed login."""
+        key = _email_key(ip, email)
+        if key is not None:
+            self.store.take(key, *self.email_limit)
+
+    async def check_async(self, ip, email):
+        await self._run_async(self.check, ip, email)
+
+    async def record_failure_async(self, ip, email):
+        await self._run_async(self.record_failure, ip, email)
+
+    async def _run_async(self, method, *args):
+        # The SQLite store may wait on another worker's transaction
+        if self.store.blocking:
+            await asyncio.to_thread(method, *args)
+        else:
+            method(*args)
+
+
+def _email_key(ip, email):
+    if not isinstance(email, str):
+        return None
+    return f"email:{email.strip().lower()}:{ip}"
+
+
+def _create_store(config, instance_path):
+    storage = config["LOGIN_RATE_LIMIT_STORAGE"]
+    if storage == "memory":
+        return MemoryBucketStore(max_keys=config["LOGIN_RATE_LIMIT_MAX_KEYS"])
+    if storage == "sqlite":
+        path = config["LOGIN_RATE_LIMIT_SQLITE_PATH"]
+        if path is None:
+            os.makedirs(instance_path, exist_ok=True)
+            path = os.path.join(instance_path, "rate_limits.db")
+        return SQLiteBucketStore(path)
+    raise ValueError(
+        f"Unknown LOGIN_RATE_LIMIT_STORAGE '{storage}'. Use 'memory' or 'sqlite'"
+    )
+
+
+def get_login_limiter():
+    """The app's login limiter, or None when rate limiting is disabled."""
+    config = current_app.config
+    if not config["LOGIN_RATE_LIMIT_ENABLED"]:
+        return None
+
+    limiter = current_app.extensions.get("login_rate_limiter")
+    if limiter is None:
+        limiter = current_app.extensions.setdefault(
+            "login_rate_limiter",
+            LoginRateLimiter(
+                _create_store(config, current_app.instance_path),
+                ip_limit=config["LOGIN_RATE_LIMIT_PER_IP"],
+                email_limit=config["LOGIN_RATE_LIMIT_PER_EMAIL"],
+            ),
+        )
+    return limiter
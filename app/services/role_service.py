@@ -1,6 +1,20 @@
-from app.models import User, Role, db
+from app.models import User, Role, db, user_roles
+from sqlalchemy import delete, select, tuple_
 from sqlalchemy.exc import IntegrityError
-from datetime import datetime
+from app.services.cache import (
+    ROLE_VERSION,
+    USER_ROLES_VERSION,
+    bump_version,
+    etag_for,
+    get_role_catalog,
+    get_user_roles_cache,
+)
+from app.database import replica_reads
+from app.serializers import serialize_role
+from app.services.dialect import insert_for
+from app.services.pagination import decode_cursor, split_page
+from app.services.summary_service import count_role_changes, lock_users
+from app.services.tokens import get_revocation_list, revoke_tokens
 
 
 def create_role(role_name, department_name):
@@ -8,101 +22,293 @@ def create_role(role_name, department_name):
     db.session.add(role)
 
     try:
+        bump_version(ROLE_VERSION)
         db.session.commit()
     except IntegrityError:
         db.session.rollback()
         raise ValueError("Role with this name and department already exists")
 
-    return {
-        "role_id": role.role_id,
-        "role_name": role.role_name,
-        "department_name": role.department_name,
-    }
+    get_role_catalog().invalidate()
 
+    return serialize_role(role.role_id, role.role_name, role.department_name)
 
-def assign_role_to_user(user_id, role_id):
+
+def _role_ids_for_user(user_id):
+    return list(
+        db.session.execute(
+            select(user_roles.c.role_id)
+            .where(user_roles.c.user_id == user_id)
+            .order_by(user_roles.c.role_id)
+        ).scalars()
+    )
+
+
+def _get_user_and_role(user_id, role_id):
     user = db.session.get(User, user_id)
     if not user:
         raise ValueError(f"User with id {user_id} not found")
 
-    role = db.session.get(Role, role_id)
+    role = get_role_catalog().get(role_id)
     if not role:
         raise ValueError(f"Role with id {role_id} not found")
 
-    if role not in user.roles:
-        user.roles.append(role)
+    return user, role
+
+
+def assign_role_to_user(user_id, role_id):
+    user, role = _get_user_and_role(user_id, role_id)
+    username = user.username
+
+    role_ids = _role_ids_for_user(user_id)
+    if role_id not in role_ids:
+        # ON CONFLICT DO NOTHING: a concurrent request granting the same role
+        # is not an error
+        result = db.session.execute(
+            insert_for(user_roles)
+            .values(user_id=user_id, role_id=role_id)
+            .on_conflict_do_nothing()
+        )
+        bump_version(USER_ROLES_VERSION)
+        if result.rowcount:
+            count_role_changes(_role_changes("grant", {(user_id, role_id)}).values())
+            revoke_tokens([user_id])
         db.session.commit()
+        get_revocation_list().invalidate()
+        role_ids = sorted(role_ids + [role_id])
 
-    return {
-        "user_id": user.id,
-        "username": user.username,
-        "roles": [
-            {
-                "role_id": r.role_id,
-                "role_name": r.role_name,
-                "department_name": r.department_name,
-            }
-            for r in user.roles
-        ],
-    }
+    roles = get_role_catalog().resolve(role_ids)
+    get_user_roles_cache().set(user_id, roles)
+
+    return {"user_id": user_id, "username": username, "roles": roles}
 
 
 def remove_role_from_user(user_id, role_id):
     """Remove a role from a user"""
-    user = db.session.get(User, user_id)
-    if not user:
-        raise ValueError(f"User with id {user_id} not found")
-
-    role = db.session.get(Role, role_id)
-    if not role:
-        raise ValueError(f"Role with id {role_id} not found")
+    user, role = _get_user_and_role(user_id, role_id)
+    username = user.username
 
-    if role in user.roles:
-        user.roles.remove(role)
+    role_ids = _role_ids_for_user(user_id)
+    if role_id in role_ids:
+        result = db.session.execute(
+            delete(user_roles).where(
+                user_roles.c.user_id == user_id, user_roles.c.role_id == role_id
+            )
+        )
+        bump_version(USER_ROLES_VERSION)
+        if result.rowcount:
+            count_role_changes(_role_changes("revoke", {(user_id, role_id)}).values())
+            revoke_tokens([user_id])
         db.session.commit()
+        get_revocation_list().invalidate()
+        role_ids.remove(role_id)
     else:
         raise ValueError(
-            f"User {user.username} does not have role '{role.role_name}' "
-            f"in department '{role.department_name}'"
+            f"User {username} does not have role '{role['role_name']}' "
+            f"in department '{role['department_name']}'"
         )
 
-    return {
-        "user_id": user.id,
-        "username": user.username,
-        "roles": [
-            {
-                "role_id": r.role_id,
-                "role_name": r.role_name,
-                "department_name": r.department_name,
+    roles = get_role_catalog().resolve(role_ids)
+    get_user_roles_cache().set(user_id, roles)
+
+    return {"user_id": user_id, "username": username, "roles": roles}
+
+
+def bulk_update_user_roles(action, pairs):
+    """Grant or revoke many ``(user_id, role_id)`` pairs with one statement.
+
+    Returns one outcome per input pair, in input order: ``granted``,
+    ``already_granted``, ``revoked``, ``not_assigned``, ``user_not_found``,
+    ``role_not_found`` or ``invalid``.
+    """
+    if action not in ("grant", "revoke"):
+        raise ValueError("action must be 'grant' or 'revoke'")
+
+    keys = []
+    for pair in pairs:
+        user_id = pair.get("user_id") if isinstance(pair, dict) else None
+        role_id = pair.get("role_id") if isinstance(pair, dict) else None
+        if type(user_id) is int and type(role_id) is int:
+            keys.append((user_id, role_id))
+        else:
+            keys.append(None)
+
+    valid = {key for key in keys if key is not None}
+    outcomes = {}
+
+    if valid:
+        # user id -> is active
+        known_users = dict(
+            db.session.execute(
+                select(User.id, User.inactive_since.is_(None)).where(
+                    User.id.in_({u for u, _ in valid})
+                )
+            ).all()
+        )
+        catalog = get_role_catalog()
+        known_roles = {r for _, r in valid if catalog.get(r) is not None}
+
+        candidates = []
+        for user_id, role_id in valid:
+            if user_id not in known_users:
+                outcomes[(user_id, role_id)] = "user_not_found"
+            elif role_id not in known_roles:
+                outcomes[(user_id, role_id)] = "role_not_found"
+            else:
+                candidates.append((user_id, role_id))
+
+        if candidates:
+            pair_column = tuple_(user_roles.c.user_id, user_roles.c.role_id)
+            existing = {
+                tuple(row)
+                for row in db.session.execute(
+                    select(user_roles.c.user_id, user_roles.c.role_id).where(
+                        pair_column.in_(candidates)
+                    )
+                )
             }
-            for r in user.roles
-        ],
-    }
 
+            # Pairs this statement actually changed, which a concurrent
+            # request may make differ from what ``existing`` predicts
+            changed = set()
+            if action == "grant":
+                new = [key for key in candidates if key not in existing]
+                if new:
+                    changed = _changed_pairs(
+                        insert_for(user_roles)
+                        .values([{"user_id": u, "role_id": r} for u, r in new])
+                        .on_conflict_do_nothing()
+                    )
+                    bump_version(USER_ROLES_VERSION)
+                for key in candidates:
+                    outcomes[key] = "already_granted" if key in existing else "granted"
+            else:
+                if existing:
+                    changed = _changed_pairs(
+                        delete(user_roles).where(pair_column.in_(list(existing)))
+                    )
+                    bump_version(USER_ROLES_VERSION)
+                for key in candidates:
+                    outcomes[key] = "revoked" if key in existing else "not_assigned"
+
+            if changed:
+                count_role_changes(_role_changes(action, changed).values())
+                # Tokens carry role ids; the changed users must log in again
+                revoke_tokens(user_id for user_id, _ in changed)
 
-def list_roles():
-    roles = Role.query.order_by(Role.department_name, Role.role_name).all()
+            db.session.commit()
+            get_revocation_list().invalidate()
+
+            cache = get_user_roles_cache()
+            for user_id in {u for u, _ in candidates}:
+                cache.invalidate(user_id)
 
     return [
-        {
-            "role_id": role.role_id,
-            "role_name": role.role_name,
-            "department_name": role.department_name,
-        }
-        for role in roles
+        {"user_id": key[0], "role_id": key[1], "result": outcomes[key]}
+        if key is not None
+        else {"result": "invalid"}
+        for key in keys
     ]
 
 
+def _changed_pairs(statement):
+    return {
+        tuple(row)
+        for row in db.session.execute(
+            statement.returning(user_roles.c.user_id, user_roles.c.role_id)
+        )
+    }
+
+
+def _role_changes(action, changed):
+    """``(is_active, role_ids_before, role_ids_after)`` per user, from the
+    pairs just granted or revoked.
+
+    The users' rows are locked first (as ``toggle_user_active`` locks its
+    user), then status and roles are read after the write. A concurrent
+    grant or status change has therefore either committed and is counted
+    here, or waits for this commit and counts from it; under READ COMMITTED
+    neither side can count from the other's stale state.
+    """
+    user_ids = {user_id for user_id, _ in changed}
+    lock_users(user_ids)
+    changes = {}
+    for user_id, is_active, role_id in db.session.execute(
+        select(User.id, User.inactive_since.is_(None), user_roles.c.role_id)
+        .outerjoin(user_roles, user_roles.c.user_id == User.id)
+        .where(User.id.in_(user_ids))
+    ):
+        _, before, after = changes.setdefault(user_id, (is_active, set(), set()))
+        if role_id is not None:
+            before.add(role_id)
+            after.add(role_id)
+
+    for user_id, role_id in changed:
+        if action == "grant":
+            changes[user_id][1].discard(role_id)
+        else:
+            changes[user_id][1].add(role_id)
+    return changes
+
+
+@replica_reads()
+def roles_etag(*params):
+    """ETag for a role listing, from the catalog's version (no query)."""
+    return etag_for(get_role_catalog().version(), *params)
+
+
+@replica_reads()
+def list_roles(limit=None, cursor=None):
+    return _roles_page(limit, cursor)
+
+
+def _roles_page(limit, cursor, refresh=True):
+    after = None
+    if cursor is not None:
+        after = decode_cursor(cursor)
+        if not (
+            isinstance(after, list)
+            and len(after) == 2
+            and all(isinstance(part, str) for part in after)
+        ):
+            raise ValueError("Invalid cursor")
+
+    # Served from the in-process catalog; one extra role tells us whether a
+    # next page exists
+    roles = get_role_catalog().listing(
+        after=after, limit=None if limit is None else limit + 1, refresh=refresh
+    )
+    roles, next_cursor = split_page(
+        roles, limit, key=lambda role: [role["department_name"], role["role_name"]]
+    )
+
+    return {"roles": roles, "next_cursor": next_cursor}
+
+
+@replica_reads()
 def get_roles_for_user(user_id):
-    user = db.session.get(User, user_id)
-    if not user:
+    cache = get_user_roles_cache()
+    roles = cache.get(user_id)
+    if roles is not None:
+        return roles
+
+    rows = db.session.execute(_user_role_ids_select(user_id)).all()
+    if not rows:
         raise ValueError(f"User with id {user_id} not found")
 
-    return [
-        {
-            "role_id": r.role_id,
-            "role_name": r.role_name,
-            "department_name": r.department_name,
-        }
-        for r in user.roles
-    ]
+    roles = get_role_catalog().resolve(_present_role_ids(rows))
+    cache.set(user_id, roles)
+    return roles
+
+
+def _user_role_ids_select(user_id):
+    # One statement checks the user exists and fetches its role ids
+    return (
+        select(User.id, user_roles.c.role_id)
+        .outerjoin(user_roles, user_roles.c.user_id == User.id)
+        .where(User.id == user_id)
+        .order_by(user_roles.c.role_id)
+    )
+
+
+def _present_role_ids(rows):
+    return [role_id for _, role_id in rows if role_id is not None]
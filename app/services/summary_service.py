@@ -0,0 +1,181 @@
+"""User counts per status, department and role, kept in ``report_summary``.
+
+Write paths report what they changed (new users, a status flip, a user's
+roles) and the affected counters are adjusted with one upsert inside the
+caller's transaction. Reading the summary then costs one row per group,
+however many users there are.
+"""
+from collections import Counter
+from sqlalchemy import String, cast, delete, func, insert, literal, select
+from ..database import replica_reads
+from ..extensions import db
+from ..models import ReportSummary, Role, User, user_roles
+from .cache import get_role_catalog
+from .dialect import insert_for
+
+TOTAL = "total"
+DEPARTMENT = "department"
+ROLE = "role"
+
+
+def _groups(role_ids):
+    """The ``(dimension, group_key)`` groups a user with these roles is in."""
+    catalog = get_role_catalog()
+    groups = {(TOTAL, "")}
+    for role_id in role_ids:
+        role = catalog.get(role_id)
+        groups.add((ROLE, str(role_id)))
+        if role is not None:
+            groups.add((DEPARTMENT, role["department_name"]))
+    return groups
+
+
+def _apply(deltas):
+    rows = [
+        {"dimension": dimension, "group_key": key, "is_active": active, "user_count": n}
+        for (dimension, key, active), n in deltas.items()
+        if n
+    ]
+    if not rows:
+        return
+
+    stmt = insert_for(ReportSummary.__table__)
+    db.session.execute(
+        stmt.on_conflict_do_update(
+            index_elements=[
+                ReportSummary.dimension,
+                ReportSummary.group_key,
+                ReportSummary.is_active,
+            ],
+            set_={"user_count": ReportSummary.user_count + stmt.excluded.user_count},
+        ),
+        rows,
+    )
+
+
+def lock_users(user_ids):
+    """Lock the users' rows until the caller commits (``FOR UPDATE``; a no-op
+    on SQLite, whose writers are already serialized), so status and role
+    deltas for a user are counted by one transaction at a time."""
+    db.session.execute(
+        select(User.id).where(User.id.in_(user_ids)).order_by(User.id).with_for_update()
+    )
+
+
+def count_new_users(count, is_active=False):
+    """Count ``count`` users created without roles."""
+    _apply(Counter({(TOTAL, "", is_active): count}))
+
+
+def count_status_change(role_ids, was_active):
+    """Move one user with these roles to the other status."""
+    deltas = Counter()
+    for dimension, key in _groups(role_ids):
+        deltas[(dimension, key, was_active)] -= 1
+        deltas[(dimension, key, not was_active)] += 1
+    _apply(deltas)
+
+
+def count_role_changes(changes):
+    """Count role changes, given ``(is_active, role_ids_before,
+    role_ids_after)`` for each user whose roles changed."""
+    deltas = Counter()
+    for is_active, before, after in changes:
+        before, after = _groups(before), _groups(after)
+        for dimension, key in before - after:
+            deltas[(dimension, key, is_active)] -= 1
+        for dimension, key in after - before:
+            deltas[(dimension, key, is_active)] += 1
+    _apply(deltas)
+
+
+@replica_reads()
+def get_report_summary():
+    counts = {
+        (dimension, key, active): n
+        for dimension, key, active, n in db.session.execute(
+            select(
+                ReportSummary.dimension,
+                ReportSummary.group_key,
+                ReportSummary.is_active,
+                ReportSummary.user_count,
+            )
+        )
+    }
+
+    def by_status(dimension, key):
+        return {
+            "active": counts.get((dimension, key, True), 0),
+            "inactive": counts.get((dimension, key, False), 0),
+        }
+
+    # Every role and department is listed, with zero counts if nobody has it
+    roles = get_role_catalog().listing()
+    departments = sorted({role["department_name"] for role in roles})
+    total = by_status(TOTAL, "")
+
+    return {
+        "total_users": total["active"] + total["inactive"],
+        "status": total,
+        "departments": [
+            {"department_name": name, **by_status(DEPARTMENT, name)}
+            for name in departments
+        ],
+        "roles": [{**role, **by_status(ROLE, str(role["role_id"]))} for role in roles],
+    }
+
+
+def count_users(status="all"):
+    """Number of users with this status (``all``, ``active`` or ``inactive``)."""
+    query = select(func.sum(ReportSummary.user_count)).where(
+        ReportSummary.dimension == TOTAL
+    )
+    if status != "all":
+        query = query.where(ReportSummary.is_active == (status == "active"))
+    return db.session.execute(query).scalar() or 0
+
+
+def _summary_selects():
+    is_active = User.inactive_since.is_(None)
+    memberships = user_roles.join(User, User.id == user_roles.c.user_id)
+
+    yield select(literal(TOTAL), literal(""), is_active, func.count()).group_by(
+        is_active
+    )
+    yield (
+        select(
+            literal(DEPARTMENT),
+            Role.department_name,
+            is_active,
+            # A user with two roles in one department counts once
+            func.count(func.distinct(User.id)),
+        )
+        .select_from(memberships.join(Role, Role.role_id == user_roles.c.role_id))
+        .group_by(Role.department_name, is_active)
+    )
+    yield (
+        select(
+            literal(ROLE),
+            cast(user_roles.c.role_id, String),
+            is_active,
+            func.count(),
+        )
+        .select_from(memberships)
+        .group_by(user_roles.c.role_id, is_active)
+    )
+
+
+def rebuild_report_summary():
+    """Recompute every counter from the user and role tables.
+
+    Returns the number of groups written.
+    """
+    columns = ["dimension", "group_key", "is_active", "user_count"]
+    db.session.execute(delete(ReportSummary))
+    groups = 0
+    for query in _summary_selects():
+        groups += db.session.execute(
+            insert(ReportSummary).from_select(columns, query)
+        ).rowcount
+    db.session.commit()
+    return groups
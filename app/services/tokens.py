@@ -0,0 +1,229 @@
+"""Signed, expiring access tokens issued by ``/login``.
+
+A token carries the user's id, active status and role ids and is signed with
+the app's SECRET_KEY, so checking one takes no query. ``toggle_user_active``
+and role changes revoke a user's earlier tokens through the
+``token_revocations`` table. Each process keeps a copy of its recent rows
+and checks the shared version row at most once every TOKEN_REVOCATION_TTL
+seconds, so a revocation takes effect everywhere within that window; every
+token also expires ACCESS_TOKEN_TTL seconds after it was issued.
+
+Tokens and revocations are ordered by that shared version rather than by
+clock: a token carries the version its login read along with the user's
+status, and a revocation row the version its own transaction bumped to.
+"""
+import threading
+import time
+from flask import current_app
+from itsdangerous import BadSignature, SignatureExpired, URLSafeTimedSerializer
+from sqlalchemy import delete, func, select
+from ..extensions import db
+from ..models import TokenRevocation, user_roles
+from .cache import TOKEN_REVOCATION_VERSION, _version_select, bump_version, get_version
+from .dialect import insert_for
+
+
+class InvalidToken(Exception):
+    """The token is malformed, forged, expired or revoked (401)."""
+
+
+def _serializer():
+    return URLSafeTimedSerializer(current_app.config["SECRET_KEY"], salt="access-token")
+
+
+def bearer_token(authorization):
+    """The token of an ``Authorization: Bearer <token>`` header, or None."""
+    scheme, _, token = (authorization or "").partition(" ")
+    if scheme.lower() != "bearer" or not token.strip():
+        return None
+    return token.strip()
+
+
+def token_version():
+    """The shared revocation version, as a column to select along with the
+    user row a token is issued from."""
+    return func.coalesce(
+        _version_select(TOKEN_REVOCATION_VERSION).scalar_subquery(), 0
+    ).label("token_version")
+
+
+def issue_token(user_id, role_ids, version):
+    """A token for an active user with these roles.
+
+    ``version`` is the ``token_version`` read with the user's status.
+    Returns ``(token, expires_in)``.
+    """
+    claims = {
+        "sub": user_id,
+        "active": True,
+        "roles": sorted(role_ids),
+        "ver": version,
+    }
+    return _serializer().dumps(claims), current_app.config["ACCESS_TOKEN_TTL"]
+
+
+def _token_role_ids_select(user_id):
+    return select(user_roles.c.role_id).where(user_roles.c.user_id == user_id)
+
+
+def create_access_token(user_id, version):
+    """``issue_token`` with the user's current role ids.
+
+    They are read after ``version``, so a role change committed in between
+    only makes the token be rejected, never accepted with stale roles.
+    """
+    role_ids = db.session.execute(_token_role_ids_select(user_id)).scalars().all()
+    return issue_token(user_id, role_ids, version)
+
+
+def verify_token(token, refresh=True):
+    """The claims of a valid token: ``user_id``, ``is_active``, ``role_ids``.
+
+    Raises ``InvalidToken``. Only the revocation list's periodic check may
+    query the database; pass ``refresh=False`` after ``refresh_async``.
+    """
+    try:
+        claims = _serializer().loads(
+            token, max_age=current_app.config["ACCESS_TOKEN_TTL"]
+        )
+    except SignatureExpired:
+        raise InvalidToken("Token expired")
+    except BadSignature:
+        raise InvalidToken("Invalid token")
+
+    revoked = get_revocation_list().revoked_version(claims["sub"], refresh=refresh)
+    if revoked is not None and claims["ver"] < revoked:
+        raise InvalidToken("Token revoked")
+
+    return {
+        "user_id": claims["sub"],
+        "is_active": claims["active"],
+        "role_ids": claims["roles"],
+    }
+
+
+def claims_from_header(authorization, refresh=True):
+    """``verify_token`` for an ``Authorization`` header; None without a
+    bearer token."""
+    token = bearer_token(authorization)
+    return None if token is None else verify_token(token, refresh=refresh)
+
+
+def revoke_tokens(user_ids):
+    """Reject the tokens of these users whose login read their status before
+    the caller's commit. Callers invalidate the revocation list after
+    committing."""
+    user_ids = set(user_ids)
+    if not user_ids:
+        return
+
+    # Writers serialize on the version row, so logins that read the old
+    # status also read a lower version
+    version = bump_version(TOKEN_REVOCATION_VERSION)
+    now = time.time()
+    stmt = insert_for(TokenRevocation.__table__)
+    db.session.execute(
+        stmt.on_conflict_do_update(
+            index_elements=[TokenRevocation.user_id],
+            set_={
+                "revoked_at": stmt.excluded.revoked_at,
+                "version": stmt.excluded.version,
+            },
+        ),
+        [
+            {"user_id": user_id, "revoked_at": now, "version": version}
+            for user_id in user_ids
+        ],
+    )
+    revocations = get_revocation_list()
+    if revocations.due_for_prune():
+        # Tokens these rows could still reject have expired
+        db.session.execute(
+            delete(TokenRevocation).where(
+                TokenRevocation.revoked_at < now - revocations.window
+            )
+        )
+
+
+class RevocationList:
+    """Process-local copy of the ``token_revocations`` rows younger than
+    ``window`` seconds.
+
+    Like ``RoleCatalog``, it reads the shared version row at most once every
+    ``ttl`` seconds and reloads only when another write has bumped it.
+    """
+
+    def __init__(self, ttl, window, prune_every=100):
+        self.ttl = ttl
+        self.window = window
+        self.prune_every = prune_every
+        self._writes = 0
+        self._lock = threading.Lock()
+        self._version = None
+        self._checked_at = float("-inf")
+        self._revoked = {}
+
+    def revoked_version(self, user_id, refresh=True):
+        if refresh:
+            self._refresh()
+        return self._revoked.get(user_id)
+
+    async def refresh_async(self, session):
+        if time.monotonic() - self._checked_at < self.ttl:
+            return
+
+        version = (
+            await session.execute(_version_select(TOKEN_REVOCATION_VERSION))
+        ).scalar() or 0
+        if version != self._version:
+            rows = (await session.execute(self._select())).all()
+            with self._lock:
+                self._revoked = dict(rows)
+                self._version = version
+        self._checked_at = time.monotonic()
+
+    def due_for_prune(self):
+        """True on every ``prune_every``-th revocation written by this process."""
+        with self._lock:
+            self._writes += 1
+            return self._writes % self.prune_every == 1
+
+    def invalidate(self):
+        with self._lock:
+            self._version = None
+            self._checked_at = float("-inf")
+
+    def _select(self):
+        return select(TokenRevocation.user_id, TokenRevocation.version).where(
+            TokenRevocation.revoked_at > time.time() - self.window
+        )
+
+    def _refresh(self):
+        if time.monotonic() - self._checked_at < self.ttl:
+            return
+
+        with self._lock:
+            if time.monotonic() - self._checked_at < self.ttl:
+                return
+
+            version = get_version(TOKEN_REVOCATION_VERSION)
+            if version != self._version:
+                self._revoked = dict(db.session.execute(self._select()).all())
+                self._version = version
+            self._checked_at = time.monotonic()
+
+
+def get_revocation_list():
+    revocations = current_app.extensions.get("token_revocations")
+    if revocations is None:
+        config = current_app.config
+        revocations = current_app.extensions.setdefault(
+            "token_revocations",
+            # Two token lifetimes: a token is signed a little after its login
+            # read the version, so it may outlive the revocation by that much
+            RevocationList(
+                ttl=config["TOKEN_REVOCATION_TTL"],
+                window=2 * config["ACCESS_TOKEN_TTL"],
+            ),
+        )
+    return revocations
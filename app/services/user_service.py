@@ -1,96 +1,629 @@
-from datetime import datetime
-from ..models import User
-from ..extensions import db, bcrypt
+from collections import defaultdict
+from datetime import datetime, timezone
+from itertools import islice
+from sqlalchemy import and_, insert, or_, select
+from sqlalchemy.exc import IntegrityError
+from ..database import replica_reads
+from ..models import Role, User, user_roles
+from ..serializers import (
+    USER_FIELDS,
+    dump_user,
+    dump_user_report,
+    dumps,
+    isoformat,
+    project_user,
+    serialize_user,
+)
+from ..extensions import db
+from .auth_service import AUTH_INVALID, authenticate, get_email_filter
+from .cache import (
+    ROLE_VERSION,
+    USER_ROLES_VERSION,
+    USER_VERSION,
+    bump_version,
+    etag_for,
+    get_role_catalog,
+    get_versions,
+)
+from .pagination import decode_cursor, split_page
+from .passwords import get_password_hasher
+from .summary_service import count_new_users, count_status_change
+from .tokens import get_revocation_list, revoke_tokens
 
 
 def create_user(username, email, password):
     new_user = User(
         username=username,
         email=email,
-        password=password,
+        password=get_password_hasher().hash(password),
         inactive_since=datetime.utcnow(),
     )
     db.session.add(new_user)
+    bump_version(USER_VERSION)
+    count_new_users(1)
     db.session.commit()
+    get_email_filter().add(new_user.email)
     return {"message": "User registered", "username": new_user.username}
 
 
-def check_password(email, password):
-    user = User.query.filter_by(email=email).first()
-
-    if user:
-        pass
-        # print(f"found user: {user.username}")
-        # print(f"email: {email}")
-        # print(f"password: {password}")
-        # print(f"db password: {user.password}")
-    else:
-        print("user not found")
+def import_users(records, batch_size=500):
+    """Create many users from an iterable of ``{username, email, password}``.
 
-    if user.password == password:
-        return True
-    else:
-        return False
+    Records are consumed lazily and inserted ``batch_size`` at a time with one
+    multi-row INSERT and one commit per batch. Rows that are invalid or clash
+    with an existing (or earlier) username or email are reported by their
+    position in the input and skipped; the rest of the batch is still created.
+    """
+    created = 0
+    errors = []
+    records = enumerate(records)
+
+    while True:
+        batch = list(islice(records, batch_size))
+        if not batch:
+            break
+        created += _import_batch(batch, errors)
+
+    return {"created": created, "failed": len(errors), "errors": errors}
+
+
+def _import_batch(batch, errors):
+    candidates = []
+    for index, record in batch:
+        fields = (
+            [record.get(key) for key in ("username", "email", "password")]
+            if isinstance(record, dict)
+            else [None]
+        )
+        if not all(isinstance(value, str) and value for value in fields):
+            errors.append(
+                {
+                    "index": index,
+                    "error": "username, email and password are required",
+                }
+            )
+            continue
+        candidates.append((index, *fields))
+
+    if not candidates:
+        return 0
+
+    # One round trip finds every clash with users that already exist
+    taken_usernames = set()
+    taken_emails = set()
+    for username, email in db.session.execute(
+        select(User.username, User.email).where(
+            or_(
+                User.username.in_({c[1] for c in candidates}),
+                User.email.in_({c[2] for c in candidates}),
+            )
+        )
+    ):
+        taken_usernames.add(username)
+        taken_emails.add(email)
+
+    now = datetime.utcnow()
+    rows = []
+    for index, username, email, password in candidates:
+        if username in taken_usernames:
+            errors.append({"index": index, "error": "username already exists"})
+        elif email in taken_emails:
+            errors.append({"index": index, "error": "email already exists"})
+        else:
+            taken_usernames.add(username)
+            taken_emails.add(email)
+            rows.append(
+                (
+                    index,
+                    {
+                        "username": username,
+                        "email": email,
+                        "password": password,
+                        "inactive_since": now,
+                    },
+                )
+            )
+
+    if not rows:
+        return 0
+
+    hashes = get_password_hasher().hash_many([row["password"] for _, row in rows])
+    for (_, row), hashed in zip(rows, hashes):
+        row["password"] = hashed
+
+    email_filter = get_email_filter()
+    try:
+        db.session.execute(insert(User).values([row for _, row in rows]))
+        bump_version(USER_VERSION)
+        count_new_users(len(rows))
+        db.session.commit()
+        for _, row in rows:
+            email_filter.add(row["email"])
+        return len(rows)
+    except IntegrityError:
+        # A concurrent writer took some of these names after our check;
+        # fall back to row-by-row inserts so only the clashing rows fail
+        db.session.rollback()
+
+    created = 0
+    for index, row in rows:
+        try:
+            with db.session.begin_nested():
+                db.session.execute(insert(User).values(row))
+            created += 1
+            email_filter.add(row["email"])
+        except IntegrityError:
+            errors.append({"index": index, "error": "username or email already exists"})
+    if created:
+        bump_version(USER_VERSION)
+        count_new_users(created)
+    db.session.commit()
+    return created
+
+
+def check_password(email, password):
+    _, status = authenticate(email, password)
+    return status != AUTH_INVALID
 
 
 def toggle_user_active(user_id):
-    user = db.session.get(User, user_id)
+    # Locked before status and roles are read, as role changes lock it
+    # before counting (see summary_service.lock_users)
+    user = db.session.get(User, user_id, with_for_update=True, populate_existing=True)
     if not user:
         raise ValueError(f"User with id {user_id} not found")
 
-    if user.inactive_since is None:
+    was_active = user.inactive_since is None
+    if was_active:
         user.inactive_since = datetime.utcnow()
     else:
         user.inactive_since = None
 
+    bump_version(USER_VERSION)
+    count_status_change(
+        db.session.execute(
+            select(user_roles.c.role_id).where(user_roles.c.user_id == user_id)
+        ).scalars(),
+        was_active,
+    )
+    # Tokens carry the active flag, so earlier ones no longer hold
+    revoke_tokens([user_id])
     db.session.commit()
+    get_revocation_list().invalidate()
 
     return {
         "user_id": user.id,
         "username": user.username,
         "is_active": user.inactive_since is None,
-        "inactive_since": user.inactive_since.isoformat()
-        if user.inactive_since
-        else None,
+        "inactive_since": isoformat(user.inactive_since),
     }
 
 
+# Change counters that together determine the report's content
+REPORT_VERSIONS = (USER_VERSION, USER_ROLES_VERSION, ROLE_VERSION)
+
+
+def _role_ids_select(user_ids):
+    return (
+        select(user_roles.c.user_id, user_roles.c.role_id)
+        .where(user_roles.c.user_id.in_(user_ids))
+        .order_by(user_roles.c.user_id, user_roles.c.role_id)
+    )
+
+
+def _group_role_ids(rows):
+    role_ids_by_user = defaultdict(list)
+    for user_id, role_id in rows:
+        role_ids_by_user[user_id].append(role_id)
+    return role_ids_by_user
+
+
+def _role_ids_by_user(user_ids):
+    """Load the role ids of many users with a single statement.
+
+    ``user_ids`` may be a list of ids or a subquery selecting them. Only the
+    ``user_roles`` pairs are read; role details come from the role catalog,
+    so every user holding a role shares the same dict (and JSON fragment).
+    """
+    return _group_role_ids(db.session.execute(_role_ids_select(user_ids)))
+
+
+def parse_report_fields(value):
+    """``?fields=`` as a tuple in output order, or None for every field."""
+    if value is None:
+        return None
+
+    requested = {name.strip() for name in value.split(",") if name.strip()}
+    if not requested:
+        raise ValueError("fields must name at least one field")
+    unknown = requested.difference(USER_FIELDS)
+    if unknown:
+        raise ValueError(
+            f"Unknown fields: {', '.join(sorted(unknown))}. "
+            f"Choose from: {', '.join(USER_FIELDS)}"
+        )
+    if len(requested) == len(USER_FIELDS):
+        return None
+    return tuple(field for field in USER_FIELDS if field in requested)
+
+
+def _with_roles(fields):
+    return fields is None or "roles" in fields
+
+
+# Column each user field is read from ("roles" comes from user_roles)
+_FIELD_COLUMNS = {
+    "username": User.username,
+    "email": User.email,
+    "is_active": User.inactive_since,
+    "inactive_since": User.inactive_since,
+}
+
+# Columns the report may be sorted on; ties are broken by id
+REPORT_SORTS = {
+    "id": User.id,
+    "username": User.username,
+    "email": User.email,
+    "inactive_since": User.inactive_since,
+}
+
+
+def parse_report_filters(args):
+    """The report's ``department``, ``role_id``, ``inactive_before`` and
+    ``inactive_after`` parameters, validated; unset ones are left out."""
+    filters = {}
+    if args.get("department"):
+        filters["department"] = args["department"]
+
+    if args.get("role_id") is not None:
+        try:
+            filters["role_id"] = int(args["role_id"])
+        except ValueError:
+            raise ValueError("role_id must be an integer")
+
+    for name in ("inactive_before", "inactive_after"):
+        if args.get(name) is None:
+            continue
+        try:
+            moment = datetime.fromisoformat(args[name])
+        except ValueError:
+            raise ValueError(f"{name} must be an ISO 8601 date or datetime")
+        # inactive_since is stored as naive UTC
+        if moment.tzinfo is not None:
+            moment = moment.astimezone(timezone.utc).replace(tzinfo=None)
+        filters[name] = moment
+
+    return filters
+
+
+def parse_report_sort(value):
+    """``?sort=`` (a column, ``-`` prefixed for descending), or None for the
+    default id order."""
+    if value is None or value == "id":
+        return None
+    if value.removeprefix("-") not in REPORT_SORTS:
+        raise ValueError(
+            f"Invalid sort '{value}'. Use one of: {', '.join(REPORT_SORTS)}, "
+            "optionally prefixed with '-' for descending order"
+        )
+    return value
+
+
+def _sort_column(sort):
+    """``(column, descending)`` for a parsed ``sort``."""
+    if sort is None:
+        return User.id, False
+    return REPORT_SORTS[sort.removeprefix("-")], sort.startswith("-")
+
+
+def _row_key(sort):
+    """The keyset key of a report row: its id, or ``(sort value, id)``."""
+    column, _ = _sort_column(sort)
+    if column is User.id:
+        return lambda user: user.id
+    return lambda user: (getattr(user, column.key), user.id)
+
+
+def _cursor_key(sort):
+    """``_row_key`` in the JSON form a cursor carries."""
+    row_key = _row_key(sort)
+    if _sort_column(sort)[0] is User.id:
+        return row_key
+
+    def key(user):
+        value, last_id = row_key(user)
+        if isinstance(value, datetime):
+            value = value.isoformat()
+        return [value, last_id]
+
+    return key
+
+
+def _parse_cursor_key(cursor, sort):
+    key = decode_cursor(cursor)
+    column, _ = _sort_column(sort)
+    if column is User.id:
+        if not isinstance(key, int):
+            raise ValueError("Invalid cursor")
+        return key
+
+    if not (isinstance(key, list) and len(key) == 2 and isinstance(key[1], int)):
+        raise ValueError("Invalid cursor")
+    value, last_id = key
+    if value is not None and isinstance(column.type, db.DateTime):
+        try:
+            value = datetime.fromisoformat(value)
+        except (TypeError, ValueError):
+            raise ValueError("Invalid cursor")
+    elif value is not None and not isinstance(value, str):
+        raise ValueError("Invalid cursor")
+    return value, last_id
+
+
+def _after(sort, key):
+    """Rows that come after ``key`` in ``sort`` order."""
+    column, descending = _sort_column(sort)
+    if column is User.id:
+        return User.id < key if descending else User.id > key
+
+    value, last_id = key
+    id_after = User.id < last_id if descending else User.id > last_id
+    # NULLs sort last in either direction
+    if value is None:
+        return and_(column.is_(None), id_after)
+    beyond = column < value if descending else column > value
+    after = or_(beyond, and_(column == value, id_after))
+    if column.nullable:
+        after = or_(after, column.is_(None))
+    return after
+
+
+def _order_by(sort):
+    column, descending = _sort_column(sort)
+    order = [column.desc() if descending else column.asc()]
+    if column.nullable:
+        order[0] = order[0].nulls_last()
+    if column is not User.id:
+        order.append(User.id.desc() if descending else User.id.asc())
+    return order
+
+
+def _filter_report(query, filters):
+    if "role_id" in filters:
+        # Served by ix_user_roles_role_id (role_id, user_id)
+        query = query.where(
+            User.id.in_(
+                select(user_roles.c.user_id).where(
+                    user_roles.c.role_id == filters["role_id"]
+                )
+            )
+        )
+    if "department" in filters:
+        query = query.where(
+            User.id.in_(
+                select(user_roles.c.user_id)
+                .join(Role, Role.role_id == user_roles.c.role_id)
+                .where(Role.department_name == filters["department"])
+            )
+        )
+    # ix_user_inactive_since; either bound leaves active users out
+    if "inactive_before" in filters:
+        query = query.where(User.inactive_since < filters["inactive_before"])
+    if "inactive_after" in filters:
+        query = query.where(User.inactive_since >= filters["inactive_after"])
+    return query
+
+
+def _report_select(
+    status, after=None, limit=None, fields=None, filters=None, sort=None
+):
+    # Plain rows rather than User objects: the report never writes them back.
+    # Only the requested fields' columns are read, plus id and the sort
+    # column for the keyset.
+    columns = {"id": User.id}
+    sort_column, _ = _sort_column(sort)
+    columns[sort_column.key] = sort_column
+    for field in USER_FIELDS if fields is None else fields:
+        column = _FIELD_COLUMNS.get(field)
+        if column is not None:
+            columns.setdefault(column.key, column)
+    query = select(*columns.values())
+
+    if status == "active":
+        query = query.where(User.inactive_since.is_(None))
+    elif status == "inactive":
+        query = query.where(User.inactive_since.isnot(None))
+
+    query = _filter_report(query, filters or {})
+
+    if after is not None:
+        query = query.where(_after(sort, after))
+
+    return query.order_by(*_order_by(sort)).limit(limit)
+
+
+def _report_page_select(status, limit, cursor, fields=None, filters=None, sort=None):
+    """The page query and the role ids query for one report page.
+
+    The role ids query is only returned when it does not depend on the page
+    (an unlimited report) and roles were asked for, so both can be built
+    before either runs.
+    """
+    after = None
+    if cursor is not None:
+        after = _parse_cursor_key(cursor, sort)
+
+    # Keyset pagination: one extra row tells us whether a next page exists
+    query = _report_select(
+        status, after, None if limit is None else limit + 1, fields, filters, sort
+    )
+
+    roles_query = None
+    if limit is None and _with_roles(fields):
+        user_ids = query.order_by(None).with_only_columns(User.id).subquery()
+        roles_query = _role_ids_select(select(user_ids.c.id))
+    return query, roles_query
+
+
+@replica_reads()
+def report_etag(*params):
+    """ETag for a report response; it changes whenever a user, a role grant or
+    a role does, so it is read before (never after) the report itself."""
+    return etag_for(*get_versions(*REPORT_VERSIONS), *params)
+
+
+@replica_reads()
+def _report_page(status, limit, cursor, fields=None, filters=None, sort=None):
+    query, roles_query = _report_page_select(
+        status, limit, cursor, fields, filters, sort
+    )
+    users, next_cursor = split_page(
+        db.session.execute(query).all(), limit, key=_cursor_key(sort)
+    )
+
+    # Two statements in total, however many users the report covers, or
+    # one when roles are not wanted
+    role_ids_by_user = _group_role_ids(())
+    if _with_roles(fields):
+        if roles_query is None:
+            roles_query = _role_ids_select([user.id for user in users])
+        role_ids_by_user = _group_role_ids(db.session.execute(roles_query))
+
+    return users, role_ids_by_user, next_cursor
+
+
 # New function to generate user access report.
 # Simplest approach, maintain a single DB query and readability
 # Prefer over Dictionary Dispatch, may provide more scalability
-def get_user_report(status="all"):
-    query = User.query
+def get_user_report(
+    status="all", limit=None, cursor=None, fields=None, filters=None, sort=None
+):
+    users, role_ids_by_user, next_cursor = _report_page(
+        status, limit, cursor, fields, filters, sort
+    )
 
-    if status == "active":
-        query = query.filter(User.inactive_since.is_(None))
-    elif status == "inactive":
-        query = query.filter(User.inactive_since.isnot(None))
-
-    users = query.all()
-
-    user_list = []
-    for user in users:
-        roles = [
-            {
-                "role_id": role.role_id,
-                "role_name": role.role_name,
-                "department_name": role.department_name,
-            }
-            for role in user.roles
+    if fields is None:
+        catalog = get_role_catalog()
+        user_list = [
+            serialize_user(user, catalog.resolve(role_ids_by_user[user.id]))
+            for user in users
         ]
+    else:
+        user_list = _project_users(users, role_ids_by_user, fields)
+
+    return {
+        "total_users": len(user_list),
+        "status_filter": status,
+        "users": user_list,
+        "next_cursor": next_cursor,
+    }
+
+
+def render_user_report(
+    status="all", limit=None, cursor=None, fields=None, filters=None, sort=None
+):
+    """``get_user_report`` encoded straight to JSON bytes.
+
+    Users are written from their rows and roles spliced in from the catalog's
+    pre-encoded fragments, so no intermediate dicts are built.
+    """
+    users, role_ids_by_user, next_cursor = _report_page(
+        status, limit, cursor, fields, filters, sort
+    )
+
+    return dump_user_report(
+        status, _dump_users(users, role_ids_by_user, fields=fields), next_cursor
+    )
+
 
-        # Append this user to the report
-        user_list.append(
-            {
-                "id": user.id,
-                "username": user.username,
-                "email": user.email,
-                "roles": roles,
-                "is_active": user.inactive_since is None,
-                "inactive_since": user.inactive_since.isoformat()
-                if user.inactive_since
-                else None,
-            }
+def _all_role_ids(role_ids_by_user):
+    return {role_id for role_ids in role_ids_by_user.values() for role_id in role_ids}
+
+
+def _project_users(users, role_ids_by_user, fields, refresh=True):
+    catalog = get_role_catalog()
+    with_roles = "roles" in fields
+    return [
+        project_user(
+            user,
+            fields,
+            catalog.resolve(role_ids_by_user[user.id], refresh=refresh)
+            if with_roles
+            else None,
         )
+        for user in users
+    ]
+
+
+def _dump_users(users, role_ids_by_user, fragments=None, fields=None):
+    if fields is not None:
+        # Narrow reports: small dicts, encoded one user at a time
+        refresh = fragments is None
+        return [
+            dumps(user)
+            for user in _project_users(users, role_ids_by_user, fields, refresh)
+        ]
+    if fragments is None:
+        fragments = get_role_catalog().fragments(_all_role_ids(role_ids_by_user))
+    return [
+        dump_user(
+            user,
+            [
+                fragments[role_id]
+                for role_id in role_ids_by_user.get(user.id, ())
+                if role_id in fragments
+            ],
+        )
+        for user in users
+    ]
+
+
+def _iter_report_chunks(status, chunk_size, fields=None, filters=None, sort=None):
+    """Yield ``(users, role_ids_by_user)`` for chunks of users in report order.
+
+    Each chunk is fetched with ``WHERE <after the last key> LIMIT chunk_size``
+    as plain rows, so memory stays flat no matter how many users the report
+    covers.
+    """
+    key = _row_key(sort)
+    after = None
+    while True:
+        with replica_reads():
+            users = db.session.execute(
+                _report_select(status, after, chunk_size, fields, filters, sort)
+            ).all()
+            if not users:
+                return
+
+            role_ids_by_user = _group_role_ids(())
+            if _with_roles(fields):
+                role_ids_by_user = _role_ids_by_user([user.id for user in users])
+        yield users, role_ids_by_user
+
+        if len(users) < chunk_size:
+            return
+        after = key(users[-1])
+
+
+def iter_user_report(
+    status="all", chunk_size=1000, fields=None, filters=None, sort=None
+):
+    """Yield serialized users one at a time, reading them in chunks."""
+    catalog = get_role_catalog()
+    chunks = _iter_report_chunks(status, chunk_size, fields, filters, sort)
+    for users, role_ids_by_user in chunks:
+        if fields is not None:
+            yield from _project_users(users, role_ids_by_user, fields)
+            continue
+        for user in users:
+            yield serialize_user(user, catalog.resolve(role_ids_by_user[user.id]))
+
 
-    return {"total_users": len(user_list), "status_filter": status, "users": user_list}
+def iter_user_report_ndjson(
+    status="all", chunk_size=1000, fields=None, filters=None, sort=None
+):
+    """Like ``iter_user_report``, but yields encoded NDJSON lines."""
+    chunks = _iter_report_chunks(status, chunk_size, fields, filters, sort)
+    for users, role_ids_by_user in chunks:
+        for line in _dump_users(users, role_ids_by_user, fields=fields):
+            yield line + b"\n"
@@ -0,0 +1,10 @@
+"""ASGI entry point, e.g. ``uvicorn asgi:application``.
+
+Hot read endpoints and login are served by the async service layer on the
+event loop; all other routes run the same Flask app as ``app.py``.
+"""
+from app import create_app
+from app.asgi import create_asgi_app
+from app.config import config_from_env
+
+application = create_asgi_app(create_app(config_class=config_from_env()))
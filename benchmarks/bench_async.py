@@ -0,0 +1,175 @@
+"""Concurrent requests: sync WSGI worker threads vs. the ASGI event loop.
+
+Usage:
+    poetry run python -m benchmarks.bench_async --concurrency 1 8 32 --users 10000
+
+Both modes serve the same app and SQLite file, in process (no server or
+network). "wsgi" runs the Flask test client from one thread per client but
+lets at most ``--threads`` requests be handled at once, like a threaded WSGI
+server. "asgi" runs every request as a
+task on one event loop through ``app.asgi``. Each endpoint is measured with
+``--concurrency`` clients issuing ``--requests`` requests each.
+"""
+import argparse
+import asyncio
+import json
+import statistics
+import tempfile
+import threading
+import time
+from pathlib import Path
+
+from app import create_app
+from app.asgi import create_asgi_app
+from app.config import TestingConfig
+from app.database import dispose_async_engines
+from benchmarks.seed import PASSWORD, seed, user_email
+
+ENDPOINTS = {
+    "report.page": ("GET", "/users/report?limit=100", None),
+    "roles": ("GET", "/roles", None),
+    "login": ("POST", "/login", {"email": user_email(1), "password": PASSWORD}),
+}
+
+
+def _summary(latencies, elapsed):
+    latencies = sorted(latencies)
+    return (
+        len(latencies) / elapsed,
+        statistics.median(latencies) * 1000,
+        latencies[int(len(latencies) * 0.95) - 1] * 1000,
+    )
+
+
+def run_wsgi(app, endpoint, concurrency, requests, threads):
+    method, path, body = ENDPOINTS[endpoint]
+    # Like a threaded WSGI server: at most ``threads`` requests are handled at
+    # once and the rest wait, which counts towards their latency
+    workers = threading.BoundedSemaphore(threads)
+    latencies = []
+
+    def client():
+        local_client = app.test_client()
+        for _ in range(requests):
+            started = time.perf_counter()
+            with workers:
+                response = local_client.open(path, method=method, json=body)
+            latencies.append(time.perf_counter() - started)
+            assert response.status_code < 500, response.status_code
+
+    clients = [threading.Thread(target=client) for _ in range(concurrency)]
+    started = time.perf_counter()
+    for thread in clients:
+        thread.start()
+    for thread in clients:
+        thread.join()
+    return _summary(latencies, time.perf_counter() - started)
+
+
+async def _asgi_request(asgi_app, method, path, body):
+    path, _, query = path.partition("?")
+    payload = json.dumps(body).encode() if body is not None else b""
+    headers = [(b"content-type", b"application/json")] if body is not None else []
+    headers.append((b"content-length", str(len(payload)).encode()))
+    scope = {
+        "type": "http",
+        "asgi": {"version": "3.0"},
+        "http_version": "1.1",
+        "method": method,
+        "scheme": "http",
+        "path": path,
+        "raw_path": path.encode(),
+        "root_path": "",
+        "query_string": query.encode(),
+        "headers": headers,
+        "server": ("bench", 80),
+        "client": ("127.0.0.1", 0),
+    }
+    status = []
+
+    async def receive():
+        return {"type": "http.request", "body": payload, "more_body": False}
+
+    async def send(message):
+        if message["type"] == "http.response.start":
+            status.append(message["status"])
+
+    await asgi_app(scope, receive, send)
+    assert status[0] < 500, status[0]
+
+
+async def _run_asgi(asgi_app, endpoint, concurrency, requests):
+    method, path, body = ENDPOINTS[endpoint]
+    latencies = []
+
+    async def client():
+        for _ in range(requests):
+            started = time.perf_counter()
+            await _asgi_request(asgi_app, method, path, body)
+            latencies.append(time.perf_counter() - started)
+
+    await _asgi_request(asgi_app, method, path, body)  # open the async engine
+    started = time.perf_counter()
+    await asyncio.gather(*(client() for _ in range(concurrency)))
+    return _summary(latencies, time.perf_counter() - started)
+
+
+def run_asgi(app, endpoint, concurrency, requests):
+    async def main():
+        try:
+            return await _run_asgi(
+                create_asgi_app(app), endpoint, concurrency, requests
+            )
+        finally:
+            await dispose_async_engines(app)
+
+    return asyncio.run(main())
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--users", type=int, default=10000)
+    parser.add_argument("--concurrency", type=int, nargs="+", default=[1, 8, 32])
+    parser.add_argument("--requests", type=int, default=20, help="per client")
+    parser.add_argument("--threads", type=int, default=4, help="WSGI workers")
+    parser.add_argument("--endpoints", nargs="+", default=list(ENDPOINTS))
+    parser.add_argument("--data-dir", help="reuse seeded databases from here")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        db_path = (Path(args.data_dir or tmp) / f"async-{args.users}.db").resolve()
+
+        class BenchConfig(TestingConfig):
+            SQLALCHEMY_DATABASE_URI = f"sqlite:///{db_path}"
+            METRICS_ENABLED = False
+            LOGIN_EMAIL_FILTER_ENABLED = False
+            # Every client logs in from the same address
+            LOGIN_RATE_LIMIT_ENABLED = False
+
+        app = create_app(config_class=BenchConfig)
+        with app.app_context():
+            seed(args.users, inactive_ratio=0)
+
+        print(
+            f"{'endpoint':<12} {'conc':>5} {'mode':>5} {'req/s':>8} "
+            f"{'p50 ms':>8} {'p95 ms':>8}"
+        )
+        for endpoint in args.endpoints:
+            for concurrency in args.concurrency:
+                results = {
+                    "wsgi": run_wsgi(
+                        app, endpoint, concurrency, args.requests, args.threads
+                    ),
+                    "asgi": run_asgi(app, endpoint, concurrency, args.requests),
+                }
+                for mode, (rate, p50, p95) in results.items():
+                    print(
+                        f"{endpoint:<12} {concurrency:>5} {mode:>5} {rate:>8.1f} "
+                        f"{p50:>8.1f} {p95:>8.1f}"
+                    )
+
+        app.extensions["password_hasher"].shutdown()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,91 @@
+"""Bytes on the wire and CPU per request for each response encoding.
+
+Usage:
+    poetry run python -m benchmarks.bench_compression --users 10000 --gzip-levels 1 6 9
+
+Every report endpoint is requested through the test client once per
+encoding: identity, gzip at each ``--gzip-levels`` level, and zstd/brotli at
+their configured levels when installed. "cpu ms" is the process CPU time of
+a whole request (query, serialization and compression); "xfer ms" is how
+long the body takes over a ``--mbps`` link.
+"""
+import argparse
+import tempfile
+import time
+from pathlib import Path
+
+from app import create_app
+from app.compression import available_encodings
+from app.config import TestingConfig
+from benchmarks.seed import seed
+
+ENDPOINTS = {
+    "report": "/users/report",
+    "report.page": "/users/report?limit=1000",
+    "report.stream": "/users/report?stream=1",
+}
+
+
+def _measure(client, path, encoding, repeat):
+    headers = {"Accept-Encoding": encoding}
+    best_cpu, size = None, 0
+    for _ in range(repeat):
+        started = time.process_time()
+        response = client.get(path, headers=headers)
+        size = len(response.data)
+        cpu = time.process_time() - started
+        best_cpu = cpu if best_cpu is None else min(best_cpu, cpu)
+    return size, best_cpu
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--users", type=int, default=10000)
+    parser.add_argument("--gzip-levels", type=int, nargs="+", default=[1, 6, 9])
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--mbps", type=float, default=10.0)
+    parser.add_argument("--data-dir", help="reuse seeded databases from here")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        db_path = (Path(args.data_dir or tmp) / f"compress-{args.users}.db").resolve()
+
+        class BenchConfig(TestingConfig):
+            SQLALCHEMY_DATABASE_URI = f"sqlite:///{db_path}"
+            METRICS_ENABLED = False
+
+        app = create_app(config_class=BenchConfig)
+        with app.app_context():
+            seed(args.users)
+        compression = app.extensions["compression"]
+        default_levels = dict(compression.levels)
+        client = app.test_client()
+
+        runs = [("identity", None)]
+        runs += [("gzip", level) for level in args.gzip_levels]
+        runs += [(name, None) for name in available_encodings() if name != "gzip"]
+
+        print(
+            f"{'endpoint':<14} {'encoding':<9} {'bytes':>11} {'ratio':>6} "
+            f"{'cpu ms':>8} {'xfer ms':>9}"
+        )
+        for endpoint, path in ENDPOINTS.items():
+            client.get(path)  # warm caches
+            identity = None
+            for encoding, level in runs:
+                compression.levels = {
+                    **default_levels,
+                    **({encoding: level} if level is not None else {}),
+                }
+                size, cpu = _measure(client, path, encoding, args.repeat)
+                identity = identity or size
+                label = encoding if level is None else f"{encoding}-{level}"
+                xfer = size * 8 / (args.mbps * 1e6)
+                print(
+                    f"{endpoint:<14} {label:<9} {size:>11,} {identity / size:>6.1f} "
+                    f"{cpu * 1000:>8.1f} {xfer * 1000:>9.1f}"
+                )
+
+
+if __name__ == "__main__":
+    main()
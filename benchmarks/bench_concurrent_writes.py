@@ -0,0 +1,127 @@
+"""Write throughput with concurrent writers: default SQLite setup vs. WAL profile.
+
+Usage:
+    poetry run python -m benchmarks.bench_concurrent_writes --writers 1 4 8
+
+Each combination gets a fresh SQLite file with one seeded user per writer,
+then ``--writers`` threads each register ``--writes`` users and toggle their
+seeded user's active flag after every registration, through the Flask test
+client. Requests that fail because the database was locked are counted
+separately.
+"""
+import argparse
+import tempfile
+import threading
+import time
+from pathlib import Path
+
+from app import create_app
+from app.config import DevelopmentConfig, ProductionConfig, TestingConfig
+from app.extensions import db
+
+PROFILES = {
+    # Rollback journal, no busy timeout beyond the driver's default
+    "default": ({}, {}),
+    "development": (
+        DevelopmentConfig.SQLALCHEMY_ENGINE_OPTIONS,
+        DevelopmentConfig.SQLITE_PRAGMAS,
+    ),
+    "production": (
+        ProductionConfig.SQLALCHEMY_ENGINE_OPTIONS,
+        ProductionConfig.SQLITE_PRAGMAS,
+    ),
+}
+
+
+def run(profile, writers, writes_per_writer, db_path):
+    engine_options, pragmas = PROFILES[profile]
+
+    class BenchConfig(TestingConfig):
+        SQLALCHEMY_DATABASE_URI = f"sqlite:///{db_path}"
+        SQLALCHEMY_ENGINE_OPTIONS = engine_options
+        SQLITE_PRAGMAS = pragmas
+        METRICS_ENABLED = False
+
+    app = create_app(config_class=BenchConfig)
+    with app.app_context():
+        db.drop_all()
+        db.create_all()
+
+    client = app.test_client()
+    client.post(
+        "/users/bulk",
+        json=[
+            {
+                "username": f"seed{index}",
+                "email": f"seed{index}@bench.example.com",
+                "password": "benchpassword",
+            }
+            for index in range(writers)
+        ],
+    )
+
+    counts = {"ok": 0, "locked": 0, "other": 0}
+    lock = threading.Lock()
+
+    def worker(index):
+        local_client = app.test_client()
+        for n in range(writes_per_writer):
+            try:
+                response = local_client.post(
+                    "/register",
+                    json={
+                        "username": f"w{index}-{n}",
+                        "email": f"w{index}-{n}@bench.example.com",
+                        "password": "benchpassword",
+                    },
+                )
+                if response.status_code == 201:
+                    response = local_client.patch(f"/users/{index + 1}/toggle-active")
+                key = "ok" if response.status_code < 300 else "other"
+            except Exception as exc:
+                key = "locked" if "database is locked" in str(exc) else "other"
+            with lock:
+                counts[key] += 1
+
+    threads = [threading.Thread(target=worker, args=(i,)) for i in range(writers)]
+    started = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    elapsed = time.perf_counter() - started
+
+    app.extensions["password_hasher"].shutdown()
+    with app.app_context():
+        db.engine.dispose()
+    return counts, elapsed
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--profiles", nargs="+", default=list(PROFILES))
+    parser.add_argument("--writers", type=int, nargs="+", default=[1, 4, 8])
+    parser.add_argument("--writes", type=int, default=50, help="per writer")
+    args = parser.parse_args()
+
+    print(
+        f"{'profile':>11} {'writers':>7} {'writes/s':>9} "
+        f"{'ok':>5} {'locked':>6} {'other':>5}"
+    )
+    with tempfile.TemporaryDirectory() as tmp:
+        for profile in args.profiles:
+            for writers in args.writers:
+                counts, elapsed = run(
+                    profile,
+                    writers,
+                    args.writes,
+                    Path(tmp) / f"writes-{profile}-{writers}.db",
+                )
+                print(
+                    f"{profile:>11} {writers:>7} {counts['ok'] / elapsed:>9.1f} "
+                    f"{counts['ok']:>5} {counts['locked']:>6} {counts['other']:>5}"
+                )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,96 @@
+"""Login throughput as a function of hashing pool size and bcrypt cost.
+
+Usage:
+    poetry run python -m benchmarks.bench_login --workers 1 2 4 --costs 10 12
+
+Each combination gets a fresh SQLite file with a single active user, then
+``--clients`` threads hammer ``POST /login`` through the Flask test client.
+Logins shed with 503 (queue full) are counted separately.
+"""
+import argparse
+import tempfile
+import threading
+import time
+from pathlib import Path
+
+from app import create_app
+from app.config import TestingConfig
+from app.extensions import db
+from app.models import User
+
+
+def run(workers, cost, clients, requests_per_client, queue_size, db_path):
+    class BenchConfig(TestingConfig):
+        SQLALCHEMY_DATABASE_URI = f"sqlite:///{db_path}"
+        BCRYPT_LOG_ROUNDS = cost
+        PASSWORD_HASH_WORKERS = workers
+        PASSWORD_HASH_QUEUE_SIZE = queue_size
+        # Measures hashing, not the login rate limiter
+        LOGIN_RATE_LIMIT_ENABLED = False
+
+    app = create_app(config_class=BenchConfig)
+    with app.app_context():
+        db.drop_all()
+        db.create_all()
+
+    credentials = {"email": "bench@example.com", "password": "benchpassword"}
+    client = app.test_client()
+    client.post("/register", json={"username": "bench", **credentials})
+    with app.app_context():
+        User.query.filter_by(email=credentials["email"]).first().inactive_since = None
+        db.session.commit()
+
+    counts = {"ok": 0, "shed": 0, "other": 0}
+    lock = threading.Lock()
+
+    def worker():
+        local_client = app.test_client()
+        for _ in range(requests_per_client):
+            status = local_client.post("/login", json=credentials).status_code
+            key = "ok" if status == 200 else "shed" if status == 503 else "other"
+            with lock:
+                counts[key] += 1
+
+    threads = [threading.Thread(target=worker) for _ in range(clients)]
+    started = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    elapsed = time.perf_counter() - started
+
+    app.extensions["password_hasher"].shutdown()
+    return counts, elapsed
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--workers", type=int, nargs="+", default=[1, 2, 4])
+    parser.add_argument("--costs", type=int, nargs="+", default=[8, 10, 12])
+    parser.add_argument("--clients", type=int, default=8)
+    parser.add_argument("--requests", type=int, default=20, help="per client")
+    parser.add_argument("--queue-size", type=int, default=32)
+    args = parser.parse_args()
+
+    print(
+        f"{'workers':>7} {'cost':>4} {'logins/s':>9} {'ok':>5} {'shed':>5} {'other':>5}"
+    )
+    with tempfile.TemporaryDirectory() as tmp:
+        for cost in args.costs:
+            for workers in args.workers:
+                counts, elapsed = run(
+                    workers,
+                    cost,
+                    args.clients,
+                    args.requests,
+                    args.queue_size,
+                    Path(tmp) / f"login-{workers}-{cost}.db",
+                )
+                print(
+                    f"{workers:>7} {cost:>4} {counts['ok'] / elapsed:>9.1f} "
+                    f"{counts['ok']:>5} {counts['shed']:>5} {counts['other']:>5}"
+                )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,128 @@
+"""Credential stuffing against /login, with and without the rate limiter.
+
+Usage:
+    poetry run python -m benchmarks.bench_rate_limit --attackers 8 --seconds 5
+
+``--attackers`` threads, each from its own IP address, send logins with
+wrong passwords for a handful of real emails as fast as they can, while one
+legitimate client logs in once every ``--interval`` seconds from another
+address. For each storage backend (and with the limiter off) it reports the
+attack requests answered, how many reached password hashing, the process CPU
+time per request and how many legitimate logins succeeded. Attackers run in
+this process, so they compete with the legitimate client for the GIL; the
+CPU per request is the figure that carries over to a real deployment.
+"""
+import argparse
+import tempfile
+import threading
+import time
+from pathlib import Path
+
+from app import create_app
+from app.config import TestingConfig
+from app.extensions import db
+from app.models import User
+
+PASSWORD = "benchpassword"
+
+
+def run(storage, attackers, seconds, interval, cost, tmp):
+    class BenchConfig(TestingConfig):
+        SQLALCHEMY_DATABASE_URI = f"sqlite:///{Path(tmp) / f'stuffing-{storage}.db'}"
+        METRICS_ENABLED = False
+        BCRYPT_LOG_ROUNDS = cost
+        LOGIN_RATE_LIMIT_ENABLED = storage != "off"
+        LOGIN_RATE_LIMIT_STORAGE = "memory" if storage == "off" else storage
+        LOGIN_RATE_LIMIT_SQLITE_PATH = str(Path(tmp) / f"buckets-{storage}.db")
+
+    app = create_app(config_class=BenchConfig)
+    with app.app_context():
+        db.drop_all()
+        db.create_all()
+
+    client = app.test_client()
+    emails = [f"victim{i}@example.com" for i in range(5)] + ["user@example.com"]
+    for i, email in enumerate(emails):
+        client.post(
+            "/register",
+            json={"username": f"u{i}", "email": email, "password": PASSWORD},
+        )
+    with app.app_context():
+        User.query.update({User.inactive_since: None})
+        db.session.commit()
+
+    hasher = app.extensions["password_hasher"]
+    verify, hashed = hasher.verify, [0]
+
+    def counting_verify(password, stored):
+        hashed[0] += 1
+        return verify(password, stored)
+
+    hasher.verify = counting_verify
+
+    statuses, logins = {}, []
+    lock = threading.Lock()
+    deadline = time.perf_counter() + seconds
+
+    def attacker(n):
+        local = app.test_client()
+        local.environ_base["REMOTE_ADDR"] = f"10.0.0.{n + 1}"
+        attempt = 0
+        while time.perf_counter() < deadline:
+            email = emails[attempt % 5]
+            status = local.post(
+                "/login", json={"email": email, "password": f"guess{attempt}"}
+            ).status_code
+            attempt += 1
+            with lock:
+                statuses[status] = statuses.get(status, 0) + 1
+
+    def legitimate():
+        local = app.test_client()
+        local.environ_base["REMOTE_ADDR"] = "192.168.1.10"
+        credentials = {"email": "user@example.com", "password": PASSWORD}
+        while time.perf_counter() < deadline:
+            logins.append(local.post("/login", json=credentials).status_code)
+            time.sleep(interval)
+
+    threads = [threading.Thread(target=attacker, args=(n,)) for n in range(attackers)]
+    threads.append(threading.Thread(target=legitimate))
+    cpu = time.process_time()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    cpu = time.process_time() - cpu
+
+    hasher.shutdown()
+    return statuses, hashed[0], cpu, logins
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--storage", nargs="+", default=["off", "memory", "sqlite"])
+    parser.add_argument("--attackers", type=int, default=8)
+    parser.add_argument("--seconds", type=float, default=5.0)
+    parser.add_argument("--interval", type=float, default=0.5)
+    parser.add_argument("--cost", type=int, default=10, help="bcrypt cost")
+    args = parser.parse_args()
+
+    print(
+        f"{'storage':<8} {'attacks':>8} {'429':>7} {'hashed':>7} "
+        f"{'cpu ms/req':>11} {'user ok':>8}"
+    )
+    with tempfile.TemporaryDirectory() as tmp:
+        for storage in args.storage:
+            statuses, hashed, cpu, logins = run(
+                storage, args.attackers, args.seconds, args.interval, args.cost, tmp
+            )
+            requests = sum(statuses.values()) + len(logins)
+            ok = f"{logins.count(200)}/{len(logins)}"
+            print(
+                f"{storage:<8} {sum(statuses.values()):>8} {statuses.get(429, 0):>7} "
+                f"{hashed:>7} {cpu * 1000 / requests:>11.2f} {ok:>8}"
+            )
+
+
+if __name__ == "__main__":
+    main()
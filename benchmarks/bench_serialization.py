@@ -0,0 +1,79 @@
+"""Share of /users/report latency spent serializing, before and after.
+
+Usage:
+    poetry run python -m benchmarks.bench_serialization --users 10000 100000
+
+"before" builds the report dicts and encodes them with Flask's stdlib JSON
+provider; "after" encodes rows straight to bytes with the shared serializers
+and the role catalog's pre-encoded fragments. Each path is split into the
+database part (query and role lookup) and the serialization part.
+"""
+import argparse
+import tempfile
+import time
+from pathlib import Path
+
+from flask.json.provider import DefaultJSONProvider
+
+from app import create_app
+from app.config import TestingConfig
+from app.serializers import orjson
+from app.services.cache import get_role_catalog
+from app.services.user_service import _report_page, get_user_report
+from app.services.user_service import render_user_report
+from benchmarks.seed import seed
+
+
+def _best(func, repeat):
+    timings = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        func()
+        timings.append(time.perf_counter() - started)
+    return min(timings)
+
+
+def run(users, repeat, db_path):
+    class BenchConfig(TestingConfig):
+        SQLALCHEMY_DATABASE_URI = f"sqlite:///{db_path}"
+        METRICS_ENABLED = False
+
+    app = create_app(config_class=BenchConfig)
+    stdlib = DefaultJSONProvider(app)
+    with app.app_context():
+        seed(users)
+        get_role_catalog().listing()  # warm the role catalog
+
+        query = _best(lambda: _report_page("all", None, None), repeat)
+        before = _best(lambda: stdlib.dumps(get_user_report("all")), repeat)
+        after = _best(lambda: render_user_report("all"), repeat)
+    return query, before, after
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--users", type=int, nargs="+", default=[1000, 10000])
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--data-dir", help="reuse seeded databases from here")
+    args = parser.parse_args()
+
+    print(f"orjson: {'yes' if orjson is not None else 'no (stdlib fallback)'}")
+    print(
+        f"{'users':>9} {'query ms':>9} {'before ms':>10} {'share':>6} "
+        f"{'after ms':>9} {'share':>6}"
+    )
+    with tempfile.TemporaryDirectory() as tmp:
+        data_dir = Path(args.data_dir or tmp)
+        for users in args.users:
+            query, before, after = run(
+                users, args.repeat, (data_dir / f"serialize-{users}.db").resolve()
+            )
+            print(
+                f"{users:>9} {query * 1000:>9.1f} {before * 1000:>10.1f} "
+                f"{1 - query / before:>6.0%} {after * 1000:>9.1f} "
+                f"{max(0.0, 1 - query / after):>6.0%}"
+            )
+
+
+if __name__ == "__main__":
+    main()
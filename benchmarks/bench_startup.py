@@ -0,0 +1,112 @@
+"""Worker startup time: imports and app creation for each entry point.
+
+Usage:
+    poetry run python -m benchmarks.bench_startup --repeat 5 --budget-ms 600
+
+Every run is a fresh interpreter, as a newly started worker would be. For
+each entry point it records the time to import the ``app`` package, the time
+to run the entry point module (``create_app`` plus anything the entry point
+adds) and the wall time of the whole process. The run exits non-zero when
+the median import + create time of any entry point exceeds ``--budget-ms``,
+or when a module that should be deferred (Flask-Migrate, Alembic, pyarrow)
+was loaded.
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import time
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parent.parent
+ENTRY_POINTS = ["app.py", "run.py", "asgi.py"]
+# Only needed by `flask db` or by a running Parquet export, never at startup
+DEFERRED_MODULES = ["flask_migrate", "alembic", "pyarrow"]
+
+_PROBE = """
+import json, runpy, sys, time
+started = time.perf_counter()
+import app
+imported = time.perf_counter()
+runpy.run_path({entry!r}, run_name="startup_probe")
+created = time.perf_counter()
+print(json.dumps({{
+    "import": imported - started,
+    "create": created - imported,
+    "loaded": [name for name in {modules!r} if name in sys.modules],
+}}))
+"""
+
+
+def probe(entry):
+    env = {
+        **os.environ,
+        "FLASK_ENV": "development",
+        "SECRET_KEY": os.getenv("SECRET_KEY", "startup-benchmark"),
+    }
+    code = _PROBE.format(entry=entry, modules=DEFERRED_MODULES)
+    started = time.perf_counter()
+    output = subprocess.run(
+        [sys.executable, "-c", code],
+        cwd=ROOT,
+        env=env,
+        check=True,
+        capture_output=True,
+        text=True,
+    ).stdout
+    result = json.loads(output.strip().splitlines()[-1])
+    result["process"] = time.perf_counter() - started
+    return result
+
+
+def run(entry_points, repeat):
+    results = {}
+    for entry in entry_points:
+        runs = [probe(entry) for _ in range(repeat)]
+        results[entry] = {
+            key: statistics.median(run[key] for run in runs) * 1000
+            for key in ("import", "create", "process")
+        }
+        results[entry]["loaded"] = sorted({name for r in runs for name in r["loaded"]})
+    return results
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--entry-points", nargs="+", default=ENTRY_POINTS)
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument(
+        "--budget-ms",
+        type=float,
+        default=600,
+        help="median import + create time allowed per entry point",
+    )
+    args = parser.parse_args(argv)
+
+    results = run(args.entry_points, args.repeat)
+
+    print(
+        f"{'entry':<8} {'import ms':>10} {'create ms':>10} {'process ms':>11}  "
+        "deferred modules loaded"
+    )
+    failures = []
+    for entry, result in results.items():
+        print(
+            f"{entry:<8} {result['import']:>10.1f} {result['create']:>10.1f} "
+            f"{result['process']:>11.1f}  {', '.join(result['loaded']) or '-'}"
+        )
+        startup = result["import"] + result["create"]
+        if startup > args.budget_ms:
+            failures.append(f"{entry}: {startup:.0f} ms > {args.budget_ms:.0f} ms")
+        if result["loaded"]:
+            failures.append(f"{entry}: loaded {', '.join(result['loaded'])}")
+
+    for line in failures:
+        print(f"OVER BUDGET {line}", file=sys.stderr)
+    return 1 if failures else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
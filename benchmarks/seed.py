@@ -0,0 +1,85 @@
+"""Seed a SQLite database with a synthetic, realistically shaped dataset."""
+import random
+from datetime import datetime, timedelta
+
+import bcrypt
+from sqlalchemy import func, insert, select
+
+from app.extensions import db
+from app.models import ReportSummary, Role, User, user_roles
+from app.services.summary_service import rebuild_report_summary
+
+PASSWORD = "benchpassword"
+DEPARTMENTS = ["Arcane", "Divine", "Martial", "Nature", "Stealth", "Support"]
+CHUNK = 5000
+
+
+def user_email(user_id):
+    return f"user{user_id}@bench.example.com"
+
+
+def seed(users, roles=60, roles_per_user=3, inactive_ratio=0.2, seed_value=42):
+    """Fill the current app's database unless it already holds this dataset.
+
+    Every user shares one low-cost bcrypt hash of ``PASSWORD``; hashing a
+    million distinct passwords would dominate the seeding time.
+    """
+    db.create_all()
+    existing = db.session.execute(select(func.count(User.id))).scalar()
+    if existing == users:
+        # Datasets cached before the summary table existed
+        if db.session.execute(select(func.count()).select_from(ReportSummary)).scalar():
+            return False
+        rebuild_report_summary()
+        return False
+    if existing:
+        db.drop_all()
+        db.create_all()
+
+    rng = random.Random(seed_value)
+    db.session.execute(
+        insert(Role),
+        [
+            {
+                "role_id": role_id,
+                "role_name": f"Role{role_id}",
+                "department_name": DEPARTMENTS[role_id % len(DEPARTMENTS)],
+            }
+            for role_id in range(1, roles + 1)
+        ],
+    )
+
+    password = bcrypt.hashpw(PASSWORD.encode(), bcrypt.gensalt(4)).decode()
+    now = datetime.utcnow()
+    for start in range(1, users + 1, CHUNK):
+        ids = range(start, min(start + CHUNK, users + 1))
+        db.session.execute(
+            insert(User),
+            [
+                {
+                    "id": user_id,
+                    "username": f"user{user_id}",
+                    "email": user_email(user_id),
+                    "password": password,
+                    "inactive_since": now - timedelta(days=rng.randint(1, 900))
+                    if rng.random() < inactive_ratio
+                    else None,
+                }
+                for user_id in ids
+            ],
+        )
+        # Role fan-out is skewed: most users hold a few roles, some none
+        db.session.execute(
+            insert(user_roles),
+            [
+                {"user_id": user_id, "role_id": role_id}
+                for user_id in ids
+                for role_id in rng.sample(
+                    range(1, roles + 1), min(roles, rng.randint(0, 2 * roles_per_user))
+                )
+            ],
+        )
+        db.session.commit()
+
+    rebuild_report_summary()
+    return True
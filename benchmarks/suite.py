@@ -0,0 +1,270 @@
+"""Scale-parameterized benchmarks for the service layer and HTTP endpoints.
+
+Usage:
+    poetry run python -m benchmarks.suite --users 1000 100000 --output bench.json
+    poetry run python -m benchmarks.suite --users 1000 --baseline bench.json
+
+Each dataset is seeded once into a SQLite file under ``--data-dir`` and
+reused by later runs. Every case records the best wall time over
+``--repeat`` runs, the SQL statements it issued and its peak traced memory.
+With ``--baseline`` the run exits non-zero when any case regresses by more
+than ``--threshold`` (a fraction, 0.25 = 25%).
+"""
+import argparse
+import gc
+import json
+import platform
+import sys
+import time
+import tracemalloc
+from pathlib import Path
+
+from sqlalchemy import event
+
+from app import create_app
+from app.config import TestingConfig
+from app.extensions import db
+from app.services.auth_service import authenticate
+from app.services.role_service import get_roles_for_user, list_roles
+from app.services.summary_service import get_report_summary
+from app.services.user_service import (
+    get_user_report,
+    iter_user_report,
+    render_user_report,
+)
+from benchmarks.seed import PASSWORD, seed, user_email
+
+
+def _consume(iterable):
+    for _ in iterable:
+        pass
+
+
+def _cases(users):
+    """(name, kind, callable taking the test client) for one dataset."""
+    probe = max(1, users // 2)
+    credentials = {"email": user_email(probe), "password": PASSWORD}
+    token = {}
+
+    def bearer(c):
+        # One login per dataset; every call reuses its access token
+        if not token:
+            response = c.post("/login", json=credentials)
+            token["Authorization"] = f"Bearer {response.get_json()['access_token']}"
+        return token
+
+    return [
+        ("service.get_user_report", "service", lambda c: get_user_report("all")),
+        (
+            "service.render_user_report",
+            "service",
+            lambda c: render_user_report("all"),
+        ),
+        (
+            "service.get_user_report.page",
+            "service",
+            lambda c: get_user_report("active", limit=100),
+        ),
+        (
+            "service.iter_user_report",
+            "service",
+            lambda c: _consume(iter_user_report("all")),
+        ),
+        ("service.get_report_summary", "service", lambda c: get_report_summary()),
+        ("service.list_roles", "service", lambda c: list_roles()),
+        (
+            "service.get_roles_for_user",
+            "service",
+            lambda c: get_roles_for_user(probe),
+        ),
+        (
+            "service.authenticate",
+            "service",
+            lambda c: authenticate(credentials["email"], credentials["password"]),
+        ),
+        ("http.user_report", "http", lambda c: c.get("/users/report")),
+        (
+            "http.user_report.stream",
+            "http",
+            lambda c: _consume(c.get("/users/report?stream=1").response),
+        ),
+        ("http.user_report.page", "http", lambda c: c.get("/users/report?limit=100")),
+        (
+            "http.user_report.page.fields",
+            "http",
+            lambda c: c.get("/users/report?limit=100&fields=id,email"),
+        ),
+        (
+            "http.user_report.page.filtered",
+            "http",
+            lambda c: c.get(
+                "/users/report?limit=100&role_id=1&status=inactive&sort=-inactive_since"
+            ),
+        ),
+        (
+            "http.user_report.summary",
+            "http",
+            lambda c: c.get("/users/report/summary"),
+        ),
+        ("http.roles", "http", lambda c: c.get("/roles")),
+        ("http.user_roles", "http", lambda c: c.get(f"/users/{probe}/roles")),
+        (
+            "http.user_roles.token",
+            "http",
+            lambda c: c.get(f"/users/{probe}/roles", headers=bearer(c)),
+        ),
+        ("http.profile", "http", lambda c: c.get("/profile", headers=bearer(c))),
+        ("http.login", "http", lambda c: c.post("/login", json=credentials)),
+    ]
+
+
+def _measure(app, client, func, repeat):
+    statements = []
+
+    def record(conn, cursor, statement, parameters, context, many):
+        statements.append(statement)
+
+    # Warm caches once so repeated runs measure the steady state
+    with app.app_context():
+        func(client)
+
+    with app.app_context():
+        engine = db.engine
+
+    timings = []
+    event.listen(engine, "before_cursor_execute", record)
+    try:
+        for _ in range(repeat):
+            statements.clear()
+            gc.collect()
+            with app.app_context():
+                started = time.perf_counter()
+                func(client)
+                timings.append(time.perf_counter() - started)
+    finally:
+        event.remove(engine, "before_cursor_execute", record)
+
+    sql_statements = len(statements)
+
+    gc.collect()
+    tracemalloc.start()
+    try:
+        with app.app_context():
+            func(client)
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+
+    return {
+        "wall_seconds": min(timings),
+        "sql_statements": sql_statements,
+        "peak_memory_bytes": peak,
+    }
+
+
+def run_dataset(users, data_dir, repeat, roles, roles_per_user, only=None):
+    db_path = Path(data_dir) / f"bench-{users}-{roles}-{roles_per_user}.db"
+
+    class BenchConfig(TestingConfig):
+        SQLALCHEMY_DATABASE_URI = f"sqlite:///{db_path.resolve()}"
+        METRICS_ENABLED = False
+        # http.login repeats one login far past the per-email limit
+        LOGIN_RATE_LIMIT_ENABLED = False
+
+    app = create_app(config_class=BenchConfig)
+    with app.app_context():
+        seed(users, roles=roles, roles_per_user=roles_per_user)
+
+    client = app.test_client()
+    results = {}
+    for name, kind, func in _cases(users):
+        if only and not any(name.startswith(prefix) for prefix in only):
+            continue
+        results[name] = {"kind": kind, **_measure(app, client, func, repeat)}
+        print(
+            f"{users:>9} {name:<32} {results[name]['wall_seconds'] * 1000:>10.2f} ms "
+            f"{results[name]['sql_statements']:>6} stmts "
+            f"{results[name]['peak_memory_bytes'] / 1024:>10.0f} KiB",
+            file=sys.stderr,
+        )
+    return results
+
+
+def compare(baseline, current, threshold):
+    """Return human-readable regressions of ``current`` against ``baseline``."""
+    regressions = []
+    for dataset, cases in current["datasets"].items():
+        for name, result in cases.items():
+            base = baseline.get("datasets", {}).get(dataset, {}).get(name)
+            if base is None:
+                continue
+            for metric in ("wall_seconds", "peak_memory_bytes"):
+                if result[metric] > base[metric] * (1 + threshold):
+                    regressions.append(
+                        f"{dataset}/{name}: {metric} {base[metric]:.6g} -> "
+                        f"{result[metric]:.6g}"
+                    )
+            if result["sql_statements"] > base["sql_statements"]:
+                regressions.append(
+                    f"{dataset}/{name}: sql_statements {base['sql_statements']} -> "
+                    f"{result['sql_statements']}"
+                )
+    return regressions
+
+
+def run_suite(user_counts, data_dir, repeat=3, roles=60, roles_per_user=3, only=None):
+    Path(data_dir).mkdir(parents=True, exist_ok=True)
+    return {
+        "meta": {
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "repeat": repeat,
+            "roles": roles,
+            "roles_per_user": roles_per_user,
+        },
+        "datasets": {
+            str(users): run_dataset(
+                users, data_dir, repeat, roles, roles_per_user, only=only
+            )
+            for users in user_counts
+        },
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--users", type=int, nargs="+", default=[1000, 100000])
+    parser.add_argument("--roles", type=int, default=60)
+    parser.add_argument("--roles-per-user", type=int, default=3)
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--data-dir", default="instance/bench")
+    parser.add_argument("--only", nargs="*", help="case name prefixes to run")
+    parser.add_argument("--output", help="write results JSON here")
+    parser.add_argument("--baseline", help="results JSON to compare against")
+    parser.add_argument("--threshold", type=float, default=0.25)
+    args = parser.parse_args(argv)
+
+    results = run_suite(
+        args.users,
+        args.data_dir,
+        repeat=args.repeat,
+        roles=args.roles,
+        roles_per_user=args.roles_per_user,
+        only=args.only,
+    )
+
+    if args.output:
+        Path(args.output).write_text(json.dumps(results, indent=2) + "\n")
+
+    if args.baseline:
+        baseline = json.loads(Path(args.baseline).read_text())
+        regressions = compare(baseline, results, args.threshold)
+        for line in regressions:
+            print(f"REGRESSION {line}", file=sys.stderr)
+        return 1 if regressions else 0
+
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
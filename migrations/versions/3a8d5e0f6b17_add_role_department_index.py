@@ -0,0 +1,23 @@
+"""Add an index on role.department_name for the report's department filter
+
+Revision ID: 3a8d5e0f6b17
+Revises: 7f2c9e4b1a68
+Create Date: 2026-10-18 19:02:41.560218
+
+"""
+from alembic import op
+
+
+# revision identifiers, used by Alembic.
+revision = "3a8d5e0f6b17"
+down_revision = "7f2c9e4b1a68"
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_index("ix_role_department_name", "role", ["department_name"])
+
+
+def downgrade():
+    op.drop_index("ix_role_department_name", table_name="role")
@@ -0,0 +1,37 @@
+"""Add export_jobs table
+
+Revision ID: 7f2c9e4b1a68
+Revises: e5a3f7c91d24
+Create Date: 2026-10-18 17:24:53.208311
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = "7f2c9e4b1a68"
+down_revision = "e5a3f7c91d24"
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table(
+        "export_jobs",
+        sa.Column("id", sa.Integer(), nullable=False),
+        sa.Column("status", sa.String(length=16), nullable=False),
+        sa.Column("format", sa.String(length=16), nullable=False),
+        sa.Column("status_filter", sa.String(length=16), nullable=False),
+        sa.Column("total_users", sa.Integer(), nullable=True),
+        sa.Column("exported_users", sa.Integer(), nullable=False),
+        sa.Column("file_name", sa.String(length=255), nullable=True),
+        sa.Column("error", sa.Text(), nullable=True),
+        sa.Column("created_at", sa.DateTime(), nullable=False),
+        sa.Column("finished_at", sa.DateTime(), nullable=True),
+        sa.PrimaryKeyConstraint("id"),
+    )
+
+
+def downgrade():
+    op.drop_table("export_jobs")
@@ -0,0 +1,29 @@
+"""Add cache_versions table
+
+Revision ID: 9b1f0c2d7e4a
+Revises: 4d2bc91bb294
+Create Date: 2026-10-18 09:12:41.508214
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = "9b1f0c2d7e4a"
+down_revision = "4d2bc91bb294"
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table(
+        "cache_versions",
+        sa.Column("name", sa.String(length=64), nullable=False),
+        sa.Column("version", sa.Integer(), nullable=False),
+        sa.PrimaryKeyConstraint("name"),
+    )
+
+
+def downgrade():
+    op.drop_table("cache_versions")
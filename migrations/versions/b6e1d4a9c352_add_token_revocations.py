@@ -0,0 +1,33 @@
+"""Add token_revocations table
+
+Revision ID: b6e1d4a9c352
+Revises: 3a8d5e0f6b17
+Create Date: 2026-10-18 20:11:37.904126
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = "b6e1d4a9c352"
+down_revision = "3a8d5e0f6b17"
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table(
+        "token_revocations",
+        sa.Column("user_id", sa.Integer(), nullable=False),
+        sa.Column("revoked_at", sa.Float(), nullable=False),
+        sa.PrimaryKeyConstraint("user_id"),
+    )
+    op.create_index(
+        "ix_token_revocations_revoked_at", "token_revocations", ["revoked_at"]
+    )
+
+
+def downgrade():
+    op.drop_index("ix_token_revocations_revoked_at", table_name="token_revocations")
+    op.drop_table("token_revocations")
@@ -0,0 +1,44 @@
+"""Add indexes for the report filters and role membership scans
+
+Revision ID: c47e8a1d2b90
+Revises: 9b1f0c2d7e4a
+Create Date: 2026-10-18 11:37:05.114902
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = "c47e8a1d2b90"
+down_revision = "9b1f0c2d7e4a"
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_index("ix_user_inactive_since", "user", ["inactive_since"])
+    # Partial indexes on SQLite and PostgreSQL; other backends ignore the
+    # dialect-specific WHERE and get a plain index on id
+    op.create_index(
+        "ix_user_active",
+        "user",
+        ["id"],
+        sqlite_where=sa.text("inactive_since IS NULL"),
+        postgresql_where=sa.text("inactive_since IS NULL"),
+    )
+    op.create_index(
+        "ix_user_inactive",
+        "user",
+        ["id"],
+        sqlite_where=sa.text("inactive_since IS NOT NULL"),
+        postgresql_where=sa.text("inactive_since IS NOT NULL"),
+    )
+    op.create_index("ix_user_roles_role_id", "user_roles", ["role_id", "user_id"])
+
+
+def downgrade():
+    op.drop_index("ix_user_roles_role_id", table_name="user_roles")
+    op.drop_index("ix_user_inactive", table_name="user")
+    op.drop_index("ix_user_active", table_name="user")
+    op.drop_index("ix_user_inactive_since", table_name="user")
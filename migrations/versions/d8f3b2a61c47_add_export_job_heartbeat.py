@@ -0,0 +1,28 @@
+"""Add export_jobs.heartbeat_at
+
+Revision ID: d8f3b2a61c47
+Revises: b6e1d4a9c352
+Create Date: 2026-10-18 21:42:05.613204
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = "d8f3b2a61c47"
+down_revision = "b6e1d4a9c352"
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    with op.batch_alter_table("export_jobs") as batch_op:
+        batch_op.add_column(sa.Column("heartbeat_at", sa.DateTime(), nullable=True))
+    # Unfinished jobs from before this revision go stale from their creation
+    op.execute("UPDATE export_jobs SET heartbeat_at = created_at")
+
+
+def downgrade():
+    with op.batch_alter_table("export_jobs") as batch_op:
+        batch_op.drop_column("heartbeat_at")
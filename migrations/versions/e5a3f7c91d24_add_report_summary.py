@@ -0,0 +1,63 @@
+"""Add report_summary table
+
+Revision ID: e5a3f7c91d24
+Revises: c47e8a1d2b90
+Create Date: 2026-10-18 16:02:27.731540
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = "e5a3f7c91d24"
+down_revision = "c47e8a1d2b90"
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table(
+        "report_summary",
+        sa.Column("dimension", sa.String(length=16), nullable=False),
+        sa.Column("group_key", sa.String(length=64), nullable=False),
+        sa.Column("is_active", sa.Boolean(), nullable=False),
+        sa.Column("user_count", sa.Integer(), nullable=False),
+        sa.PrimaryKeyConstraint("dimension", "group_key", "is_active"),
+    )
+
+    # Fill in the counts for existing users (the same totals as
+    # `flask rebuild-report-summary`)
+    op.execute(
+        """
+        INSERT INTO report_summary (dimension, group_key, is_active, user_count)
+        SELECT 'total', '', u.inactive_since IS NULL, COUNT(*)
+        FROM "user" u
+        GROUP BY u.inactive_since IS NULL
+        """
+    )
+    op.execute(
+        """
+        INSERT INTO report_summary (dimension, group_key, is_active, user_count)
+        SELECT 'department', r.department_name, u.inactive_since IS NULL,
+               COUNT(DISTINCT u.id)
+        FROM user_roles ur
+        JOIN "user" u ON u.id = ur.user_id
+        JOIN role r ON r.role_id = ur.role_id
+        GROUP BY r.department_name, u.inactive_since IS NULL
+        """
+    )
+    op.execute(
+        """
+        INSERT INTO report_summary (dimension, group_key, is_active, user_count)
+        SELECT 'role', CAST(ur.role_id AS VARCHAR(64)), u.inactive_since IS NULL,
+               COUNT(*)
+        FROM user_roles ur
+        JOIN "user" u ON u.id = ur.user_id
+        GROUP BY ur.role_id, u.inactive_since IS NULL
+        """
+    )
+
+
+def downgrade():
+    op.drop_table("report_summary")
@@ -0,0 +1,28 @@
+"""Add token_revocations.version
+
+Revision ID: f2a9c4e71b58
+Revises: d8f3b2a61c47
+Create Date: 2026-10-18 22:16:48.370915
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = "f2a9c4e71b58"
+down_revision = "d8f3b2a61c47"
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    with op.batch_alter_table("token_revocations") as batch_op:
+        batch_op.add_column(
+            sa.Column("version", sa.Integer(), nullable=False, server_default="0")
+        )
+
+
+def downgrade():
+    with op.batch_alter_table("token_revocations") as batch_op:
+        batch_op.drop_column("version")
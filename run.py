@@ -1,11 +1,7 @@
-import os
 from app import create_app
-from app.config import DevelopmentConfig, ProductionConfig
+from app.config import config_from_env
 
-config_class = (
-    DevelopmentConfig if os.getenv("FLASK_ENV") == "development" else ProductionConfig
-)
-app = create_app(config_class=config_class)
+app = create_app(config_class=config_from_env())
 
 if __name__ == "__main__":
     app.run()
@@ -1,4 +1,7 @@
+from contextlib import contextmanager
+
 import pytest
+from sqlalchemy import event
 from app import create_app
 from app.extensions import db
 from app.config import TestingConfig
@@ -23,3 +26,24 @@ def app():
 @pytest.fixture
 def client(app):
     return app.test_client()  # Flask test client to send requests
+
+
+@pytest.fixture
+def count_statements(app):
+    """Context manager counting the SQL statements executed inside it."""
+
+    @contextmanager
+    def counter():
+        statements = []
+
+        def record(conn, cursor, statement, parameters, context, executemany):
+            statements.append(statement)
+
+        engine = db.engine
+        event.listen(engine, "before_cursor_execute", record)
+        try:
+            yield statements
+        finally:
+            event.remove(engine, "before_cursor_execute", record)
+
+    return counter
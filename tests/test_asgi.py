@@ -0,0 +1,224 @@
+import asyncio
+import gzip
+import json
+import re
+import pytest
+
+# Installed by the "async" extra, which CI installs
+pytest.importorskip("asgiref")
+pytest.importorskip("aiosqlite")
+pytest.importorskip("greenlet")
+
+from app import create_app  # noqa: E402
+from app.asgi import create_asgi_app  # noqa: E402
+from app.config import TestingConfig  # noqa: E402
+from app.database import dispose_async_engines  # noqa: E402
+from app.extensions import db  # noqa: E402
+
+
+@pytest.fixture
+def file_app(tmp_path):
+    # Sync and async engines need one shared database, so not :memory:
+    class FileConfig(TestingConfig):
+        SQLALCHEMY_DATABASE_URI = f"sqlite:///{tmp_path / 'asgi.db'}"
+
+    app = create_app(config_class=FileConfig)
+    with app.app_context():
+        db.create_all()
+    yield app
+    asyncio.run(dispose_async_engines(app))
+    with app.app_context():
+        db.session.remove()
+        db.engine.dispose()
+
+
+def call(asgi_app, method, path, body=None, headers=(), chunked=False):
+    """Run one request through the ASGI app; returns (status, headers, body).
+
+    ``chunked`` sends the body in 16-byte messages without a Content-Length.
+    """
+    path, _, query = path.partition("?")
+    payload = json.dumps(body).encode() if body is not None else b""
+    headers = list(headers)
+    if body is not None:
+        headers += [("Content-Type", "application/json")]
+        if not chunked:
+            headers += [("Content-Length", str(len(payload)))]
+    scope = {
+        "type": "http",
+        "asgi": {"version": "3.0"},
+        "http_version": "1.1",
+        "method": method,
+        "scheme": "http",
+        "path": path,
+        "raw_path": path.encode(),
+        "root_path": "",
+        "query_string": query.encode(),
+        "headers": [(k.lower().encode(), v.encode()) for k, v in headers],
+        "server": ("testserver", 80),
+        "client": ("127.0.0.1", 1234),
+    }
+    messages = []
+    pieces = [payload[i : i + 16] for i in range(0, len(payload), 16)]
+    if not chunked or not pieces:
+        pieces = [payload]
+
+    async def receive():
+        piece = pieces.pop(0)
+        return {"type": "http.request", "body": piece, "more_body": bool(pieces)}
+
+    async def send(message):
+        messages.append(message)
+
+    asyncio.run(asgi_app(scope, receive, send))
+    start = messages[0]
+    response_headers = {k.decode(): v.decode() for k, v in start["headers"]}
+    data = b"".join(m.get("body", b"") for m in messages[1:])
+    return start["status"], response_headers, data
+
+
+def _seed(client, app):
+    client.post("/roles", json={"role_name": "Bard", "department_name": "Arcane"})
+    client.post(
+        "/register",
+        json={"username": "ana", "email": "ana@test.com", "password": "pw123456"},
+    )
+    client.patch("/users/1/toggle-active")
+    client.post("/users/1/roles", json={"role_id": 1})
+
+
+def test_native_reads_match_flask_responses(file_app):
+    client = file_app.test_client()
+    _seed(client, file_app)
+    asgi_app = create_asgi_app(file_app)
+
+    for path in (
+        "/users/report",
+        "/users/report?status=active&limit=1",
+        "/users/report?fields=email,roles",
+        "/users/report?role_id=1&sort=-username&limit=1",
+        "/roles",
+    ):
+        flask_response = client.get(path)
+        status, headers, body = call(asgi_app, "GET", path)
+        assert status == 200
+        assert json.loads(body) == flask_response.get_json()
+        assert headers["etag"] == flask_response.headers["ETag"]
+
+        status, _, body = call(
+            asgi_app, "GET", path, headers=[("If-None-Match", headers["etag"])]
+        )
+        assert (status, body) == (304, b"")
+
+    status, _, body = call(asgi_app, "GET", "/users/1/roles")
+    assert status == 200
+    assert json.loads(body) == client.get("/users/1/roles").get_json()
+    assert call(asgi_app, "GET", "/users/99/roles")[0] == 404
+    assert call(asgi_app, "GET", "/users/report?status=bogus")[0] == 400
+    assert call(asgi_app, "GET", "/users/report?fields=password")[0] == 400
+
+
+def test_native_login_and_wsgi_fallback(file_app):
+    asgi_app = create_asgi_app(file_app)
+    credentials = {"email": "ana@test.com", "password": "pw123456"}
+
+    # Not a native route: handled by Flask through the WSGI adapter
+    status, _, _ = call(
+        asgi_app,
+        "POST",
+        "/register",
+        body={"username": "ana", **credentials},
+    )
+    assert status == 201
+
+    assert call(asgi_app, "POST", "/login", body=credentials)[0] == 403
+    call(asgi_app, "PATCH", "/users/1/toggle-active")
+    status, _, body = call(asgi_app, "POST", "/login", body=credentials)
+    assert status == 200
+    login = json.loads(body)
+    assert login["email"] == "ana@test.com"
+    assert login["token_type"] == "Bearer"
+
+    # The token is read natively for the caller's roles and by Flask for /profile
+    bearer = [("Authorization", f"Bearer {login['access_token']}")]
+    status, _, body = call(asgi_app, "GET", "/users/1/roles", headers=bearer)
+    assert (status, json.loads(body)) == (200, {"user_id": 1, "roles": []})
+    status, _, body = call(asgi_app, "GET", "/profile", headers=bearer)
+    assert json.loads(body)["user_id"] == 1
+    forged = [("Authorization", f"Bearer {login['access_token']}x")]
+    status, headers, _ = call(asgi_app, "GET", "/users/1/roles", headers=forged)
+    assert status == 401
+    assert headers["www-authenticate"].startswith("Bearer")
+
+    wrong = {**credentials, "password": "nope"}
+    assert call(asgi_app, "POST", "/login", body=wrong)[0] == 401
+    unknown = {**credentials, "email": "who@test.com"}
+    assert call(asgi_app, "POST", "/login", body=unknown)[0] == 401
+
+    # Five failed attempts per email from this client, then limited as in Flask
+    responses = [call(asgi_app, "POST", "/login", body=wrong) for _ in range(5)]
+    assert [status for status, _, _ in responses] == [401] * 4 + [429]
+    assert int(responses[-1][1]["retry-after"]) >= 1
+
+    # Streamed reports fall through to Flask as well
+    status, headers, body = call(asgi_app, "GET", "/users/report?stream=1")
+    assert status == 200
+    assert headers["content-type"] == "application/x-ndjson"
+    assert json.loads(body.splitlines()[0])["email"] == "ana@test.com"
+
+
+def test_native_requests_are_recorded_in_metrics(file_app):
+    asgi_app = create_asgi_app(file_app)
+    call(asgi_app, "GET", "/users/report")
+
+    metrics = file_app.test_client().get("/metrics").get_data(as_text=True)
+    assert (
+        'http_request_duration_seconds_count{endpoint="user_bp.user_report",'
+        'method="GET"} 1' in metrics
+    )
+    # Statements on the async engine are counted too
+    statements = re.search(
+        r'http_request_sql_statements_total\{endpoint="user_bp.user_report",'
+        r'method="GET"\} (\d+)',
+        metrics,
+    )
+    assert int(statements.group(1)) >= 3
+
+
+def test_native_responses_are_compressed_like_flask(file_app):
+    client = file_app.test_client()
+    _seed(client, file_app)
+    file_app.extensions["compression"].min_size = 0
+    asgi_app = create_asgi_app(file_app)
+
+    flask_response = client.get("/users/report", headers={"Accept-Encoding": "gzip"})
+    status, headers, body = call(
+        asgi_app, "GET", "/users/report", headers=[("Accept-Encoding", "gzip")]
+    )
+    assert status == 200
+    assert headers["content-encoding"] == "gzip"
+    assert headers["vary"] == "Accept-Encoding"
+    assert headers["etag"] == flask_response.headers["ETag"]
+    assert gzip.decompress(body) == gzip.decompress(flask_response.data)
+
+    status, _, _ = call(
+        asgi_app,
+        "GET",
+        "/users/report",
+        headers=[("Accept-Encoding", "gzip"), ("If-None-Match", headers["etag"])],
+    )
+    assert status == 304
+
+
+def test_native_handlers_enforce_max_content_length(file_app):
+    file_app.config["MAX_CONTENT_LENGTH"] = 64
+    asgi_app = create_asgi_app(file_app)
+    body = {"email": "ana@test.com", "password": "x" * 100}
+
+    assert call(asgi_app, "POST", "/login", body=body)[0] == 413
+    assert file_app.test_client().post("/login", json=body).status_code == 413
+
+    # Bodies without a Content-Length are cut off while they are read
+    assert call(asgi_app, "POST", "/login", body=body, chunked=True)[0] == 413
+    small = {"email": "ana@test.com", "password": "x"}
+    assert call(asgi_app, "POST", "/login", body=small, chunked=True)[0] == 401
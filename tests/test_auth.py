@@ -1,5 +1,11 @@
+import json
+import threading
 from datetime import datetime
+from app.extensions import db
 from app.models import User
+from app.services.auth_service import get_email_filter
+from app.services.bloom import BloomFilter
+from app.services.user_service import check_password
 
 
 def test_register_user(client):
@@ -156,3 +162,219 @@ def test_toggling_user_to_inactive_sets_timestamp(client, app):
     json_data = response.get_json()
     assert json_data["is_active"] is False
     assert json_data["inactive_since"] is not None
+
+
+def test_check_password_does_not_load_roles(client, app, count_statements):
+    client.post(
+        "/register",
+        json={
+            "username": "lookupuser",
+            "email": "lookup@example.com",
+            "password": "testpassword",
+        },
+    )
+
+    with app.app_context():
+        get_email_filter().might_exist("lookup@example.com")  # build the filter
+
+        with count_statements() as statements:
+            assert check_password("lookup@example.com", "testpassword") is True
+
+    assert len(statements) == 1
+
+
+def test_bulk_register_reports_duplicates_per_row(client, app):
+    app.config["BULK_IMPORT_BATCH_SIZE"] = 2
+    client.post(
+        "/register",
+        json={
+            "username": "existing",
+            "email": "existing@example.com",
+            "password": "pw",
+        },
+    )
+
+    users = [
+        {"username": "bulk1", "email": "bulk1@example.com", "password": "pw"},
+        {"username": "existing", "email": "other@example.com", "password": "pw"},
+        {"username": "bulk2", "email": "bulk2@example.com", "password": "pw"},
+        {"username": "bulk3", "email": "bulk1@example.com", "password": "pw"},
+        {"username": "bulk4"},
+    ]
+    response = client.post("/users/bulk", json=users)
+
+    assert response.status_code == 201
+    json_data = response.get_json()
+    assert json_data["created"] == 2
+    assert json_data["errors"] == [
+        {"index": 1, "error": "username already exists"},
+        {"index": 3, "error": "email already exists"},
+        {"index": 4, "error": "username, email and password are required"},
+    ]
+
+    with app.app_context():
+        created = User.query.filter(User.username.in_(["bulk1", "bulk2"])).all()
+        assert len(created) == 2
+        assert all(user.inactive_since is not None for user in created)
+
+
+def test_bulk_register_accepts_ndjson(client, app):
+    body = "\n".join(
+        [
+            json.dumps(
+                {"username": f"nd{i}", "email": f"nd{i}@example.com", "password": "pw"}
+            )
+            for i in range(3)
+        ]
+        + ["{not json"]
+    )
+    response = client.post(
+        "/users/bulk", data=body, content_type="application/x-ndjson"
+    )
+
+    assert response.status_code == 201
+    json_data = response.get_json()
+    assert json_data["created"] == 3
+    assert json_data["failed"] == 1
+
+    response = client.post("/users/bulk", json={"username": "not-a-list"})
+    assert response.status_code == 400
+
+
+def _activate(app, email):
+    with app.app_context():
+        user = User.query.filter_by(email=email).first()
+        user.inactive_since = None
+        db.session.commit()
+
+
+def test_passwords_are_stored_hashed(client, app):
+    data = {"username": "hashed", "email": "hashed@example.com", "password": "pw"}
+    client.post("/register", json=data)
+
+    with app.app_context():
+        user = User.query.filter_by(email="hashed@example.com").first()
+        assert user.password != "pw"
+        assert user.password.startswith("$2b$04$")
+
+
+def test_login_rehashes_outdated_and_plaintext_passwords(client, app):
+    client.post(
+        "/register",
+        json={"username": "rehash", "email": "rehash@example.com", "password": "pw"},
+    )
+    _activate(app, "rehash@example.com")
+
+    app.extensions["password_hasher"].rounds = 5
+    response = client.post(
+        "/login", json={"email": "rehash@example.com", "password": "pw"}
+    )
+    assert response.status_code == 200
+
+    with app.app_context():
+        user = User.query.filter_by(email="rehash@example.com").first()
+        assert user.password.startswith("$2b$05$")
+
+        # Rows written before hashing was enabled still hold plaintext
+        user.password = "pw"
+        db.session.commit()
+
+    response = client.post(
+        "/login", json={"email": "rehash@example.com", "password": "pw"}
+    )
+    assert response.status_code == 200
+
+    with app.app_context():
+        user = User.query.filter_by(email="rehash@example.com").first()
+        assert user.password.startswith("$2b$05$")
+
+
+def test_login_sheds_load_when_hash_queue_is_full(client, app):
+    client.post(
+        "/register",
+        json={"username": "busy", "email": "busy@example.com", "password": "pw"},
+    )
+    _activate(app, "busy@example.com")
+
+    hasher = app.extensions["password_hasher"]
+    hasher._slots = threading.BoundedSemaphore(1)
+    hasher._slots.acquire()
+
+    response = client.post(
+        "/login", json={"email": "busy@example.com", "password": "pw"}
+    )
+
+    assert response.status_code == 503
+    assert response.headers["Retry-After"] == "1"
+
+
+def test_unknown_emails_are_rejected_without_a_query(client, app, count_statements):
+    client.post(
+        "/register",
+        json={"username": "known", "email": "known@example.com", "password": "pw"},
+    )
+    _activate(app, "known@example.com")
+
+    with app.app_context():
+        assert check_password("nobody@example.com", "pw") is False
+
+        with count_statements() as statements:
+            response = client.post(
+                "/login", json={"email": "stranger@example.com", "password": "pw"}
+            )
+        assert response.status_code == 401
+        assert statements == []
+
+        # A user registered afterwards is added to the filter straight away
+        client.post(
+            "/register",
+            json={"username": "late", "email": "late@example.com", "password": "pw"},
+        )
+        _activate(app, "late@example.com")
+
+    response = client.post(
+        "/login", json={"email": "late@example.com", "password": "pw"}
+    )
+    assert response.status_code == 200
+
+
+def test_email_filter_picks_up_ids_committed_out_of_order(client, app):
+    def commit_user(user_id, name):
+        with app.app_context():
+            db.session.add(
+                User(
+                    id=user_id,
+                    username=name,
+                    email=f"{name}@example.com",
+                    password="pw",
+                )
+            )
+            db.session.commit()
+
+    def login(name):
+        with app.app_context():
+            # Next login catches up instead of waiting out the TTL
+            get_email_filter()._synced_at = float("-inf")
+        return client.post(
+            "/login", json={"email": f"{name}@example.com", "password": "pw"}
+        ).status_code
+
+    commit_user(1, "first")
+    assert login("first") == 200
+    # Id 3 commits (and is seen) before id 2, as concurrent transactions on
+    # PostgreSQL can
+    commit_user(3, "third")
+    assert login("third") == 200
+    commit_user(2, "second")
+    assert login("second") == 200
+
+
+def test_bloom_filter_has_no_false_negatives():
+    bloom = BloomFilter(capacity=1000, error_rate=0.01)
+    emails = [f"user{i}@example.com" for i in range(1000)]
+    for email in emails:
+        bloom.add(email)
+
+    assert all(email in bloom for email in emails)
+    false_positives = sum(f"other{i}@example.com" in bloom for i in range(1000))
+    assert false_positives < 50
@@ -0,0 +1,31 @@
+from benchmarks.suite import compare, run_suite
+from benchmarks.bench_startup import probe
+
+
+def test_benchmark_suite_runs_and_detects_regressions(tmp_path):
+    results = run_suite(
+        [50], tmp_path, repeat=1, roles=5, roles_per_user=2, only=["service."]
+    )
+
+    cases = results["datasets"]["50"]
+    assert cases["service.get_user_report"]["sql_statements"] == 2
+    assert all(case["wall_seconds"] > 0 for case in cases.values())
+    assert compare(results, results, threshold=0.25) == []
+
+    slower = {
+        "datasets": {
+            "50": {
+                name: {**case, "wall_seconds": case["wall_seconds"] * 2}
+                for name, case in cases.items()
+            }
+        }
+    }
+    regressions = compare(results, slower, threshold=0.25)
+    assert len(regressions) == len(cases)
+
+
+def test_startup_does_not_load_deferred_modules():
+    result = probe("app.py")
+
+    assert result["loaded"] == []
+    assert result["import"] > 0 and result["create"] > 0
@@ -0,0 +1,50 @@
+from pathlib import Path
+from flask_migrate import upgrade
+from app.commands import find_full_scans, init_migrate
+from app.extensions import db
+
+MIGRATIONS = Path(__file__).parent.parent / "migrations"
+
+
+def test_audit_plans_finds_no_unexpected_full_scans(app):
+    result = app.test_cli_runner().invoke(args=["audit-plans"])
+
+    assert result.exit_code == 0, result.output
+    assert "No unexpected full table scans" in result.output
+
+
+def test_find_full_scans_flags_unindexed_filters(app):
+    with app.app_context():
+        # Plans depend on index creation order, which only the migrations fix
+        db.drop_all()
+        init_migrate(app)
+        upgrade(directory=str(MIGRATIONS))
+        with db.engine.connect() as connection:
+            _, scans = find_full_scans(
+                connection, "SELECT id FROM user WHERE password = ?", ("x",)
+            )
+            assert scans == {"user"}
+
+            _, scans = find_full_scans(
+                connection, "SELECT id FROM user WHERE email = ?", ("x",)
+            )
+            assert scans == set()
+
+            # Walking the partial index of inactive users is not a full scan
+            _, scans = find_full_scans(
+                connection,
+                "SELECT * FROM user WHERE inactive_since IS NOT NULL "
+                "ORDER BY id LIMIT 10",
+                (),
+            )
+            assert scans == set()
+
+
+def test_migrate_commands_are_set_up_on_demand(app):
+    assert "migrate" not in app.extensions
+
+    result = app.test_cli_runner().invoke(args=["db", "--help"])
+
+    assert result.exit_code == 0, result.output
+    assert "upgrade" in result.output
+    assert "migrate" in app.extensions
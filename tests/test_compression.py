@@ -0,0 +1,113 @@
+import gzip
+import json
+import zlib
+import pytest
+from tests.test_roles import create_role, create_user, get_user_id
+
+GZIP = {"Accept-Encoding": "gzip"}
+
+
+def _seed(client, app, users=12):
+    role_id = create_role(client, "Archivist", "Records")
+    for i in range(users):
+        create_user(client, f"user{i}")
+        user_id = get_user_id(app, f"user{i}@example.com")
+        client.post(f"/users/{user_id}/roles", json={"role_id": role_id})
+
+
+def test_buffered_report_is_gzipped_when_accepted(client, app):
+    _seed(client, app)
+    plain = client.get("/users/report")
+    assert "Content-Encoding" not in plain.headers
+    assert plain.headers["Vary"] == "Accept-Encoding"
+
+    response = client.get("/users/report", headers=GZIP)
+    assert response.status_code == 200
+    assert response.headers["Content-Encoding"] == "gzip"
+    assert int(response.headers["Content-Length"]) < len(plain.data) / 3
+    assert gzip.decompress(response.data) == plain.data
+
+    # The tag is weakened but still answers conditional requests
+    etag = response.headers["ETag"]
+    assert etag == "W/" + plain.headers["ETag"]
+    response = client.get("/users/report", headers={**GZIP, "If-None-Match": etag})
+    assert response.status_code == 304
+
+
+def test_small_and_refused_responses_are_not_compressed(client, app):
+    _seed(client, app, users=1)
+
+    response = client.get("/users/report", headers=GZIP)
+    assert len(response.data) < app.config["COMPRESSION_MIN_SIZE"]
+    assert "Content-Encoding" not in response.headers
+
+    _seed(client, app, users=0)
+    app.config["COMPRESSION_MIN_SIZE"] = 0
+    response = client.get("/users/report", headers={"Accept-Encoding": "gzip;q=0"})
+    assert "Content-Encoding" not in response.headers
+
+
+def test_streamed_report_is_compressed_incrementally(client, app):
+    _seed(client, app)
+    app.extensions["compression"].stream_flush_size = 256
+    plain = client.get("/users/report?stream=1").data
+
+    response = client.get("/users/report?stream=1", headers=GZIP, buffered=False)
+    assert response.headers["Content-Encoding"] == "gzip"
+    assert "Content-Length" not in response.headers
+    chunks = list(response.response)
+    response.close()
+
+    # Flushed along the way: rows decode before the stream is finished
+    assert len(chunks) > 2
+    flushed = zlib.decompressobj(31).decompress(b"".join(chunks[:-1]))
+    assert flushed.startswith(b'{"id":') and flushed.endswith(b"\n")
+    body = gzip.decompress(b"".join(chunks))
+    assert body == plain
+    assert [json.loads(line)["username"] for line in body.splitlines()][:2] == [
+        "user0",
+        "user1",
+    ]
+
+
+def _zstd_decoder():
+    return pytest.importorskip("zstandard").ZstdDecompressor().decompressobj()
+
+
+def _brotli_decoder():
+    return pytest.importorskip("brotli").Decompressor()
+
+
+def _decode(decoder, data):
+    if hasattr(decoder, "process"):
+        return decoder.process(data)
+    return decoder.decompress(data)
+
+
+# Each needs its extra ("zstd", "brotli"), which CI installs
+@pytest.mark.parametrize(
+    "encoding, decoder", [("zstd", _zstd_decoder), ("br", _brotli_decoder)]
+)
+def test_optional_encodings_decode(client, app, encoding, decoder):
+    decoder()
+    _seed(client, app)
+    headers = {"Accept-Encoding": encoding}
+
+    plain = client.get("/users/report").data
+    response = client.get("/users/report", headers=headers)
+    assert response.headers["Content-Encoding"] == encoding
+    assert _decode(decoder(), response.data) == plain
+
+    app.extensions["compression"].stream_flush_size = 256
+    plain = client.get("/users/report?stream=1").data
+    response = client.get("/users/report?stream=1", headers=headers, buffered=False)
+    assert response.headers["Content-Encoding"] == encoding
+    chunks = list(response.response)
+    response.close()
+
+    # Flushed blocks decode before the stream ends
+    assert len(chunks) > 2
+    stream = decoder()
+    flushed = _decode(stream, b"".join(chunks[:-1]))
+    assert flushed.startswith(b'{"id":') and flushed.endswith(b"\n")
+    assert flushed + _decode(stream, chunks[-1]) == plain
@@ -0,0 +1,43 @@
+import pytest
+from sqlalchemy import text
+from app import create_app
+from app.config import ProductionConfig, TestingConfig
+from app.extensions import db
+
+
+def test_sqlite_pragmas_applied_to_new_connections(tmp_path):
+    options = ProductionConfig.SQLALCHEMY_ENGINE_OPTIONS
+
+    class WalConfig(TestingConfig):
+        SQLALCHEMY_DATABASE_URI = f"sqlite:///{tmp_path / 'wal.db'}"
+        SQLALCHEMY_ENGINE_OPTIONS = options
+        SQLITE_PRAGMAS = ProductionConfig.SQLITE_PRAGMAS
+
+    app = create_app(config_class=WalConfig)
+    with app.app_context():
+        assert (
+            db.engine.pool.size()
+            == ProductionConfig.SQLALCHEMY_ENGINE_OPTIONS["pool_size"]
+        )
+        with db.engine.connect() as conn:
+            assert conn.execute(text("PRAGMA journal_mode")).scalar() == "wal"
+            assert conn.execute(text("PRAGMA synchronous")).scalar() == 1  # NORMAL
+            assert conn.execute(text("PRAGMA busy_timeout")).scalar() == 10000
+            assert conn.execute(text("PRAGMA mmap_size")).scalar() == 268435456
+        db.engine.dispose()
+
+
+def test_testing_profile_keeps_in_memory_journal(app):
+    with app.app_context():
+        assert db.engine.dialect.name == "sqlite"
+        with db.engine.connect() as conn:
+            assert conn.execute(text("PRAGMA journal_mode")).scalar() == "memory"
+
+
+def test_unsupported_database_fails_at_startup(monkeypatch):
+    from sqlalchemy.dialects.sqlite.pysqlite import SQLiteDialect_pysqlite
+
+    # Stands in for a database without ON CONFLICT inserts
+    monkeypatch.setattr(SQLiteDialect_pysqlite, "name", "mysql")
+    with pytest.raises(ValueError, match="Unsupported database 'mysql'"):
+        create_app(config_class=TestingConfig)
@@ -0,0 +1,259 @@
+import csv
+import io
+from datetime import datetime, timedelta
+from pathlib import Path
+import pytest
+from sqlalchemy import update
+from app import create_app
+from app.config import TestingConfig
+from app.extensions import db
+from app.models import ExportJob
+from app.services import export_service
+from app.services.export_service import get_export_runner
+from tests.test_roles import create_role, create_user, get_user_id
+
+
+@pytest.fixture
+def file_app(tmp_path):
+    # Exports run on another thread, which needs its own connection, so the
+    # database cannot be :memory:
+    class FileConfig(TestingConfig):
+        SQLALCHEMY_DATABASE_URI = f"sqlite:///{tmp_path / 'exports.db'}"
+        EXPORT_DIR = str(tmp_path / "exports")
+        EXPORT_CHUNK_SIZE = 2
+
+    app = create_app(config_class=FileConfig)
+    with app.app_context():
+        db.create_all()
+    yield app
+    with app.app_context():
+        get_export_runner().shutdown()
+        db.session.remove()
+        db.engine.dispose()
+
+
+def _wait(app):
+    with app.app_context():
+        get_export_runner().shutdown()
+
+
+def test_report_export_to_csv(file_app):
+    client = file_app.test_client()
+    role_id = create_role(client, "Admin", "IT")
+    for name in ("alice", "bob", "carol", "dave", "erin"):
+        create_user(client, name)
+    alice = get_user_id(file_app, "alice@example.com")
+    client.patch(f"/users/{alice}/toggle-active")
+    client.post(f"/users/{alice}/roles", json={"role_id": role_id})
+
+    response = client.post("/users/report/exports", json={"status": "all"})
+    assert response.status_code == 202
+    job = response.get_json()
+    assert job["status"] in ("queued", "running", "done")
+    assert job["total_users"] == 5
+    assert response.headers["Location"].endswith(f"/users/report/exports/{job['id']}")
+
+    _wait(file_app)
+
+    response = client.get(f"/users/report/exports/{job['id']}")
+    assert response.status_code == 200
+    job = response.get_json()
+    assert job["status"] == "done"
+    assert job["exported_users"] == 5
+    assert job["progress"] == 1.0
+
+    response = client.get(job["download_url"])
+    assert response.status_code == 200
+    assert "attachment" in response.headers["Content-Disposition"]
+    rows = list(csv.DictReader(io.StringIO(response.get_data(as_text=True))))
+    response.close()
+    assert [row["username"] for row in rows] == [
+        "alice",
+        "bob",
+        "carol",
+        "dave",
+        "erin",
+    ]
+    assert rows[0]["is_active"] == "true"
+    assert rows[0]["roles"] == "IT:Admin"
+    assert rows[1]["is_active"] == "false"
+    assert rows[1]["roles"] == ""
+
+
+def test_report_export_to_parquet(file_app):
+    # Installed by the "parquet" extra, which CI installs
+    parquet = pytest.importorskip("pyarrow.parquet")
+
+    client = file_app.test_client()
+    role_id = create_role(client, "Admin", "IT")
+    for name in ("alice", "bob", "carol"):
+        create_user(client, name)
+    alice = get_user_id(file_app, "alice@example.com")
+    client.patch(f"/users/{alice}/toggle-active")
+    client.post(f"/users/{alice}/roles", json={"role_id": role_id})
+
+    job = client.post("/users/report/exports", json={"format": "parquet"}).get_json()
+    _wait(file_app)
+    job = client.get(f"/users/report/exports/{job['id']}").get_json()
+    assert (job["status"], job["format"]) == ("done", "parquet")
+
+    response = client.get(job["download_url"])
+    assert response.status_code == 200
+    rows = parquet.read_table(io.BytesIO(response.get_data())).to_pylist()
+    response.close()
+    assert [row["username"] for row in rows] == ["alice", "bob", "carol"]
+    assert rows[0]["is_active"] is True
+    assert rows[0]["roles"] == ["IT:Admin"]
+    assert rows[1]["is_active"] is False
+    assert isinstance(rows[1]["inactive_since"], datetime)
+    assert rows[1]["roles"] == []
+
+
+def test_report_export_errors(file_app):
+    client = file_app.test_client()
+
+    response = client.post("/users/report/exports", json={"status": "gone"})
+    assert response.status_code == 400
+    response = client.post("/users/report/exports", json={"format": "xlsx"})
+    assert response.status_code == 400
+    assert "Unsupported format" in response.get_json()["error"]
+
+    assert client.get("/users/report/exports/999").status_code == 404
+    assert client.get("/users/report/exports/999/download").status_code == 404
+
+
+def test_report_export_not_downloadable_until_done(file_app, monkeypatch):
+    client = file_app.test_client()
+    # Keep the job queued: the worker never gets to run it
+    monkeypatch.setattr(export_service.ExportRunner, "submit", lambda self, _: None)
+
+    job = client.post("/users/report/exports", json={}).get_json()
+    assert job["status"] == "queued"
+    assert job["download_url"] is None
+    assert client.get(f"/users/report/exports/{job['id']}/download").status_code == 409
+
+
+def test_report_export_sheds_load_when_queue_is_full(file_app):
+    file_app.config.update(EXPORT_WORKERS=1, EXPORT_QUEUE_SIZE=0)
+    client = file_app.test_client()
+
+    with file_app.app_context():
+        runner = get_export_runner()
+        # Occupy the only slot
+        assert runner._slots.acquire(blocking=False)
+    try:
+        response = client.post("/users/report/exports", json={})
+        assert response.status_code == 503
+        assert response.headers["Retry-After"] == "30"
+    finally:
+        runner._slots.release()
+
+    with file_app.app_context():
+        assert client.post("/users/report/exports", json={}).status_code == 202
+
+
+def test_stale_exports_are_failed(file_app):
+    client = file_app.test_client()
+    now = datetime.utcnow()
+    stale = now - timedelta(seconds=file_app.config["EXPORT_STALE_AFTER"] + 1)
+
+    def add_job(status, heartbeat_at):
+        with file_app.app_context():
+            job = ExportJob(
+                status=status,
+                format="csv",
+                status_filter="all",
+                exported_users=0,
+                created_at=stale,
+                heartbeat_at=heartbeat_at,
+            )
+            db.session.add(job)
+            db.session.commit()
+            return job.id
+
+    # Left behind by workers that were restarted mid-export or with a job
+    # still queued, next to one whose worker is alive
+    running, queued, alive = (
+        add_job("running", stale),
+        add_job("queued", stale),
+        add_job("running", now),
+    )
+    partial = Path(file_app.config["EXPORT_DIR"]) / f"users-report-{running}.csv.part"
+    partial.parent.mkdir(parents=True)
+    partial.write_text("id,username\n")
+
+    # Starting the runner sweeps them
+    with file_app.app_context():
+        get_export_runner()
+    assert not partial.exists()
+    for export_id in (running, queued):
+        job = client.get(f"/users/report/exports/{export_id}").get_json()
+        assert job["status"] == "failed"
+        assert "stopped" in job["error"]
+        assert job["finished_at"] is not None
+    assert client.get(f"/users/report/exports/{alive}").get_json()["status"] == (
+        "running"
+    )
+
+    # Polling a stale job fails it too, without waiting for a new export
+    export_id = add_job("queued", stale)
+    job = client.get(f"/users/report/exports/{export_id}").get_json()
+    assert job["status"] == "failed"
+
+
+def test_export_failed_as_stale_while_running_stays_failed(file_app, monkeypatch):
+    client = file_app.test_client()
+    for name in ("alice", "bob", "carol", "dave", "erin"):
+        create_user(client, name)
+
+    # Another process fails the job as stale after its first chunk
+    iter_chunks = export_service._iter_report_chunks
+
+    def chunks_then_stale(*args):
+        for index, chunk in enumerate(iter_chunks(*args)):
+            yield chunk
+            if index == 0:
+                with db.engine.begin() as connection:
+                    connection.execute(
+                        update(ExportJob).values(status="failed", error="stale")
+                    )
+
+    monkeypatch.setattr(export_service, "_iter_report_chunks", chunks_then_stale)
+    job = client.post("/users/report/exports", json={}).get_json()
+    _wait(file_app)
+
+    job = client.get(f"/users/report/exports/{job['id']}").get_json()
+    assert (job["status"], job["error"]) == ("failed", "stale")
+    # Progress stops at the first chunk (EXPORT_CHUNK_SIZE is 2)
+    assert job["exported_users"] == 2
+    assert list(Path(file_app.config["EXPORT_DIR"]).iterdir()) == []
+
+
+def test_finished_exports_are_deleted_after_retention(file_app):
+    file_app.config["EXPORT_RETENTION"] = 3600
+    client = file_app.test_client()
+    create_user(client, "alice")
+
+    old, recent = (
+        client.post("/users/report/exports", json={}).get_json()["id"] for _ in range(2)
+    )
+    _wait(file_app)
+    with file_app.app_context():
+        db.session.execute(
+            update(ExportJob)
+            .where(ExportJob.id == old)
+            .values(finished_at=datetime.utcnow() - timedelta(hours=2))
+        )
+        db.session.commit()
+    directory = Path(file_app.config["EXPORT_DIR"])
+    assert len(list(directory.iterdir())) == 2
+
+    # Also swept whenever an export is requested
+    with file_app.app_context():
+        assert export_service.purge_expired_exports() == 1
+    assert client.get(f"/users/report/exports/{old}").status_code == 404
+    assert client.get(f"/users/report/exports/{recent}").get_json()["status"] == (
+        "done"
+    )
+    assert not (directory / f"users-report-{old}.csv").exists()
+    assert (directory / f"users-report-{recent}.csv").exists()
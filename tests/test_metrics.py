@@ -0,0 +1,73 @@
+import re
+from app import create_app
+from app.config import TestingConfig
+
+
+def _metric(text, name, endpoint, method="GET"):
+    pattern = rf'^{name}{{endpoint="{re.escape(endpoint)}",method="{method}"}} (\S+)$'
+    match = re.search(pattern, text, re.MULTILINE)
+    return float(match.group(1)) if match else None
+
+
+def test_metrics_record_latency_sql_and_size_per_endpoint(client):
+    client.post("/roles", json={"role_name": "Bard", "department_name": "Arcane"})
+    client.get("/users/report")
+    client.get("/users/report")
+
+    response = client.get("/metrics")
+
+    assert response.status_code == 200
+    assert response.mimetype == "text/plain"
+    text = response.get_data(as_text=True)
+
+    assert (
+        _metric(text, "http_request_duration_seconds_count", "user_bp.user_report") == 2
+    )
+    assert _metric(text, "http_request_sql_statements_total", "user_bp.user_report") > 0
+    assert _metric(text, "http_request_sql_seconds_total", "user_bp.user_report") > 0
+    assert _metric(text, "http_response_size_bytes_count", "user_bp.user_report") == 2
+    assert (
+        _metric(
+            text,
+            "http_request_duration_seconds_count",
+            "role.create_role_route",
+            "POST",
+        )
+        == 1
+    )
+    assert (
+        'http_request_duration_seconds_bucket{endpoint="user_bp.user_report",'
+        'method="GET",le="+Inf"} 2' in text
+    )
+
+
+def test_metrics_can_be_disabled():
+    class NoMetricsConfig(TestingConfig):
+        METRICS_ENABLED = False
+
+    client = create_app(config_class=NoMetricsConfig).test_client()
+    assert client.get("/metrics").status_code == 404
+
+
+def test_streamed_responses_are_recorded_once_sent(client, app, count_statements):
+    from tests.test_compression import _seed
+
+    _seed(client, app, users=5)
+    app.config["REPORT_STREAM_CHUNK_SIZE"] = 2
+
+    with app.app_context():
+        with count_statements() as statements:
+            response = client.get("/users/report?stream=1", buffered=False)
+            body = b"".join(response.response)
+            response.close()
+
+    text = client.get("/metrics").get_data(as_text=True)
+    endpoint = "user_bp.user_report"
+    assert len(body.splitlines()) == 5
+    assert _metric(text, "http_request_duration_seconds_count", endpoint) == 1
+    # Chunk queries run while the body streams and still count
+    assert _metric(text, "http_request_sql_statements_total", endpoint) == len(
+        statements
+    )
+    assert len(statements) > 3
+    assert _metric(text, "http_response_size_bytes_sum", endpoint) == len(body)
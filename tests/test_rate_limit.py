@@ -0,0 +1,113 @@
+from app.services.rate_limit import (
+    LoginRateLimiter,
+    MemoryBucketStore,
+    RateLimited,
+    SQLiteBucketStore,
+)
+
+
+def test_login_is_limited_per_email_before_any_work(client, app, count_statements):
+    app.config["LOGIN_RATE_LIMIT_PER_EMAIL"] = (2, 60)
+    client.post(
+        "/register",
+        json={"username": "target", "email": "target@example.com", "password": "pw"},
+    )
+
+    wrong = {"email": "target@example.com", "password": "guess"}
+    assert client.post("/login", json=wrong).status_code == 401
+    assert client.post("/login", json=wrong).status_code == 401
+
+    hasher = app.extensions["password_hasher"]
+    hasher.verify = hasher.hash = None  # any hashing now fails loudly
+    with app.app_context():
+        with count_statements() as statements:
+            # The email is normalized, so case does not open a new bucket
+            response = client.post(
+                "/login", json={**wrong, "email": "Target@Example.com"}
+            )
+    assert response.status_code == 429
+    assert 1 <= int(response.headers["Retry-After"]) <= 30
+    assert statements == []
+
+
+def test_correct_login_works_while_another_ip_guesses(client, app):
+    app.config["LOGIN_RATE_LIMIT_PER_EMAIL"] = (2, 60)
+    credentials = {"email": "target@example.com", "password": "pw"}
+    client.post("/register", json={"username": "target", **credentials})
+    client.patch("/users/1/toggle-active")
+    attacker = {"REMOTE_ADDR": "10.6.6.6"}
+
+    wrong = {**credentials, "password": "guess"}
+    statuses = [
+        client.post("/login", json=wrong, environ_base=attacker).status_code
+        for _ in range(3)
+    ]
+    assert statuses == [401, 401, 429]
+
+    # Successful logins take no email token, so they can repeat
+    for _ in range(3):
+        assert client.post("/login", json=credentials).status_code == 200
+    assert client.post("/login", json=wrong).status_code == 401
+    assert (
+        client.post("/login", json=credentials, environ_base=attacker).status_code
+        == 429
+    )
+
+
+def test_login_is_limited_per_ip(client, app):
+    app.config["LOGIN_RATE_LIMIT_PER_IP"] = (3, 60)
+
+    for n in range(3):
+        response = client.post("/login", json={"email": f"u{n}@x.com", "password": "p"})
+        assert response.status_code == 401
+    response = client.post("/login", json={"email": "u9@x.com", "password": "p"})
+    assert response.status_code == 429
+
+    # Other clients are unaffected
+    response = client.post(
+        "/login",
+        json={"email": "u9@x.com", "password": "p"},
+        environ_base={"REMOTE_ADDR": "10.1.2.3"},
+    )
+    assert response.status_code == 401
+
+
+def test_buckets_refill_over_time():
+    now = [0.0]
+    limiter = LoginRateLimiter(
+        MemoryBucketStore(clock=lambda: now[0]), ip_limit=(2, 10), email_limit=(9, 1)
+    )
+
+    limiter.check("1.2.3.4", "a@x.com")
+    limiter.check("1.2.3.4", "a@x.com")
+    try:
+        limiter.check("1.2.3.4", "a@x.com")
+        raise AssertionError("expected RateLimited")
+    except RateLimited as ex:
+        assert ex.retry_after == 5.0
+
+    now[0] = 5.0
+    limiter.check("1.2.3.4", "a@x.com")
+
+
+def test_sqlite_buckets_are_shared_between_processes(tmp_path):
+    now = [100.0]
+    path = tmp_path / "buckets.db"
+    # Two stores on one file stand in for two worker processes
+    first = SQLiteBucketStore(path, prune_every=2, clock=lambda: now[0])
+    second = SQLiteBucketStore(path, clock=lambda: now[0])
+
+    assert first.take("ip:1", 2, 60) == 0
+    assert second.take("ip:1", 2, 60) == 0
+    assert first.take("ip:1", 2, 60) == 30.0
+    # Peeking reports the wait without taking anything
+    assert second.peek("ip:1", 2, 60) == 30.0
+    assert second.peek("ip:2", 2, 60) == 0
+    assert second.take("ip:2", 2, 60) == 0
+
+    # Once refilled, buckets are pruned
+    now[0] = 1000.0
+    first.take("ip:3", 2, 60)
+    first.take("ip:3", 2, 60)
+    keys = first._connect().execute("SELECT key FROM rate_limit_buckets").fetchall()
+    assert keys == [("ip:3",)]
@@ -0,0 +1,72 @@
+import pytest
+from sqlalchemy import insert
+from app import create_app
+from app.config import TestingConfig
+from app.database import replica_reads
+from app.extensions import db
+from app.models import User
+from app.services.user_service import create_user, get_user_report
+
+
+@pytest.fixture
+def replica_app(tmp_path):
+    class ReplicaConfig(TestingConfig):
+        SQLALCHEMY_DATABASE_URI = f"sqlite:///{tmp_path / 'primary.db'}"
+        SQLALCHEMY_BINDS = {"replica": f"sqlite:///{tmp_path / 'replica.db'}"}
+        REPLICA_STALENESS_WINDOW = 60
+
+    app = create_app(config_class=ReplicaConfig)
+    with app.app_context():
+        db.create_all()
+        db.metadata.create_all(db.engines["replica"])
+        # A row only the replica has shows where a read was served from
+        with db.engines["replica"].begin() as conn:
+            conn.execute(
+                insert(User).values(
+                    username="replica", email="replica@example.com", password="x"
+                )
+            )
+
+    yield app
+
+    with app.app_context():
+        db.session.remove()
+        for engine in db.engines.values():
+            engine.dispose()
+    # init_app registered (empty) metadata for the bind on the shared db object
+    db.metadatas.pop("replica", None)
+
+
+def _report_emails(client):
+    response = client.get("/users/report")
+    assert response.status_code == 200
+    return [user["email"] for user in response.get_json()["users"]]
+
+
+def test_get_requests_read_from_replica(replica_app):
+    assert _report_emails(replica_app.test_client()) == ["replica@example.com"]
+
+
+def test_client_reads_its_own_writes_within_staleness_window(replica_app):
+    client = replica_app.test_client()
+    response = client.post(
+        "/register",
+        json={"username": "new", "email": "new@example.com", "password": "pw123456"},
+    )
+    assert response.status_code == 201
+
+    # The writer keeps reading from the primary; other clients may lag
+    assert _report_emails(client) == ["new@example.com"]
+    assert _report_emails(replica_app.test_client()) == ["replica@example.com"]
+
+
+def test_reads_after_a_write_in_the_same_session_use_primary(replica_app):
+    with replica_app.app_context():
+        with replica_reads():
+            assert [u["email"] for u in get_user_report()["users"]] == [
+                "replica@example.com"
+            ]
+            create_user("new", "new@example.com", "pw123456")
+            assert [u["email"] for u in get_user_report()["users"]] == [
+                "new@example.com"
+            ]
@@ -0,0 +1,161 @@
+from app.services.summary_service import get_report_summary, rebuild_report_summary
+from tests.test_roles import create_role, create_user, get_user_id
+
+
+def _setup(client, app):
+    admin = create_role(client, "Admin", "IT")
+    support = create_role(client, "Support", "IT")
+    auditor = create_role(client, "Auditor", "Compliance")
+
+    user_ids = []
+    for name in ("alice", "bob", "carol"):
+        create_user(client, name)
+        user_ids.append(get_user_id(app, f"{name}@example.com"))
+    alice, bob, carol = user_ids
+
+    client.patch(f"/users/{alice}/toggle-active")
+    client.patch(f"/users/{bob}/toggle-active")
+    client.post(f"/users/{alice}/roles", json={"role_id": admin})
+    client.post(f"/users/{alice}/roles", json={"role_id": support})
+    client.post(f"/users/{bob}/roles", json={"role_id": support})
+    client.post(f"/users/{carol}/roles", json={"role_id": auditor})
+    client.delete(f"/users/{bob}/roles/{support}")
+    client.post(
+        "/users/roles/bulk",
+        json={
+            "action": "grant",
+            "pairs": [
+                {"user_id": bob, "role_id": auditor},
+                {"user_id": carol, "role_id": auditor},
+            ],
+        },
+    )
+    # Deactivating a user moves them in every group they belong to
+    client.patch(f"/users/{alice}/toggle-active")
+    client.patch(f"/users/{alice}/toggle-active")
+    return admin, support, auditor
+
+
+def test_report_summary_counts_by_status_department_and_role(client, app):
+    admin, support, auditor = _setup(client, app)
+
+    response = client.get("/users/report/summary")
+    assert response.status_code == 200
+    data = response.get_json()
+
+    assert data["total_users"] == 3
+    assert data["status"] == {"active": 2, "inactive": 1}
+    assert data["departments"] == [
+        {"department_name": "Compliance", "active": 1, "inactive": 1},
+        # alice holds both IT roles but counts once
+        {"department_name": "IT", "active": 1, "inactive": 0},
+    ]
+    counts = {role["role_id"]: role for role in data["roles"]}
+    assert counts[admin]["active"] == 1
+    assert counts[support] == {
+        "role_id": support,
+        "role_name": "Support",
+        "department_name": "IT",
+        "active": 1,
+        "inactive": 0,
+    }
+    assert (counts[auditor]["active"], counts[auditor]["inactive"]) == (1, 1)
+
+    # Unchanged data answers the conditional request with 304
+    etag = response.headers["ETag"]
+    response = client.get("/users/report/summary", headers={"If-None-Match": etag})
+    assert response.status_code == 304
+
+    client.patch(f"/users/{get_user_id(app, 'carol@example.com')}/toggle-active")
+    response = client.get("/users/report/summary", headers={"If-None-Match": etag})
+    assert response.status_code == 200
+    assert response.get_json()["status"] == {"active": 3, "inactive": 0}
+
+
+def test_rebuild_report_summary_matches_incremental_counts(client, app):
+    _setup(client, app)
+    client.post(
+        "/users/bulk",
+        json=[{"username": "dave", "email": "dave@example.com", "password": "pw"}],
+    )
+
+    with app.app_context():
+        incremental = get_report_summary()
+        assert rebuild_report_summary() > 0
+        assert get_report_summary() == incremental
+
+    result = app.test_cli_runner().invoke(args=["rebuild-report-summary"])
+    assert result.exit_code == 0, result.output
+    assert "Rebuilt report summary" in result.output
+
+
+def test_report_summary_reads_one_row_per_group(client, app, count_statements):
+    _setup(client, app)
+    for i in range(20):
+        create_user(client, f"extra{i}")
+
+    with app.app_context():
+        get_report_summary()  # warm the role catalog
+        with count_statements() as statements:
+            get_report_summary()
+        assert len(statements) == 1
+
+
+def test_role_changes_are_counted_from_state_after_the_write(client, app, monkeypatch):
+    from app.services import role_service
+
+    admin, support, auditor = _setup(client, app)
+    create_user(client, "erin")
+    erin = get_user_id(app, "erin@example.com")
+    client.post(f"/users/{erin}/roles", json={"role_id": admin})
+
+    # Reads made before concurrent requests committed: they miss erin's IT
+    # role and the toggle to active
+    monkeypatch.setattr(role_service, "_role_ids_for_user", lambda user_id: [])
+    get_user_and_role = role_service._get_user_and_role
+
+    def stale_user_and_role(user_id, role_id):
+        user, role = get_user_and_role(user_id, role_id)
+        client.patch(f"/users/{user_id}/toggle-active")
+        return user, role
+
+    monkeypatch.setattr(role_service, "_get_user_and_role", stale_user_and_role)
+    with app.app_context():
+        role_service.assign_role_to_user(erin, support)
+
+        incremental = get_report_summary()
+        rebuild_report_summary()
+        assert get_report_summary() == incremental
+    it = next(d for d in incremental["departments"] if d["department_name"] == "IT")
+    assert (it["active"], it["inactive"]) == (2, 0)
+
+
+def test_status_and_role_counts_lock_the_user_row(client, app):
+    from sqlalchemy import event
+    from sqlalchemy.dialects import postgresql
+    from app.extensions import db
+
+    admin, support, auditor = _setup(client, app)
+    bob = get_user_id(app, "bob@example.com")
+
+    # SQLite drops FOR UPDATE, so the statements are checked as PostgreSQL
+    # would receive them
+    locks = []
+
+    def record(state):
+        if not state.is_select:
+            return
+        sql = str(state.statement.compile(dialect=postgresql.dialect()))
+        if 'FROM "user"' in sql and sql.endswith("FOR UPDATE"):
+            locks.append(sql)
+
+    with app.app_context():
+        event.listen(db.session, "do_orm_execute", record)
+    client.patch(f"/users/{bob}/toggle-active")
+    client.post(f"/users/{bob}/roles", json={"role_id": admin})
+    client.delete(f"/users/{bob}/roles/{admin}")
+    client.post(
+        "/users/roles/bulk",
+        json={"action": "grant", "pairs": [{"user_id": bob, "role_id": admin}]},
+    )
+    assert len(locks) == 4
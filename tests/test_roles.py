@@ -1,4 +1,7 @@
+from app.extensions import db
 from app.models import User, Role
+from app.services.cache import ROLE_VERSION, LRUCache, bump_version
+from app.services.pagination import encode_cursor
 
 
 # Helper functions (consolidating tests)
@@ -126,6 +129,16 @@ def test_assign_role_to_user(client, app):
     assert response.status_code == 400
     assert "role_id is required" in response.get_json()["error"]
 
+    # A numeric string names the same role
+    response = client.post(f"/users/{user_id}/roles", json={"role_id": str(role_id)})
+    assert response.status_code == 200
+    assert len(response.get_json()["roles"]) == 1
+
+    for bad in ("Ranger", [role_id], 1.5, True):
+        response = client.post(f"/users/{user_id}/roles", json={"role_id": bad})
+        assert response.status_code == 400
+        assert response.get_json() == {"error": "role_id must be an integer"}
+
 
 def test_assign_multiple_roles_to_user(client, app):
     create_user(client, "multiuser", "multiuser@example.com")
@@ -209,3 +222,220 @@ def test_role_assignment_to_multiple_users(client, app):
         json_data = response.get_json()
         assert len(json_data["roles"]) == 1
         assert json_data["roles"][0]["role_name"] == "Sorcerer"
+
+
+def test_list_roles_keyset_pagination(client):
+    roles_data = [
+        ("Rogue", "Stealth"),
+        ("Bard", "Arcane"),
+        ("Wizard", "Arcane"),
+        ("Barbarian", "Martial"),
+        ("Assassin", "Stealth"),
+    ]
+    for role_name, department_name in roles_data:
+        create_role(client, role_name, department_name)
+
+    response = client.get("/roles?limit=2")
+    assert response.status_code == 200
+    first_page = response.get_json()
+    assert first_page["total_roles"] == 2
+    assert first_page["next_cursor"] is not None
+
+    pages = [first_page]
+    while pages[-1]["next_cursor"]:
+        response = client.get(f"/roles?limit=2&cursor={pages[-1]['next_cursor']}")
+        assert response.status_code == 200
+        pages.append(response.get_json())
+
+    listed = [
+        (role["department_name"], role["role_name"])
+        for page in pages
+        for role in page["roles"]
+    ]
+    assert listed == sorted((dept, name) for name, dept in roles_data)
+
+    response = client.get("/roles?cursor=bogus")
+    assert response.status_code == 400
+
+    # Well-formed JSON, but not a (department, role name) key
+    response = client.get(f"/roles?cursor={encode_cursor([1, 2])}")
+    assert response.status_code == 400
+    assert response.get_json() == {"error": "Invalid cursor"}
+
+
+def test_role_reads_are_served_from_catalog(client, app, count_statements):
+    create_role(client, "Bard", "Arcane")
+    create_role(client, "Rogue", "Stealth")
+
+    # First read loads the catalog
+    client.get("/roles")
+
+    with app.app_context():
+        with count_statements() as statements:
+            response = client.get("/roles")
+
+    assert response.status_code == 200
+    assert response.get_json()["total_roles"] == 2
+    assert statements == []
+
+
+def test_list_roles_conditional_get(client, app):
+    create_role(client, "Bard", "Arcane")
+    etag = client.get("/roles").headers["ETag"]
+
+    response = client.get("/roles", headers={"If-None-Match": etag})
+    assert response.status_code == 304
+    assert response.headers["ETag"] == etag
+
+    create_role(client, "Rogue", "Stealth")
+    response = client.get("/roles", headers={"If-None-Match": etag})
+    assert response.status_code == 200
+    assert response.get_json()["total_roles"] == 2
+
+
+def test_role_grants_change_report_etag(client, app):
+    create_user(client, "granted", "granted@example.com")
+    user_id = get_user_id(app, "granted@example.com")
+    role_id = create_role(client, "Druid", "Nature")
+    etag = client.get("/users/report").headers["ETag"]
+
+    client.post(f"/users/{user_id}/roles", json={"role_id": role_id})
+    assert (
+        client.get("/users/report", headers={"If-None-Match": etag}).status_code == 200
+    )
+
+    etag = client.get("/users/report").headers["ETag"]
+    client.post(
+        "/users/roles/bulk",
+        json={"action": "revoke", "pairs": [{"user_id": user_id, "role_id": role_id}]},
+    )
+    assert (
+        client.get("/users/report", headers={"If-None-Match": etag}).status_code == 200
+    )
+
+
+def test_role_catalog_sees_roles_created_by_other_workers(client, app):
+    create_role(client, "Bard", "Arcane")
+    client.get("/roles")
+
+    # Simulate another worker process: write the role and bump the shared
+    # version without going through this process's catalog
+    with app.app_context():
+        db.session.add(Role(role_name="Monk", department_name="Martial"))
+        bump_version(ROLE_VERSION)
+        db.session.commit()
+
+    assert client.get("/roles").get_json()["total_roles"] == 1
+
+    app.extensions["role_catalog"].ttl = 0
+    assert client.get("/roles").get_json()["total_roles"] == 2
+
+
+def test_user_roles_cache_hits_and_write_through(client, app, count_statements):
+    create_user(client, "cacheduser", "cacheduser@example.com")
+    user_id = get_user_id(app, "cacheduser@example.com")
+    role_ids = [
+        create_role(client, "Druid", "Nature"),
+        create_role(client, "Monk", "Martial"),
+    ]
+
+    client.post(f"/users/{user_id}/roles", json={"role_id": role_ids[0]})
+
+    # Assignment wrote the entry through, so reads are pure cache hits
+    with app.app_context():
+        with count_statements() as statements:
+            response = client.get(f"/users/{user_id}/roles")
+    assert statements == []
+    assert [r["role_name"] for r in response.get_json()["roles"]] == ["Druid"]
+
+    client.post(f"/users/{user_id}/roles", json={"role_id": role_ids[1]})
+    client.delete(f"/users/{user_id}/roles/{role_ids[0]}")
+
+    response = client.get(f"/users/{user_id}/roles")
+    assert [r["role_name"] for r in response.get_json()["roles"]] == ["Monk"]
+
+    stats = client.get("/roles/cache-stats").get_json()["user_roles"]
+    assert stats["hits"] == 2
+    assert stats["size"] == 1
+
+
+def test_lru_cache_evicts_least_recently_used():
+    cache = LRUCache(max_entries=2, ttl=60)
+    cache.set(1, "a")
+    cache.set(2, "b")
+    assert cache.get(1) == "a"
+
+    cache.set(3, "c")
+
+    assert cache.get(2) is None
+    assert cache.get(1) == "a"
+    assert cache.get(3) == "c"
+    assert cache.stats()["evictions"] == 1
+
+    expired = LRUCache(max_entries=2, ttl=0)
+    expired.set(1, "a")
+    assert expired.get(1) is None
+    assert expired.stats()["misses"] == 1
+
+
+def test_bulk_grant_and_revoke_roles(client, app, count_statements):
+    user_ids = []
+    for i in range(3):
+        create_user(client, f"bulkrole{i}", f"bulkrole{i}@example.com")
+        user_ids.append(get_user_id(app, f"bulkrole{i}@example.com"))
+    role_id = create_role(client, "Paladin", "Divine")
+
+    client.post(f"/users/{user_ids[0]}/roles", json={"role_id": role_id})
+    client.get(f"/users/{user_ids[1]}/roles")  # cache an empty role list
+
+    pairs = [{"user_id": user_id, "role_id": role_id} for user_id in user_ids]
+    response = client.post(
+        "/users/roles/bulk",
+        json={
+            "action": "grant",
+            "pairs": pairs
+            + [
+                {"user_id": 99999, "role_id": role_id},
+                {"user_id": user_ids[0], "role_id": 99999},
+                {"user_id": "x"},
+            ],
+        },
+    )
+    assert response.status_code == 200
+    assert [r["result"] for r in response.get_json()["results"]] == [
+        "already_granted",
+        "granted",
+        "granted",
+        "user_not_found",
+        "role_not_found",
+        "invalid",
+    ]
+
+    # The cached empty list was invalidated by the grant
+    response = client.get(f"/users/{user_ids[1]}/roles")
+    assert [r["role_name"] for r in response.get_json()["roles"]] == ["Paladin"]
+
+    with app.app_context():
+        with count_statements() as statements:
+            response = client.post(
+                "/users/roles/bulk", json={"action": "revoke", "pairs": pairs[:2]}
+            )
+    assert [r["result"] for r in response.get_json()["results"]] == [
+        "revoked",
+        "revoked",
+    ]
+    assert sum(s.lstrip().upper().startswith("DELETE") for s in statements) == 1
+
+    response = client.post(
+        "/users/roles/bulk", json={"action": "revoke", "pairs": pairs}
+    )
+    assert [r["result"] for r in response.get_json()["results"]] == [
+        "not_assigned",
+        "not_assigned",
+        "revoked",
+    ]
+
+    response = client.post(
+        "/users/roles/bulk", json={"action": "bogus", "pairs": pairs}
+    )
+    assert response.status_code == 400
@@ -0,0 +1,81 @@
+import json
+from datetime import datetime
+import pytest
+from flask.json.provider import DefaultJSONProvider
+from app import serializers
+from app.extensions import db
+from app.models import Role, User, user_roles
+from app.serializers import FastJSONProvider
+from app.services.user_service import get_user_report, render_user_report
+
+
+def _seed(app):
+    with app.app_context():
+        db.session.add_all(
+            [
+                Role(role_id=1, role_name="Fighter", department_name="Martial"),
+                Role(role_id=2, role_name="Clérigo", department_name="Divine"),
+                User(id=1, username="ana", email="ana@test.com", password="x"),
+                User(
+                    id=2,
+                    username='quote"d',
+                    email="q@test.com",
+                    password="x",
+                    inactive_since=datetime(2024, 5, 1, 12, 30, 15, 250),
+                ),
+                User(id=3, username="norole", email="n@test.com", password="x"),
+            ]
+        )
+        db.session.flush()
+        db.session.execute(
+            user_roles.insert(),
+            [
+                {"user_id": 1, "role_id": 1},
+                {"user_id": 1, "role_id": 2},
+                {"user_id": 2, "role_id": 2},
+            ],
+        )
+        db.session.commit()
+
+
+def test_encoded_report_matches_report_dict(app):
+    _seed(app)
+
+    with app.app_context():
+        for status, limit in (("all", None), ("inactive", None), ("all", 2)):
+            encoded = render_user_report(status, limit=limit)
+            assert json.loads(encoded) == get_user_report(status, limit=limit)
+
+
+def test_report_ndjson_lines_match_report(client, app):
+    _seed(app)
+
+    lines = client.get("/users/report?stream=1").data.splitlines()
+    with app.app_context():
+        assert [json.loads(line) for line in lines] == get_user_report()["users"]
+
+
+def test_json_provider_matches_default_output(app, monkeypatch):
+    payload = {"when": datetime(2024, 5, 1, 12, 30), "name": "Zoë", "n": [1, 2.5]}
+    default = DefaultJSONProvider(app)
+
+    assert isinstance(app.json, FastJSONProvider)
+    assert json.loads(app.json.dumps(payload)) == json.loads(default.dumps(payload))
+    with app.test_request_context():
+        response = app.json.response(payload)
+    assert response.mimetype == "application/json"
+    assert response.get_json() == json.loads(default.dumps(payload))
+
+    # Without orjson the provider behaves like the default one
+    monkeypatch.setattr(serializers, "orjson", None)
+    assert app.json.dumps(payload) == default.dumps(payload, sort_keys=False)
+
+
+def test_json_provider_encodes_with_orjson(app):
+    orjson = pytest.importorskip("orjson")
+    payload = {"b": 1, "a": [True, None], "name": "Zoë"}
+
+    assert serializers.orjson is orjson
+    assert serializers.dumps(payload) == orjson.dumps(payload)
+    # Insertion order is kept, not sorted
+    assert app.json.dumps(payload) == orjson.dumps(payload).decode()
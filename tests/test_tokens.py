@@ -0,0 +1,146 @@
+from app.extensions import db
+from app.services.role_service import assign_role_to_user
+from app.services.tokens import get_revocation_list, revoke_tokens
+from app.services.user_service import toggle_user_active
+
+
+def _login(client, username="tok"):
+    credentials = {"email": f"{username}@example.com", "password": "pw123456"}
+    client.post("/register", json={"username": username, **credentials})
+    user_id = len(client.get("/users/report?fields=id").get_json()["users"])
+    client.patch(f"/users/{user_id}/toggle-active")
+
+    response = client.post("/login", json=credentials)
+    assert response.status_code == 200
+    data = response.get_json()
+    assert data["token_type"] == "Bearer"
+    assert data["expires_in"] == 900
+    return user_id, {"Authorization": f"Bearer {data['access_token']}"}
+
+
+def test_profile_is_answered_from_the_token(client, app, count_statements):
+    role = client.post(
+        "/roles", json={"role_name": "Bard", "department_name": "Arcane"}
+    ).get_json()
+    user_id, _ = _login(client)
+    client.post(f"/users/{user_id}/roles", json={"role_id": role["role_id"]})
+    # Role changes revoke earlier tokens, so log in again for one with the role
+    response = client.post(
+        "/login", json={"email": "tok@example.com", "password": "pw123456"}
+    )
+    headers = {"Authorization": f"Bearer {response.get_json()['access_token']}"}
+
+    client.get("/profile", headers=headers)  # warm the revocation list
+    with app.app_context():
+        with count_statements() as statements:
+            profile = client.get("/profile", headers=headers)
+            roles = client.get(f"/users/{user_id}/roles", headers=headers)
+    assert statements == []
+    assert profile.status_code == 200
+    assert profile.get_json() == {
+        "user_id": user_id,
+        "is_active": True,
+        "roles": [role],
+    }
+    assert roles.get_json() == {"user_id": user_id, "roles": [role]}
+
+
+def test_missing_forged_and_expired_tokens_are_rejected(client, app):
+    response = client.get("/profile")
+    assert response.status_code == 401
+    assert response.headers["WWW-Authenticate"] == "Bearer"
+
+    _, headers = _login(client)
+    forged = {"Authorization": headers["Authorization"][:-2] + "xx"}
+    response = client.get("/profile", headers=forged)
+    assert response.status_code == 401
+    assert response.get_json() == {"error": "Invalid token"}
+
+    app.config["SECRET_KEY"] = "rotated"
+    assert client.get("/profile", headers=headers).status_code == 401
+    app.config["SECRET_KEY"] = "test-secret-key-not-for-production"
+
+    app.config["ACCESS_TOKEN_TTL"] = -1
+    response = client.get("/profile", headers=headers)
+    assert response.get_json() == {"error": "Token expired"}
+
+
+def test_deactivation_and_role_changes_revoke_tokens(client, app):
+    user_id, headers = _login(client)
+    assert client.get("/profile", headers=headers).status_code == 200
+
+    client.patch(f"/users/{user_id}/toggle-active")
+    response = client.get("/profile", headers=headers)
+    assert response.status_code == 401
+    assert response.get_json() == {"error": "Token revoked"}
+
+    # Tokens issued after the revocation are accepted straight away
+    client.patch(f"/users/{user_id}/toggle-active")
+    response = client.post(
+        "/login", json={"email": "tok@example.com", "password": "pw123456"}
+    )
+    headers = {"Authorization": f"Bearer {response.get_json()['access_token']}"}
+    assert client.get("/profile", headers=headers).status_code == 200
+
+    role = client.post(
+        "/roles", json={"role_name": "Bard", "department_name": "Arcane"}
+    ).get_json()
+    client.post(
+        "/users/roles/bulk",
+        json={
+            "action": "grant",
+            "pairs": [{"user_id": user_id, "role_id": role["role_id"]}],
+        },
+    )
+    assert client.get(f"/users/{user_id}/roles", headers=headers).status_code == 401
+
+
+def test_revocations_from_other_workers_apply_within_the_ttl(client, app):
+    app.config["TOKEN_REVOCATION_TTL"] = 60
+    user_id, headers = _login(client)
+    assert client.get("/profile", headers=headers).status_code == 200
+
+    # Another worker revokes; this one only sees it once its TTL runs out
+    with app.app_context():
+        revoke_tokens([user_id])
+        db.session.commit()
+        revocations = get_revocation_list()
+
+    assert client.get("/profile", headers=headers).status_code == 200
+    revocations.ttl = 0
+    assert client.get("/profile", headers=headers).status_code == 401
+
+
+def test_changes_committed_while_a_login_runs_revoke_its_token(client, app):
+    user_id, _ = _login(client)
+    role = client.post(
+        "/roles", json={"role_name": "Bard", "department_name": "Arcane"}
+    ).get_json()
+    hasher = app.extensions["password_hasher"]
+    verify = hasher.verify
+
+    def login_during(change):
+        # The login has read the user's status when the change commits, and
+        # issues its token after it
+        def verify_during_change(password, stored):
+            change()
+            return verify(password, stored)
+
+        hasher.verify = verify_during_change
+        try:
+            response = client.post(
+                "/login", json={"email": "tok@example.com", "password": "pw123456"}
+            )
+        finally:
+            hasher.verify = verify
+        assert response.status_code == 200
+        token = response.get_json()["access_token"]
+        return client.get("/profile", headers={"Authorization": f"Bearer {token}"})
+
+    response = login_during(lambda: toggle_user_active(user_id))
+    assert response.status_code == 401
+    assert response.get_json() == {"error": "Token revoked"}
+
+    client.patch(f"/users/{user_id}/toggle-active")
+    response = login_during(lambda: assign_role_to_user(user_id, role["role_id"]))
+    assert response.get_json() == {"error": "Token revoked"}
@@ -1,6 +1,10 @@
+import json
 from datetime import datetime
-from app.models import User
+from sqlalchemy import insert
+from app.models import Role, User, user_roles
 from app.extensions import db
+from app.services.cache import get_role_catalog
+from app.services.user_service import get_user_report
 
 
 # Maintained structure from test_auth.py
@@ -129,3 +133,325 @@ def test_user_report_invalid(client):
     data = response.get_json()
     assert "error" in data
     assert "Invalid status parameter" in data["error"]
+
+
+def test_user_report_streams_ndjson(client, app):
+    app.config["REPORT_STREAM_CHUNK_SIZE"] = 2
+    with app.app_context():
+        users = [
+            User(
+                username=f"stream_user{i}",
+                email=f"stream{i}@test.com",
+                password="pass123",
+                inactive_since=None if i % 2 else datetime.utcnow(),
+            )
+            for i in range(5)
+        ]
+        db.session.add_all(users)
+        db.session.commit()
+
+    response = client.get("/users/report?stream=1")
+
+    assert response.status_code == 200
+    assert response.mimetype == "application/x-ndjson"
+
+    lines = [json.loads(line) for line in response.data.decode().splitlines()]
+    assert [line["username"] for line in lines] == [f"stream_user{i}" for i in range(5)]
+    assert lines[0]["roles"] == []
+
+
+def test_user_report_streams_when_ndjson_accepted(client, app):
+    app.config["REPORT_STREAM_CHUNK_SIZE"] = 2
+    with app.app_context():
+        db.session.add_all(
+            [
+                User(
+                    username=f"accept_user{i}",
+                    email=f"accept{i}@test.com",
+                    password="pass123",
+                    inactive_since=None,
+                )
+                for i in range(4)
+            ]
+        )
+        db.session.commit()
+
+    response = client.get(
+        "/users/report?status=active", headers={"Accept": "application/x-ndjson"}
+    )
+
+    assert response.status_code == 200
+    assert response.mimetype == "application/x-ndjson"
+    lines = response.data.decode().splitlines()
+    assert len(lines) == 4
+    assert all(json.loads(line)["is_active"] for line in lines)
+
+
+def test_user_report_keyset_pagination(client, app):
+    with app.app_context():
+        db.session.add_all(
+            [
+                User(
+                    username=f"page_user{i}",
+                    email=f"page{i}@test.com",
+                    password="pass123",
+                    inactive_since=None,
+                )
+                for i in range(5)
+            ]
+        )
+        db.session.commit()
+
+    seen = []
+    cursor = None
+    while True:
+        url = "/users/report?limit=2" + (f"&cursor={cursor}" if cursor else "")
+        response = client.get(url)
+        assert response.status_code == 200
+
+        data = response.get_json()
+        assert data["total_users"] <= 2
+        seen.extend(user["username"] for user in data["users"])
+
+        cursor = data["next_cursor"]
+        if cursor is None:
+            break
+
+    assert seen == [f"page_user{i}" for i in range(5)]
+
+
+def test_user_report_invalid_pagination(client):
+    response = client.get("/users/report?limit=0")
+    assert response.status_code == 400
+
+    response = client.get("/users/report?limit=abc")
+    assert response.status_code == 400
+
+    response = client.get("/users/report?limit=2&cursor=not-a-cursor")
+    assert response.status_code == 400
+    assert response.get_json()["error"] == "Invalid cursor"
+
+
+def _seed_users_with_roles(start, count):
+    db.session.execute(
+        insert(User),
+        [
+            {
+                "id": user_id,
+                "username": f"bulk_user{user_id}",
+                "email": f"bulk{user_id}@test.com",
+                "password": "pass123",
+                "inactive_since": None,
+            }
+            for user_id in range(start, start + count)
+        ],
+    )
+    db.session.execute(
+        insert(user_roles),
+        [
+            {"user_id": user_id, "role_id": role_id}
+            for user_id in range(start, start + count)
+            for role_id in (1, 2)
+        ],
+    )
+    db.session.commit()
+
+
+def test_user_report_statement_count_is_constant(app, count_statements):
+    with app.app_context():
+        db.session.add_all(
+            [
+                Role(role_id=1, role_name="Fighter", department_name="Martial"),
+                Role(role_id=2, role_name="Cleric", department_name="Divine"),
+            ]
+        )
+        db.session.commit()
+        get_role_catalog().listing()  # warm the role catalog
+
+        counts = {}
+        for start, count in ((1, 10), (11, 9990)):
+            _seed_users_with_roles(start, count)
+            db.session.expunge_all()
+
+            with count_statements() as statements:
+                report = get_user_report("all")
+
+            counts[report["total_users"]] = len(statements)
+            assert all(len(user["roles"]) == 2 for user in report["users"])
+
+    assert counts[10] == counts[10000] == 2
+
+
+def test_user_report_conditional_get(client, app, count_statements):
+    client.post(
+        "/register",
+        json={"username": "etag", "email": "etag@test.com", "password": "pass123"},
+    )
+    response = client.get("/users/report")
+    etag = response.headers["ETag"]
+
+    # Unchanged: 304 after one lookup of the change counters, no report query
+    with app.app_context():
+        with count_statements() as statements:
+            response = client.get("/users/report", headers={"If-None-Match": etag})
+    assert response.status_code == 304
+    assert response.data == b""
+    assert len(statements) == 1
+
+    # Other query parameters are a different representation
+    paged = client.get("/users/report?limit=1", headers={"If-None-Match": etag})
+    assert paged.status_code == 200
+
+    with app.app_context():
+        user_id = User.query.filter_by(email="etag@test.com").first().id
+    client.patch(f"/users/{user_id}/toggle-active")
+
+    response = client.get("/users/report", headers={"If-None-Match": etag})
+    assert response.status_code == 200
+    assert response.headers["ETag"] != etag
+
+
+def test_user_report_sparse_fields(client, app, count_statements):
+    with app.app_context():
+        db.session.add_all(
+            [
+                Role(role_id=1, role_name="Fighter", department_name="Martial"),
+                Role(role_id=2, role_name="Cleric", department_name="Divine"),
+            ]
+        )
+        db.session.commit()
+        _seed_users_with_roles(1, 3)
+        get_role_catalog().listing()  # warm the role catalog
+
+        # Only the requested columns are read, and roles not at all: the
+        # change counters and the users are the only two statements
+        with count_statements() as statements:
+            response = client.get("/users/report?fields=email,id")
+    assert response.status_code == 200
+    assert len(statements) == 2
+    assert "user.email" in statements[1]
+    assert "password" not in statements[1]
+    assert "username" not in statements[1]
+    assert list(response.get_json()["users"][0]) == ["id", "email"]
+
+    response = client.get("/users/report?fields=roles,is_active&limit=2")
+    users = response.get_json()["users"]
+    assert len(users) == 2
+    assert list(users[0]) == ["roles", "is_active"]
+    assert users[0]["is_active"] is True
+    assert {role["role_name"] for role in users[0]["roles"]} == {"Fighter", "Cleric"}
+
+    response = client.get("/users/report?fields=username&stream=1")
+    lines = [json.loads(line) for line in response.data.splitlines()]
+    assert lines == [{"username": f"bulk_user{n}"} for n in range(1, 4)]
+
+    # A different projection is a different representation
+    full = client.get("/users/report")
+    narrow = client.get("/users/report?fields=id")
+    assert full.headers["ETag"] != narrow.headers["ETag"]
+
+
+def test_user_report_invalid_fields(client):
+    for fields in ("password", "id,nope", ","):
+        response = client.get(f"/users/report?fields={fields}")
+        assert response.status_code == 400
+        assert "error" in response.get_json()
+
+
+def _seed_filter_users():
+    db.session.add_all(
+        [
+            Role(role_id=1, role_name="Fighter", department_name="Martial"),
+            Role(role_id=2, role_name="Monk", department_name="Martial"),
+            Role(role_id=3, role_name="Cleric", department_name="Divine"),
+        ]
+    )
+    db.session.execute(
+        insert(User),
+        [
+            {
+                "id": user_id,
+                "username": name,
+                "email": f"{name}@test.com",
+                "password": "pass123",
+                "inactive_since": inactive_since,
+            }
+            for user_id, name, inactive_since in (
+                (1, "dana", None),
+                (2, "alex", datetime(2026, 1, 10)),
+                (3, "carl", datetime(2026, 3, 5)),
+                (4, "bea", None),
+                (5, "emil", datetime(2026, 3, 5)),
+            )
+        ],
+    )
+    db.session.execute(
+        insert(user_roles),
+        [
+            {"user_id": user_id, "role_id": role_id}
+            for user_id, role_id in ((1, 1), (1, 2), (2, 2), (3, 3), (4, 3), (5, 1))
+        ],
+    )
+    db.session.commit()
+
+
+def _report_ids(client, query):
+    response = client.get(f"/users/report?fields=id&{query}")
+    assert response.status_code == 200
+    return [user["id"] for user in response.get_json()["users"]]
+
+
+def test_user_report_filters(client, app):
+    with app.app_context():
+        _seed_filter_users()
+
+    assert _report_ids(client, "role_id=3") == [3, 4]
+    # A user with two roles in the department is listed once
+    assert _report_ids(client, "department=Martial") == [1, 2, 5]
+    assert _report_ids(client, "department=Martial&status=active") == [1]
+    assert _report_ids(client, "department=Nowhere") == []
+    assert _report_ids(client, "inactive_before=2026-03-01") == [2]
+    assert _report_ids(client, "inactive_after=2026-03-05T00:00:00Z") == [3, 5]
+    assert _report_ids(client, "role_id=1&inactive_after=2026-01-01") == [5]
+
+
+def test_user_report_sort_and_paginate(client, app):
+    app.config["REPORT_STREAM_CHUNK_SIZE"] = 2
+    with app.app_context():
+        _seed_filter_users()
+
+    assert _report_ids(client, "sort=username") == [2, 4, 3, 1, 5]
+    assert _report_ids(client, "sort=-id") == [5, 4, 3, 2, 1]
+    # Ties on inactive_since are broken by id; active users (NULL) come last
+    assert _report_ids(client, "sort=inactive_since") == [2, 3, 5, 1, 4]
+    assert _report_ids(client, "sort=-inactive_since") == [5, 3, 2, 4, 1]
+
+    for sort in ("username", "-email", "inactive_since", "-inactive_since", "-id"):
+        expected = _report_ids(client, f"sort={sort}")
+        pages, cursor = [], None
+        while True:
+            query = f"sort={sort}&limit=2" + (f"&cursor={cursor}" if cursor else "")
+            data = client.get(f"/users/report?fields=id&{query}").get_json()
+            pages += [user["id"] for user in data["users"]]
+            cursor = data["next_cursor"]
+            if cursor is None:
+                break
+        assert pages == expected
+
+    response = client.get(
+        "/users/report?sort=-username&department=Martial&stream=1&fields=username"
+    )
+    lines = [json.loads(line) for line in response.data.splitlines()]
+    assert lines == [{"username": name} for name in ("emil", "dana", "alex")]
+
+
+def test_user_report_invalid_filters(client):
+    for query in (
+        "role_id=abc",
+        "inactive_before=yesterday",
+        "sort=password",
+        "sort=username&cursor=MQ",  # an id cursor is not a username cursor
+    ):
+        response = client.get(f"/users/report?{query}")
+        assert response.status_code == 400
+        assert "error" in response.get_json()